@@ -0,0 +1,131 @@
+"""
+Benchmark 2 chiến lược phân trang (click "Load more" vs offset song song) trên
+1 site giả lập kết quả tìm kiếm Booking chạy ở localhost.
+
+Site giả lập:
+    /searchresults.vi.html?...&offset=K  -> 25 property-card từ vị trí K + nút "Tải thêm kết quả"
+    /cards?start=N                       -> 25 thẻ tiếp theo (nút gọi bằng fetch rồi chèn vào danh sách)
+Mỗi request trễ `--latency` giây để giống mạng thật.
+
+Chạy:
+    python bench_pagination.py --hotels 500 --latency 0.4 --parallel 3
+"""
+import argparse
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from playwright.async_api import async_playwright
+
+import booking_scraper as bs
+
+PAGE_SIZE = 25
+
+
+def render_card(i):
+    return f"""
+<div data-testid="property-card">
+  <div data-testid="title">Khách sạn Fixture {i}</div>
+  <a data-testid="title-link" href="/hotel/vn/fixture-{i}.vi.html?aid=1">xem</a>
+  <div data-testid="rating-stars" aria-label="{i % 5 + 1} out of 5 stars"></div>
+  <span data-testid="price-and-discounted-price">VND {500000 + i * 1000:,}</span>
+  <div data-testid="review-score"><div aria-hidden="true">8,{i % 10}</div><div>{100 + i} đánh giá</div></div>
+  <span data-testid="address">Quận {i % 12 + 1}</span>
+  <span data-testid="distance">Cách trung tâm {i % 7} km</span>
+  <h4 role="link">Phòng Deluxe {i % 3}</h4>
+  <div data-testid="recommended-units">1 giường đôi lớn</div>
+</div>"""
+
+
+def render_cards(start, total):
+    return "".join(render_card(i) for i in range(start, min(start + PAGE_SIZE, total)))
+
+
+def render_page(offset, total):
+    has_more = offset + PAGE_SIZE < total
+    button = '<button id="more">Tải thêm kết quả</button>' if has_more else ""
+    return f"""<!DOCTYPE html><html><body>
+<div id="list">{render_cards(offset, total)}</div>
+{button}
+<script>
+let next = {offset + PAGE_SIZE};
+const btn = document.getElementById('more');
+if (btn) btn.addEventListener('click', async () => {{
+  const html = await (await fetch('/cards?start=' + next)).text();
+  document.getElementById('list').insertAdjacentHTML('beforeend', html);
+  next += {PAGE_SIZE};
+  if (next >= {total}) btn.remove();
+}});
+</script></body></html>"""
+
+
+def start_fixture_site(total, latency):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            parsed = urlparse(self.path)
+            qs = parse_qs(parsed.query)
+            if parsed.path == "/cards":
+                body = render_cards(int(qs.get("start", ["0"])[0]), total)
+            else:
+                body = render_page(int(qs.get("offset", ["0"])[0]), total)
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_strategy(browser, pagination):
+    context = await browser.new_context()
+    page = await context.new_page()
+    config = {"name": f"Bench_{pagination.name}", "adults": 2, "children": 0, "ages": [], "rooms": 1}
+    stats = bs.WaitStats(config["name"])
+    t0 = time.monotonic()
+    rows = await bs.scrape_detailed_data(
+        page, "2026-01-01", "2026-01-02", config, "Bench", "Bench",
+        stats=stats, pagination=pagination,
+    )
+    elapsed = time.monotonic() - t0
+    await context.close()
+    unique = len({(r["Hotel Link"].split("?")[0], r["Room Type"]) for r in rows})
+    return {"strategy": pagination.name, "cards": len(rows), "unique": unique,
+            "seconds": round(elapsed, 2), "cards_per_s": round(len(rows) / elapsed, 1)}
+
+
+async def main(args):
+    server = start_fixture_site(args.hotels, args.latency)
+    bs.BASE_URL = f"http://127.0.0.1:{server.server_port}/searchresults.vi.html"
+    results = []
+    try:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            results.append(await run_strategy(browser, bs.ClickPagination()))
+            results.append(await run_strategy(
+                browser, bs.OffsetPagination(PAGE_SIZE, args.parallel, args.hotels // PAGE_SIZE + 2)
+            ))
+            await browser.close()
+    finally:
+        server.shutdown()
+
+    print("\n=== KẾT QUẢ ===")
+    for r in results:
+        print(f"{r['strategy']:>7}: {r['cards']} thẻ ({r['unique']} khác nhau) trong {r['seconds']}s -> {r['cards_per_s']} thẻ/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hotels", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.4)
+    parser.add_argument("--parallel", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -1,12 +1,25 @@
 import asyncio
 import pandas as pd
-from playwright.async_api import async_playwright
+from playwright.async_api import async_playwright, TimeoutError
 from datetime import datetime, timedelta
 import os
 import random
 import math
 import json
+import sys
+import time
 from sqlalchemy import create_engine, text
+from payload_capture import SearchPayloadCollector
+from db_writer import BatchedCopyWriter
+import crawl_state
+from scenario_planner import draw_distinct, plan_scenarios
+from booking_session import BROWSER_STATE_FILE, dismiss_popups, warm_booking
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.browser_pool import BrowserPool
+from common.snapshot_archive import SnapshotArchive
+from common.telemetry import Telemetry
+from common.rate_limit import AdaptiveRateLimiter, RetryPolicy
 
 # --- CẤU HÌNH DATABASE ---
 DB_CONFIG = {
@@ -28,6 +41,86 @@ LOCATIONS = {
     "Vung Tau": "Vũng+Tàu",
     "Binh Duong": "Bình+Dương"
 }
+
+# --- CẤU HÌNH CHẠY SONG SONG ---
+# Số kịch bản tối đa chạy cùng lúc (mỗi worker có context + page riêng)
+MAX_CONCURRENT_SCENARIOS = 4
+# Giới hạn tốc độ thích ứng theo domain (common/rate_limit.py):
+# bắt đầu 1 request / 3s và CONCURRENCY_INITIAL kịch bản, tự tăng khi Booking phản hồi tốt,
+# giảm khi timeout / 429 / 503
+RATE_INITIAL = 1 / 3.0
+RATE_MIN = 0.1
+RATE_MAX = 2.0
+CONCURRENCY_INITIAL = 2
+RETRY_MAX_ATTEMPTS = 3
+
+# --- CẤU HÌNH POOL CONTEXT ---
+# Cookie/consent lưu ở BROWSER_STATE_FILE (booking_session.py) để context mới không phải tắt popup lại
+CONTEXT_MAX_NAVIGATIONS = 30   # thay context sau N lần điều hướng
+CONTEXT_MAX_MEMORY_MB = 1024   # hoặc khi JS heap vượt ngưỡng (MB)
+
+# --- CẤU HÌNH CHỜ THEO ĐIỀU KIỆN (ms) ---
+CARD_SELECTOR = 'div[data-testid="property-card"]'
+LOAD_MORE_TEXTS = ["Load more results", "Hiển thị thêm kết quả", "Tải thêm kết quả"]
+LOAD_MORE_SELECTOR = ", ".join(f'button:has-text("{t}")' for t in LOAD_MORE_TEXTS)
+WAIT_CARDS_TIMEOUT = 20000     # chờ thẻ khách sạn đầu tiên sau goto
+WAIT_SCROLL_TIMEOUT = 3000     # chờ trang dài thêm / nút hiện ra sau mỗi lần scroll
+WAIT_CLICK_TIMEOUT = 15000     # chờ số thẻ tăng lên sau mỗi lần bấm "Load more"
+WAIT_IDLE_TIMEOUT = 5000       # chờ network rảnh trước khi trích xuất
+
+# --- CHẾ ĐỘ TRÍCH XUẤT ---
+# "dom": chạy JS trên property-card (mặc định)
+# "network": giải mã payload GraphQL/JSON bắt được từ response, thiếu thì quay về DOM
+CAPTURE_MODE = "dom"
+# Thư mục lưu payload gốc để làm fixture chạy offline (None = không lưu)
+CAPTURE_RECORD_DIR = None
+# Lưu HTML thô của thẻ đã thu hoạch (chế độ DOM) vào kho nén để re-extract offline
+# bằng common/reextract.py --source booking --kind search_cards (None = tắt)
+SNAPSHOT_DIR = None
+SNAPSHOT_ARCHIVE = SnapshotArchive(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+
+# --- TELEMETRY: xuất telemetry/booking_scraper.prom + booking_scraper_summary.json cuối lượt ---
+TELEMETRY_DIR = "telemetry"
+TELEMETRY = Telemetry("booking_scraper", out_dir=TELEMETRY_DIR)
+RETRY = RetryPolicy(max_attempts=RETRY_MAX_ATTEMPTS, telemetry=TELEMETRY)
+
+# --- THU HOẠCH DẦN THEO TỪNG LẦN "LOAD MORE" ---
+# True: xóa nội dung thẻ đã lấy khỏi DOM (giữ thẻ rỗng để đếm), giúp bộ nhớ trang không tăng
+HARVEST_CLEAR_CARDS = False
+
+# --- CHIẾN LƯỢC PHÂN TRANG ---
+# "click": scroll + bấm "Load more" tuần tự (mặc định)
+# "offset": tải song song các trang &offset=0,25,50,... trên nhiều page phụ
+PAGINATION_MODE = "click"
+OFFSET_PAGE_SIZE = 25
+OFFSET_PARALLEL_PAGES = 3
+OFFSET_MAX_PAGES = 40
+
+# --- CẤU HÌNH GHI DATABASE THEO LÔ (COPY FROM STDIN) ---
+WRITER_BATCH_SIZE = 1000       # số dòng mỗi lần COPY
+WRITER_FLUSH_INTERVAL = 5.0    # giây; quá hạn thì flush cả lô chưa đủ
+TABLE_COLUMNS = [
+    "search_location", "scenario", "hotel_name", "hotel_link", "stars",
+    "final_price", "original_price", "rating_score", "review_count", "location_score",
+    "address", "distance", "room_type", "bed_type",
+    "free_cancellation", "breakfast_included", "badge_deal",
+    "check_in", "adults", "children", "rooms",
+]
+
+# --- CẤU HÌNH CHẠY TIẾP (RESUME) ---
+# True: xóa bảng dữ liệu + bảng trạng thái và cào lại từ đầu
+RESET_TABLES = False
+# Ngày check-in cố định ("YYYY-MM-DD") để chạy tiếp sang ngày hôm sau; None = hôm nay + 5 ngày
+CHECK_IN_DATE = None
+# Seed sinh kịch bản: giữ nguyên để lần chạy lại sinh đúng các kịch bản cũ
+SCENARIO_SEED = 2024
+
+# --- CẤU HÌNH KỊCH BẢN ---
+# "random": bốc ngẫu nhiên theo trọng số như cũ (đã chuẩn hóa + bỏ trùng)
+# "coverage": chọn N kịch bản khác nhau phủ rộng nhất (scenario_planner.plan_scenarios)
+SCENARIO_MODE = "random"
+N_SCENARIOS = 20
+
 # --- CẤU TRÚC BẢNG SQL ---
 CREATE_TABLE_SQL = f"""
 CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
@@ -57,22 +150,281 @@ CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
 );
 """
 
-def generate_random_config():
+# --- JS TRÍCH XUẤT PROPERTY-CARD (CHẾ ĐỘ DOM) ---
+# SỬ DỤNG r""" ĐỂ TRÁNH LỖI CÚ PHÁP REGEX VÀ STRING
+# Chỉ quét thẻ chưa thu hoạch (data-harvested), đánh dấu sau khi lấy;
+# opts.clear = true thì xóa nội dung thẻ đã lấy để DOM không phình ra;
+# opts.html = true thì kèm outerHTML của thẻ (khóa '__html') để lưu snapshot.
+EXTRACT_CARDS_JS = r"""(opts) => {
+    const items = [];
+    const cards = document.querySelectorAll('div[data-testid="property-card"]:not([data-harvested])');
+    
+    cards.forEach(card => {
+        let info = {};
+        
+        // 1. Name
+        const titleEl = card.querySelector('div[data-testid="title"]');
+        info['Hotel Name'] = titleEl ? titleEl.innerText : "N/A";
+        
+        // === LẤY LINK KHÁCH SẠN ===
+        const linkEl = card.querySelector('a[data-testid="title-link"]');
+        // Lấy href absolute (đầy đủ)
+        info['Hotel Link'] = linkEl ? linkEl.href : "N/A";
+        
+       // 2. Stars 
+        let stars = 0;
+        // Gom chung container lại để xử lý gọn hơn
+        const starContainer = card.querySelector('div[data-testid="rating-stars"]') || 
+                              card.querySelector('div[data-testid="rating-squares"]');
+
+        if (starContainer) {
+            // --- CÁCH 1: Ưu tiên tuyệt đối lấy từ aria-label (Chính xác 100%) ---
+            // Ví dụ aria-label="5 out of 5 stars" hoặc "5 sao"
+            const label = starContainer.getAttribute('aria-label');
+            if (label) {
+                const match = label.match(/^(\d+)/); // Lấy số đầu tiên tìm thấy
+                if (match) stars = parseInt(match[1]);
+            }
+
+            // --- CÁCH 2: Nếu không có aria-label thì mới đếm SVG ---
+            if (stars === 0) {
+                const svgCount = starContainer.querySelectorAll('svg').length;
+                    stars = svgCount / 2; 
+            }
+        }
+
+        // --- CÁCH 3: Quét text div ảo ---
+        if (stars === 0) {
+            const ratingDiv = card.querySelector('div[aria-label*="sao"], div[aria-label*="star"]');
+            if (ratingDiv) {
+                const label = ratingDiv.getAttribute('aria-label');
+                const match = label.match(/(\d+)/);
+                if (match) stars = parseInt(match[1]);
+            }
+        }
+
+        info['Stars'] = stars > 0 ? stars : "N/A";
+
+        // === 3. Price Processing ===
+        let finalPriceStr = "0";
+        let originalPriceStr = "0";
+
+        const getNumber = (str) => {
+            if (!str) return 0;
+            // Chỉ giữ lại số, loại bỏ chữ và ký tự đặc biệt
+            const numStr = str.replace(/\D/g, ''); 
+            return numStr ? parseInt(numStr) : 0;
+        };
+
+        // --- CÁCH 1: Quét Text ẩn ---
+        //  Dùng 'textContent' để đọc được cả text bị ẩn
+        const invisibleTextEl = Array.from(card.querySelectorAll('div')).find(el => 
+            el.textContent.includes('Original price') && el.textContent.includes('Current price')
+        );
+
+        if (invisibleTextEl) {
+            const text = invisibleTextEl.textContent;
+            const matches = text.match(/[\d,.]+/g); // Tìm các cụm số
+            if (matches && matches.length >= 2) {
+                const nums = matches.map(m => getNumber(m));
+                originalPriceStr = Math.max(...nums).toString(); // Số lớn nhất là giá gốc
+                finalPriceStr = Math.min(...nums).toString();    // Số nhỏ nhất là giá cuối
+            }
+        }
+
+        // --- CÁCH 2: Fallback dựa vào vị trí DOM ---
+        // Chỉ chạy nếu chưa lấy được giá gốc hoặc giá gốc đang bằng 0
+        if (originalPriceStr === "0" || originalPriceStr === finalPriceStr) {
+            
+            // A. Xác định giá cuối trước
+            const finalPriceEl = card.querySelector('[data-testid="price-and-discounted-price"]');
+            
+            if (finalPriceEl) {
+                const currentVal = getNumber(finalPriceEl.innerText);
+                finalPriceStr = currentVal.toString();
+
+                // B. Tìm giá gốc dựa vào vị trí tương đối trong ảnh DOM
+                // Bước 1: Tìm lên thẻ cha <div> chứa giá cuối
+                const parentDiv = finalPriceEl.closest('div');
+                
+                // Bước 2: Tìm thẻ <span> nằm ngay trước thẻ cha đó
+                if (parentDiv && parentDiv.previousElementSibling) {
+                    const sibling = parentDiv.previousElementSibling;
+                    if (sibling.tagName === 'SPAN') {
+                        const siblingVal = getNumber(sibling.innerText);
+                        // Chỉ nhận nếu nó lớn hơn giá cuối
+                        if (siblingVal > currentVal) {
+                            originalPriceStr = siblingVal.toString();
+                        }
+                    }
+                }
+                
+                // Bước 3: Quét tất cả thẻ span có aria-hidden="true"
+                if (originalPriceStr === "0") {
+                    const potentialSpans = card.querySelectorAll('span[aria-hidden="true"]');
+                    for (const span of potentialSpans) {
+                        const val = getNumber(span.innerText);
+                        // Nếu tìm thấy số nào lớn hơn giá cuối thì khả năng cao là giá gốc
+                        if (val > currentVal) {
+                            originalPriceStr = val.toString();
+                            break; 
+                        }
+                    }
+                }
+            }
+        }
+
+        // --- C. Safety Check & Finalize ---
+        let fVal = parseInt(finalPriceStr);
+        let oVal = parseInt(originalPriceStr);
+
+        // Nếu vẫn không tìm được giá gốc thì chấp nhận nó bằng giá cuối
+        if (oVal === 0) oVal = fVal;
+        // Đảm bảo logic: Giá gốc không được nhỏ hơn giá bán
+        if (oVal < fVal) oVal = fVal;
+
+        info['Final Price'] = fVal.toString();
+        info['Original Price'] = oVal.toString();
+        
+        // === 4. Rating ===
+        let ratingScore = "N/A";
+        const scoreCard = card.querySelector('[data-testid="review-score"] div[aria-hidden="true"]') || 
+                          card.querySelector('[data-testid="review-score"] div:first-child') ||
+                          card.querySelector('.ac4a7896c7');
+
+        if (scoreCard) {
+            let rawScore = scoreCard.innerText.trim();
+            rawScore = rawScore.replace(',', '.'); // Xử lý dấu phẩy
+            const match = rawScore.match(/(\d+(\.\d+)?)/);
+            if (match) ratingScore = match[0];
+        }
+        info['Rating Score'] = ratingScore;
+        
+        // === Review Count (Xử lý dấu chấm hàng nghìn) ===
+        let reviewCount = "N/A";
+        const reviewTextEl = card.querySelector('[data-testid="review-score"] div:last-child') ||
+                             card.querySelector('[data-testid="review-score"]');
+        if (reviewTextEl) {
+            const rText = reviewTextEl.innerText.replace(/\./g, ''); // Bỏ dấu chấm (1.200 -> 1200)
+            const match = rText.match(/(\d+)\s*(reviews|đánh giá)/i);
+            if (match) reviewCount = match[1];
+        }
+        info['Review Count'] = reviewCount;
+
+        // === 5. LOCATION SCORE ===
+        let locScore = "N/A";
+        const secondaryScore = card.querySelector('[data-testid="secondary-review-score-link"]');
+        
+        // Tìm text theo từ khóa nếu không có selector ID
+        const locationTextElement = Array.from(card.querySelectorAll('span, div')).find(el => 
+            (el.innerText.includes('Location') || el.innerText.includes('Địa điểm')) && 
+            /\d+[.,]\d+/.test(el.innerText)
+        );
+
+        let locRaw = "";
+        if (secondaryScore) {
+            locRaw = secondaryScore.innerText;
+        } else if (locationTextElement) {
+            locRaw = locationTextElement.innerText;
+        }
+
+        if (locRaw) {
+            locRaw = locRaw.replace(',', '.'); // Xử lý dấu phẩy
+            const match = locRaw.match(/(\d+(\.\d+)?)/); 
+            if (match && parseFloat(match[0]) <= 10) {
+                locScore = match[0];
+            }
+        }
+        info['Location Score'] = locScore;
+
+        const addrEl = card.querySelector('span[data-testid="address"]');
+        info['Address'] = addrEl ? addrEl.innerText : "N/A";
+        const distEl = card.querySelector('span[data-testid="distance"]');
+        info['Distance'] = distEl ? distEl.innerText : "N/A";
+
+        // Tìm h4 có role="link" (theo ảnh) hoặc h4 bất kỳ trong phần thông tin
+        const roomEl = card.querySelector('h4[role="link"]') || card.querySelector('h4');
+        info['Room Type'] = roomEl ? roomEl.innerText : "N/A";
+        
+        const unitEl = card.querySelector('div[data-testid="recommended-units"]');
+        let bedTxt = "N/A";
+        if (unitEl) {
+            // Dùng regex split để an toàn hơn với Raw String
+            const lines = unitEl.innerText.split(/\n/);
+            for (let line of lines) {
+                if (line.toLowerCase().includes('bed') || line.toLowerCase().includes('giường')) {
+                    bedTxt = line;
+                    break;
+                }
+            }
+        }
+        info['Bed Type'] = bedTxt;
+
+        const cardText = (card.innerText || "").toLowerCase();
+        
+        const hasCancel = cardText.includes('free cancellation') || 
+                          cardText.includes('miễn phí hủy') || 
+                          cardText.includes('hủy miễn phí');
+        info['Free Cancellation'] = hasCancel ? "Yes" : "No";
+
+        let hasBreakfast = false;
+        const bfCandidates = card.querySelectorAll('span, li, div');
+        for (let el of bfCandidates) {
+            const t = (el.textContent || "").toLowerCase().trim();
+            if (t.includes('breakfast included') || t.includes('bao gồm bữa sáng') ||
+                t.includes('bữa sáng miễn phí') || t.includes('ăn sáng miễn phí')) {
+                hasBreakfast = true;
+                break;
+            }
+        }
+
+        if (!hasBreakfast) {
+            const unitInfo = card.querySelector('[data-testid="recommended-units"]');
+            if (unitInfo) {
+                const uText = unitInfo.innerText.toLowerCase();
+                if (uText.includes('breakfast') || uText.includes('bữa sáng')) {
+                    hasBreakfast = true;
+                }
+            }
+        }
+        info['Breakfast Included'] = hasBreakfast ? "Yes" : "No";
+        
+        let badgeText = "None";
+        const dealBadge = card.querySelector('[data-testid="property-card-deal"]');
+        if (dealBadge) {
+            badgeText = dealBadge.innerText.trim();
+        } else {
+            const normalBadge = card.querySelector('[data-testid="badge"]');
+            if (normalBadge) {
+                badgeText = normalBadge.innerText.trim();
+            }
+        }
+        info['Badge Deal'] = badgeText;
+
+        if (opts && opts.html) info['__html'] = card.outerHTML;
+        items.push(info);
+        card.setAttribute('data-harvested', '1');
+        if (opts && opts.clear) card.replaceChildren();
+    });
+    return items;
+}"""
+
+def generate_random_config(rng=random):
     # 1. Random số người lớn (1 đến 6 người)
     # Dùng weights để ưu tiên 2 người (cặp đôi) xuất hiện nhiều hơn
-    adults = random.choices([1, 2, 3, 4, 5, 6], weights=[20, 40, 10, 10, 10, 10], k=1)[0]
+    adults = rng.choices([1, 2, 3, 4, 5, 6], weights=[20, 40, 10, 10, 10, 10], k=1)[0]
 
     # 2. Random số trẻ em (0 đến 4 bé)
     # 60% tỉ lệ là không có trẻ em, 40% là có
-    has_children = random.choices([True, False], weights=[40, 60], k=1)[0]
+    has_children = rng.choices([True, False], weights=[40, 60], k=1)[0]
     
     children = 0
     ages = []
     
     if has_children:
-        children = random.randint(1, 3) # Random 1-3 bé
+        children = rng.randint(1, 3) # Random 1-3 bé
         # Random tuổi từ 0 (sơ sinh) đến 17 tuổi
-        ages = [random.randint(0, 17) for _ in range(children)]
+        ages = [rng.randint(0, 17) for _ in range(children)]
 
     # 3. Tính toán số phòng hợp lý 
     total_people = adults + children
@@ -88,7 +440,7 @@ def generate_random_config():
         min_rooms_needed = max_rooms_allowed
 
     # Random số phòng trong khoảng hợp lý
-    rooms = random.randint(min_rooms_needed, max_rooms_allowed)
+    rooms = rng.randint(min_rooms_needed, max_rooms_allowed)
 
     # 4. Tạo tên gợi nhớ để log
     name_str = f"Random_{adults}A_{children}C_{rooms}R"
@@ -104,48 +456,171 @@ def generate_random_config():
         "rooms": rooms
     }
 
-# Tạo danh sách 20 kịch bản ngẫu nhiên
-RANDOM_CONFIGS = [generate_random_config() for _ in range(20)]
+# Tạo danh sách N kịch bản khác nhau (cố định theo seed để chạy tiếp được).
+# Tuổi trẻ em được gom về nhóm tuổi nên 2 cấu hình tương đương chỉ còn 1.
+# RNG riêng (cùng dãy số với random.seed(SCENARIO_SEED) trước đây): không seed lại random toàn cục,
+# để jitter backoff của RetryPolicy vẫn khác nhau giữa các worker / tiến trình.
+if SCENARIO_MODE == "coverage":
+    RANDOM_CONFIGS = plan_scenarios(N_SCENARIOS, seed=SCENARIO_SEED)
+else:
+    _scenario_rng = random.Random(SCENARIO_SEED)
+    RANDOM_CONFIGS = draw_distinct(lambda: generate_random_config(_scenario_rng), N_SCENARIOS)
 
-# In ra kiểm tra
-import json
-print(json.dumps(RANDOM_CONFIGS, indent=2))
+class WaitStats:
+    """
+    Ghi lại từng lần chờ theo điều kiện (tên, thời gian, có bị timeout không)
+    để báo cáo thời gian chờ so với thời gian làm việc của 1 kịch bản.
+    Mỗi lần chờ cũng được ghi vào TELEMETRY (wait_seconds, timeouts_total).
+    """
+    def __init__(self, label="", domain=BASE_URL):
+        self.label = label
+        self.domain = domain
+        self.started = time.monotonic()
+        self.waits = []
 
-async def scrape_detailed_data(page, checkin, checkout, config, location_name, location_query):
-    # 1. Tạo URL
-    url = f"{BASE_URL}?ss={location_query}&checkin={checkin}&checkout={checkout}"
-    url += f"&group_adults={config['adults']}&no_rooms={config['rooms']}&group_children={config['children']}"
-    for age in config['ages']:
-        url += f"&age={age}"
+    async def wait(self, name, awaitable):
+        t0 = time.monotonic()
+        ok = True
+        try:
+            await awaitable
+        except TimeoutError:
+            ok = False
+            TELEMETRY.inc("timeouts_total", self.domain)
+        secs = time.monotonic() - t0
+        TELEMETRY.observe("wait_seconds", self.domain, secs)
+        self.waits.append((name, secs, ok))
+        return ok
+
+    def report(self):
+        total = time.monotonic() - self.started
+        waited = sum(w[1] for w in self.waits)
+        by_name = {}
+        for name, secs, ok in self.waits:
+            item = by_name.setdefault(name, {"count": 0, "seconds": 0.0, "timeouts": 0})
+            item["count"] += 1
+            item["seconds"] += secs
+            item["timeouts"] += 0 if ok else 1
+        return {
+            "scenario": self.label,
+            "total_s": round(total, 2),
+            "wait_s": round(waited, 2),
+            "work_s": round(total - waited, 2),
+            "waits": by_name,
+        }
 
-    print(f"\n >> [Scenario: {config['name']}] Truy cập Booking...")
+
+async def wait_page_grows(page, last_height):
+    """Chờ tới khi trang dài thêm hoặc nút 'Load more' hiện ra."""
+    await page.wait_for_function(
+        """([h, texts]) => document.body.scrollHeight > h ||
+            Array.from(document.querySelectorAll('button')).some(b =>
+                b.offsetParent !== null && texts.some(t => b.innerText.includes(t)))""",
+        arg=[last_height, LOAD_MORE_TEXTS],
+        timeout=WAIT_SCROLL_TIMEOUT,
+    )
+
+
+async def wait_cards_increase(page, prev_count):
+    """Chờ tới khi số property-card vượt quá prev_count."""
+    await page.wait_for_function(
+        "([sel, n]) => document.querySelectorAll(sel).length > n",
+        arg=[CARD_SELECTOR, prev_count],
+        timeout=WAIT_CLICK_TIMEOUT,
+    )
+
+
+def build_scenario_row(item, config, location_name, checkin, checkout):
+    """Chuẩn hóa giá + gắn thông tin kịch bản cho 1 thẻ khách sạn."""
+    try: f_price = int(item['Final Price'])
+    except: f_price = 0
+    try: o_price = int(item['Original Price'])
+    except: o_price = f_price
     
-    try:
-        await page.goto(url, timeout=60000)
-        
-        # --- XỬ LÝ POPUP ---
-        await asyncio.sleep(10)
-        try: await page.keyboard.press("Escape")
-        except: pass
-        try:
-            close_btn = page.locator('button[aria-label="Bỏ qua thông tin đăng nhập"], button[aria-label="Đóng"]')
-            if await close_btn.count() > 0: await close_btn.first.click()
-        except: pass
+    if o_price < f_price and o_price > 0:
+        o_price, f_price = f_price, o_price
+    elif o_price == 0:
+        o_price = f_price
+
+    return {
+        "Scenario": config['name'],
+        "search_location": location_name,
+        "Check-in": checkin,
+        "Check-out": checkout,
+        "Adults": config['adults'],
+        "Children": config['children'],
+        "Rooms": config['rooms'],
+        "Source": "Booking.com",
+        **item,
+        "Final Price": f_price,
+        "Original Price": o_price
+    }
+
+
+class CardHarvester:
+    """
+    Thu hoạch thẻ khách sạn theo từng đợt (sau mỗi lần "Load more"),
+    loại trùng theo (Hotel Link, Room Type) và đẩy ngay từng đợt ra ngoài qua on_batch.
+    Không có on_batch thì giữ lại trong self.rows.
+    Có archive thì HTML của mỗi đợt thẻ (DOM) được lưu thành 1 snapshot kind="search_cards".
+    """
+    def __init__(self, to_row, on_batch=None, clear_cards=HARVEST_CLEAR_CARDS, archive=None, snapshot_meta=None):
+        self.to_row = to_row
+        self.on_batch = on_batch
+        self.clear_cards = clear_cards
+        self.archive = archive
+        self.snapshot_meta = snapshot_meta or {}
+        self.seen = set()
+        self.rows = []
+        self.total = 0
+
+    async def add(self, raw_items):
+        batch = []
+        for item in raw_items:
+            # Bỏ query string để link từ DOM và từ payload cho cùng 1 khóa
+            key = (str(item.get("Hotel Link", "")).split("?")[0], item.get("Room Type"))
+            if key in self.seen:
+                continue
+            self.seen.add(key)
+            batch.append(self.to_row(item))
+        if batch:
+            self.total += len(batch)
+            if self.on_batch:
+                await self.on_batch(batch)
+            else:
+                self.rows.extend(batch)
+        return len(batch)
+
+    async def harvest_dom(self, page):
+        with TELEMETRY.timer("extract_seconds", page.url):
+            raw = await page.evaluate(EXTRACT_CARDS_JS, {"clear": self.clear_cards, "html": bool(self.archive)})
+        if self.archive:
+            cards_html = [item.pop("__html", "") for item in raw]
+            if cards_html:
+                doc = "<html><body>" + "\n".join(cards_html) + "</body></html>"
+                await self.archive.aput(doc, source="booking", kind="search_cards",
+                                        url=page.url, **self.snapshot_meta)
+        return await self.add(raw)
 
-        # --- GIAI ĐOẠN 1: SCROLL & LOAD MORE ---
-        print("    -> Bắt đầu quy trình mở rộng danh sách...")
+
+class ClickPagination:
+    """Phân trang kiểu cũ: scroll + bấm "Load more" tuần tự trên 1 page, thu hoạch sau mỗi lần bấm."""
+    name = "click"
+
+    def __init__(self, max_clicks=100):
+        self.max_clicks = max_clicks
+
+    async def run(self, page, url, harvest, harvest_page, stats, throttle=None):
         click_count = 0
-        max_clicks = 100
         
-        while click_count < max_clicks:
+        while click_count < self.max_clicks:
             last_height = await page.evaluate("document.body.scrollHeight")
             scroll_retries = 0
             
             while True:
                 await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                await asyncio.sleep(2)
+                await stats.wait("scroll", wait_page_grows(page, last_height))
                 
-                load_more_btn = page.locator('button:has-text("Load more results"), button:has-text("Hiển thị thêm kết quả"), button:has-text("Tải thêm kết quả")').first
+                load_more_btn = page.locator(LOAD_MORE_SELECTOR).first
                 if await load_more_btn.count() > 0 and await load_more_btn.is_visible():
                     break
                 
@@ -157,411 +632,402 @@ async def scrape_detailed_data(page, checkin, checkout, config, location_name, l
                     scroll_retries = 0
                     last_height = new_height
 
-            load_more_btn = page.locator('button:has-text("Load more results"), button:has-text("Hiển thị thêm kết quả"), button:has-text("Tải thêm kết quả")').first
+            load_more_btn = page.locator(LOAD_MORE_SELECTOR).first
             
             if await load_more_btn.count() > 0 and await load_more_btn.is_visible():
                 try:
+                    prev_count = await page.locator(CARD_SELECTOR).count()
                     await load_more_btn.scroll_into_view_if_needed()
                     await load_more_btn.click()
                     click_count += 1
-                    print(f"       + [Click {click_count}] Đã bấm nút. Đang chờ 10s...")
-                    await asyncio.sleep(10) 
+                    print(f"       + [Click {click_count}] Đã bấm nút. Đang chờ thẻ mới (> {prev_count})...")
+                    if not await stats.wait("load_more", wait_cards_increase(page, prev_count)):
+                        print("       ! Hết thời gian chờ thẻ mới.")
+                    await harvest()
                 except Exception as e:
                     print(f"       ! Lỗi bấm nút: {e}")
-                    await asyncio.sleep(2)
+                    await stats.wait("network_idle", page.wait_for_load_state("networkidle", timeout=WAIT_SCROLL_TIMEOUT))
             else:
                 print("    -> Không còn nút 'Hiển thị thêm'. Đã tải hết danh sách.")
                 break
-        
-        # --- GIAI ĐOẠN 2: TRÍCH XUẤT SIÊU TỐC BẰNG JAVASCRIPT ---
-        print("    -> Bắt đầu trích xuất dữ liệu (Chế độ JS Fast Mode)...")
-        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-        await asyncio.sleep(3)
 
-        # SỬ DỤNG r""" ĐỂ TRÁNH LỖI CÚ PHÁP REGEX VÀ STRING
-        raw_data = await page.evaluate(r"""() => {
-            const items = [];
-            const cards = document.querySelectorAll('div[data-testid="property-card"]');
-            
-            cards.forEach(card => {
-                let info = {};
-                
-                // 1. Name
-                const titleEl = card.querySelector('div[data-testid="title"]');
-                info['Hotel Name'] = titleEl ? titleEl.innerText : "N/A";
-                
-                // === LẤY LINK KHÁCH SẠN ===
-                const linkEl = card.querySelector('a[data-testid="title-link"]');
-                // Lấy href absolute (đầy đủ)
-                info['Hotel Link'] = linkEl ? linkEl.href : "N/A";
-                
-               // 2. Stars 
-                let stars = 0;
-                // Gom chung container lại để xử lý gọn hơn
-                const starContainer = card.querySelector('div[data-testid="rating-stars"]') || 
-                                      card.querySelector('div[data-testid="rating-squares"]');
-
-                if (starContainer) {
-                    // --- CÁCH 1: Ưu tiên tuyệt đối lấy từ aria-label (Chính xác 100%) ---
-                    // Ví dụ aria-label="5 out of 5 stars" hoặc "5 sao"
-                    const label = starContainer.getAttribute('aria-label');
-                    if (label) {
-                        const match = label.match(/^(\d+)/); // Lấy số đầu tiên tìm thấy
-                        if (match) stars = parseInt(match[1]);
-                    }
 
-                    // --- CÁCH 2: Nếu không có aria-label thì mới đếm SVG ---
-                    if (stars === 0) {
-                        const svgCount = starContainer.querySelectorAll('svg').length;
-                            stars = svgCount / 2; 
-                    }
-                }
+class OffsetPagination:
+    """
+    Phân trang theo tham số offset=: mở song song `parallel` page phụ trong cùng context,
+    mỗi page tải 1 trang kết quả (offset = k * page_size) và thu hoạch ngay.
+    Dừng khi 1 trang trả về ít hơn page_size thẻ hoặc không có thẻ mới (đã hết danh sách).
+    Trùng lặp giữa các trang do CardHarvester loại bỏ.
+    """
+    name = "offset"
 
-                // --- CÁCH 3: Quét text div ảo ---
-                if (stars === 0) {
-                    const ratingDiv = card.querySelector('div[aria-label*="sao"], div[aria-label*="star"]');
-                    if (ratingDiv) {
-                        const label = ratingDiv.getAttribute('aria-label');
-                        const match = label.match(/(\d+)/);
-                        if (match) stars = parseInt(match[1]);
-                    }
-                }
+    def __init__(self, page_size=25, parallel=3, max_pages=40):
+        self.page_size = page_size
+        self.parallel = parallel
+        self.max_pages = max_pages
 
-                info['Stars'] = stars > 0 ? stars : "N/A";
-
-                // === 3. Price Processing ===
-                let finalPriceStr = "0";
-                let originalPriceStr = "0";
-
-                const getNumber = (str) => {
-                    if (!str) return 0;
-                    // Chỉ giữ lại số, loại bỏ chữ và ký tự đặc biệt
-                    const numStr = str.replace(/\D/g, ''); 
-                    return numStr ? parseInt(numStr) : 0;
-                };
-
-                // --- CÁCH 1: Quét Text ẩn ---
-                //  Dùng 'textContent' để đọc được cả text bị ẩn
-                const invisibleTextEl = Array.from(card.querySelectorAll('div')).find(el => 
-                    el.textContent.includes('Original price') && el.textContent.includes('Current price')
-                );
-
-                if (invisibleTextEl) {
-                    const text = invisibleTextEl.textContent;
-                    const matches = text.match(/[\d,.]+/g); // Tìm các cụm số
-                    if (matches && matches.length >= 2) {
-                        const nums = matches.map(m => getNumber(m));
-                        originalPriceStr = Math.max(...nums).toString(); // Số lớn nhất là giá gốc
-                        finalPriceStr = Math.min(...nums).toString();    // Số nhỏ nhất là giá cuối
-                    }
-                }
+    async def _fetch(self, sub_page, url, offset, harvest_page, stats, throttle):
+        page_url = f"{url}&offset={offset}"
+        with TELEMETRY.timer("nav_seconds", page_url):
+            await RETRY.run(page_url, lambda: sub_page.goto(page_url, timeout=60000), throttle)
+        if not await stats.wait("offset_page", sub_page.wait_for_selector(CARD_SELECTOR, timeout=WAIT_CARDS_TIMEOUT)):
+            return 0, 0
+        n_cards = await sub_page.locator(CARD_SELECTOR).count()
+        n_new = await harvest_page(sub_page)
+        print(f"       + [offset={offset}] {n_cards} thẻ, {n_new} mới.")
+        return n_cards, n_new
 
-                // --- CÁCH 2: Fallback dựa vào vị trí DOM ---
-                // Chỉ chạy nếu chưa lấy được giá gốc hoặc giá gốc đang bằng 0
-                if (originalPriceStr === "0" || originalPriceStr === finalPriceStr) {
-                    
-                    // A. Xác định giá cuối trước
-                    const finalPriceEl = card.querySelector('[data-testid="price-and-discounted-price"]');
-                    
-                    if (finalPriceEl) {
-                        const currentVal = getNumber(finalPriceEl.innerText);
-                        finalPriceStr = currentVal.toString();
-
-                        // B. Tìm giá gốc dựa vào vị trí tương đối trong ảnh DOM
-                        // Bước 1: Tìm lên thẻ cha <div> chứa giá cuối
-                        const parentDiv = finalPriceEl.closest('div');
-                        
-                        // Bước 2: Tìm thẻ <span> nằm ngay trước thẻ cha đó
-                        if (parentDiv && parentDiv.previousElementSibling) {
-                            const sibling = parentDiv.previousElementSibling;
-                            if (sibling.tagName === 'SPAN') {
-                                const siblingVal = getNumber(sibling.innerText);
-                                // Chỉ nhận nếu nó lớn hơn giá cuối
-                                if (siblingVal > currentVal) {
-                                    originalPriceStr = siblingVal.toString();
-                                }
-                            }
-                        }
-                        
-                        // Bước 3: Quét tất cả thẻ span có aria-hidden="true"
-                        if (originalPriceStr === "0") {
-                            const potentialSpans = card.querySelectorAll('span[aria-hidden="true"]');
-                            for (const span of potentialSpans) {
-                                const val = getNumber(span.innerText);
-                                // Nếu tìm thấy số nào lớn hơn giá cuối thì khả năng cao là giá gốc
-                                if (val > currentVal) {
-                                    originalPriceStr = val.toString();
-                                    break; 
-                                }
-                            }
-                        }
-                    }
-                }
+    async def run(self, page, url, harvest, harvest_page, stats, throttle=None):
+        # offset=0 chính là trang đang mở (đã thu hoạch), bắt đầu từ trang thứ 2
+        sub_pages = [TELEMETRY.attach_page(await page.context.new_page()) for _ in range(self.parallel)]
+        try:
+            index = 1
+            while index < self.max_pages:
+                wave = list(range(index, min(index + self.parallel, self.max_pages)))
+                results = await asyncio.gather(
+                    *(self._fetch(sp, url, i * self.page_size, harvest_page, stats, throttle)
+                      for sp, i in zip(sub_pages, wave)),
+                    return_exceptions=True,
+                )
+                index += len(wave)
+                ended = False
+                for res in results:
+                    if isinstance(res, Exception):
+                        print(f"       ! Lỗi tải trang offset: {res}")
+                        ended = True
+                    elif res[0] < self.page_size or res[1] == 0:
+                        ended = True
+                if ended:
+                    print("    -> Trang offset cuối cùng đã tải. Đã tải hết danh sách.")
+                    break
+        finally:
+            for sp in sub_pages:
+                await sp.close()
 
-                // --- C. Safety Check & Finalize ---
-                let fVal = parseInt(finalPriceStr);
-                let oVal = parseInt(originalPriceStr);
 
-                // Nếu vẫn không tìm được giá gốc thì chấp nhận nó bằng giá cuối
-                if (oVal === 0) oVal = fVal;
-                // Đảm bảo logic: Giá gốc không được nhỏ hơn giá bán
-                if (oVal < fVal) oVal = fVal;
+def make_pagination(mode):
+    if mode == "offset":
+        return OffsetPagination(OFFSET_PAGE_SIZE, OFFSET_PARALLEL_PAGES, OFFSET_MAX_PAGES)
+    return ClickPagination()
 
-                info['Final Price'] = fVal.toString();
-                info['Original Price'] = oVal.toString();
-                
-                // === 4. Rating ===
-                let ratingScore = "N/A";
-                const scoreCard = card.querySelector('[data-testid="review-score"] div[aria-hidden="true"]') || 
-                                  card.querySelector('[data-testid="review-score"] div:first-child') ||
-                                  card.querySelector('.ac4a7896c7');
-
-                if (scoreCard) {
-                    let rawScore = scoreCard.innerText.trim();
-                    rawScore = rawScore.replace(',', '.'); // Xử lý dấu phẩy
-                    const match = rawScore.match(/(\d+(\.\d+)?)/);
-                    if (match) ratingScore = match[0];
-                }
-                info['Rating Score'] = ratingScore;
-                
-                // === Review Count (Xử lý dấu chấm hàng nghìn) ===
-                let reviewCount = "N/A";
-                const reviewTextEl = card.querySelector('[data-testid="review-score"] div:last-child') ||
-                                     card.querySelector('[data-testid="review-score"]');
-                if (reviewTextEl) {
-                    const rText = reviewTextEl.innerText.replace(/\./g, ''); // Bỏ dấu chấm (1.200 -> 1200)
-                    const match = rText.match(/(\d+)\s*(reviews|đánh giá)/i);
-                    if (match) reviewCount = match[1];
-                }
-                info['Review Count'] = reviewCount;
 
-                // === 5. LOCATION SCORE ===
-                let locScore = "N/A";
-                const secondaryScore = card.querySelector('[data-testid="secondary-review-score-link"]');
-                
-                // Tìm text theo từ khóa nếu không có selector ID
-                const locationTextElement = Array.from(card.querySelectorAll('span, div')).find(el => 
-                    (el.innerText.includes('Location') || el.innerText.includes('Địa điểm')) && 
-                    /\d+[.,]\d+/.test(el.innerText)
-                );
-
-                let locRaw = "";
-                if (secondaryScore) {
-                    locRaw = secondaryScore.innerText;
-                } else if (locationTextElement) {
-                    locRaw = locationTextElement.innerText;
-                }
+def build_search_url(checkin, checkout, config, location_query):
+    url = f"{BASE_URL}?ss={location_query}&checkin={checkin}&checkout={checkout}"
+    url += f"&group_adults={config['adults']}&no_rooms={config['rooms']}&group_children={config['children']}"
+    for age in config['ages']:
+        url += f"&age={age}"
+    return url
 
-                if (locRaw) {
-                    locRaw = locRaw.replace(',', '.'); // Xử lý dấu phẩy
-                    const match = locRaw.match(/(\d+(\.\d+)?)/); 
-                    if (match && parseFloat(match[0]) <= 10) {
-                        locScore = match[0];
-                    }
-                }
-                info['Location Score'] = locScore;
 
-                const addrEl = card.querySelector('span[data-testid="address"]');
-                info['Address'] = addrEl ? addrEl.innerText : "N/A";
-                const distEl = card.querySelector('span[data-testid="distance"]');
-                info['Distance'] = distEl ? distEl.innerText : "N/A";
+async def scrape_detailed_data(page, checkin, checkout, config, location_name, location_query, throttle=None, stats=None, on_batch=None, pagination=None):
+    """
+    Cào 1 kịch bản. Thẻ được thu hoạch sau mỗi lần "Load more":
+    - có on_batch: từng đợt dòng mới được đẩy ngay vào on_batch, hàm trả về [];
+      lỗi hệ thống được ném lại để caller đánh dấu kịch bản failed;
+    - không có: trả về toàn bộ dòng khi kết thúc.
+    """
+    # 1. Tạo URL
+    url = build_search_url(checkin, checkout, config, location_query)
+    if stats is None:
+        stats = WaitStats(f"{location_name} | {config['name']}")
 
-                // Tìm h4 có role="link" (theo ảnh) hoặc h4 bất kỳ trong phần thông tin
-                const roomEl = card.querySelector('h4[role="link"]') || card.querySelector('h4');
-                info['Room Type'] = roomEl ? roomEl.innerText : "N/A";
-                
-                const unitEl = card.querySelector('div[data-testid="recommended-units"]');
-                let bedTxt = "N/A";
-                if (unitEl) {
-                    // Dùng regex split để an toàn hơn với Raw String
-                    const lines = unitEl.innerText.split(/\n/);
-                    for (let line of lines) {
-                        if (line.toLowerCase().includes('bed') || line.toLowerCase().includes('giường')) {
-                            bedTxt = line;
-                            break;
-                        }
-                    }
-                }
-                info['Bed Type'] = bedTxt;
+    print(f"\n >> [{location_name} | Scenario: {config['name']}] Truy cập Booking...")
+    
+    TELEMETRY.attach_page(page)
+    collector = None
+    if CAPTURE_MODE == "network":
+        collector = SearchPayloadCollector(page, record_dir=CAPTURE_RECORD_DIR)
+        collector.attach()
 
-                const cardText = (card.innerText || "").toLowerCase();
-                
-                const hasCancel = cardText.includes('free cancellation') || 
-                                  cardText.includes('miễn phí hủy') || 
-                                  cardText.includes('hủy miễn phí');
-                info['Free Cancellation'] = hasCancel ? "Yes" : "No";
-
-                let hasBreakfast = false;
-                const bfCandidates = card.querySelectorAll('span, li, div');
-                for (let el of bfCandidates) {
-                    const t = (el.textContent || "").toLowerCase().trim();
-                    if (t.includes('breakfast included') || t.includes('bao gồm bữa sáng') ||
-                        t.includes('bữa sáng miễn phí') || t.includes('ăn sáng miễn phí')) {
-                        hasBreakfast = true;
-                        break;
-                    }
-                }
+    harvester = CardHarvester(
+        lambda item: build_scenario_row(item, config, location_name, checkin, checkout),
+        on_batch=on_batch,
+        archive=SNAPSHOT_ARCHIVE,
+        snapshot_meta={"search_location": location_name, "scenario": config["name"], "check_in": checkin},
+    )
 
-                if (!hasBreakfast) {
-                    const unitInfo = card.querySelector('[data-testid="recommended-units"]');
-                    if (unitInfo) {
-                        const uText = unitInfo.innerText.toLowerCase();
-                        if (uText.includes('breakfast') || uText.includes('bữa sáng')) {
-                            hasBreakfast = true;
-                        }
-                    }
-                }
-                info['Breakfast Included'] = hasBreakfast ? "Yes" : "No";
-                
-                let badgeText = "None";
-                const dealBadge = card.querySelector('[data-testid="property-card-deal"]');
-                if (dealBadge) {
-                    badgeText = dealBadge.innerText.trim();
-                } else {
-                    const normalBadge = card.querySelector('[data-testid="badge"]');
-                    if (normalBadge) {
-                        badgeText = normalBadge.innerText.trim();
-                    }
-                }
-                info['Badge Deal'] = badgeText;
-
-                items.push(info);
-            });
-            return items;
-        }""")
-
-        print(f"       Đã trích xuất xong {len(raw_data)} dòng dữ liệu từ JS.")
-
-        # Xử lý lại dữ liệu 
-        all_hotels_data = []
-        for item in raw_data:
-            try: f_price = int(item['Final Price'])
-            except: f_price = 0
-            try: o_price = int(item['Original Price'])
-            except: o_price = f_price
-            
-            if o_price < f_price and o_price > 0:
-                o_price, f_price = f_price, o_price
-            elif o_price == 0:
-                o_price = f_price
-
-            final_item = {
-                "Scenario": config['name'],
-                "search_location": location_name,
-                "Check-in": checkin,
-                "Check-out": checkout,
-                "Adults": config['adults'],
-                "Children": config['children'],
-                "Rooms": config['rooms'],
-                "Source": "Booking.com",
-                **item,
-                "Final Price": f_price,
-                "Original Price": o_price
-            }
-            all_hotels_data.append(final_item)
+    async def harvest():
+        if collector:
+            await collector.drain()
+            n_new = await harvester.add(collector.take_new())
+        else:
+            n_new = await harvester.harvest_dom(page)
+        if n_new:
+            print(f"       + Thu hoạch {n_new} thẻ mới (tổng {harvester.total}).")
+
+    try:
+        with TELEMETRY.timer("nav_seconds", url):
+            await RETRY.run(url, lambda: page.goto(url, timeout=60000), throttle)
+        
+        # --- XỬ LÝ POPUP ---
+        # Chờ thẻ khách sạn đầu tiên thay vì ngủ cố định
+        await stats.wait("cards_ready", page.wait_for_selector(CARD_SELECTOR, timeout=WAIT_CARDS_TIMEOUT))
+        await dismiss_popups(page)
+        await harvest()
+
+        # --- GIAI ĐOẠN 1: PHÂN TRANG (click "Load more" hoặc theo offset) ---
+        pagination = pagination or make_pagination(PAGINATION_MODE)
+        print(f"    -> Bắt đầu mở rộng danh sách (phân trang: {pagination.name})...")
+        await pagination.run(page, url, harvest, harvester.harvest_dom, stats, throttle)
+        
+        # --- GIAI ĐOẠN 2: VÉT NỐT PHẦN CUỐI DANH SÁCH ---
+        print(f"    -> Vét nốt dữ liệu (Chế độ {CAPTURE_MODE})...")
+        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        await stats.wait("network_idle", page.wait_for_load_state("networkidle", timeout=WAIT_IDLE_TIMEOUT))
+        await harvest()
 
-        return all_hotels_data
+        if collector:
+            dom_count = await page.locator(CARD_SELECTOR).count()
+            print(f"       [network] {collector.payload_count} payload -> {harvester.total} khách sạn (DOM có {dom_count} thẻ).")
+            if harvester.total < dom_count:
+                print("       [network] Payload thiếu so với DOM -> bổ sung bằng trích xuất DOM.")
+                await harvester.harvest_dom(page)
+
+        print(f"       Đã trích xuất xong {harvester.total} dòng dữ liệu.")
+        report = stats.report()
+        print(f"       ⏱ Tổng {report['total_s']}s | chờ {report['wait_s']}s | làm việc {report['work_s']}s")
+
+        return harvester.rows
 
     except Exception as e:
         print(f"    Lỗi hệ thống: {e}")
         import traceback
         traceback.print_exc()
-        return []
+        if harvester.total:
+            print(f"    -> Đã lưu được {harvester.total} dòng trước khi lỗi.")
+        if on_batch:
+            raise
+        return harvester.rows
+    finally:
+        if collector:
+            collector.detach()
+    
+def prepare_scenario_frame(data):
+    """Chuẩn hóa 1 lô dòng (có thể từ nhiều kịch bản) thành DataFrame theo cột của hotel_scenarios."""
+    df = pd.DataFrame(data)
     
+    # Danh sách cột
+    cols = ["search_location", "Scenario", "Hotel Name", "Hotel Link", "Stars", "Final Price", "Original Price", 
+            "Rating Score", "Review Count", "Location Score", 
+            "Address", "Distance", "Room Type", "Bed Type", 
+            "Free Cancellation", "Breakfast Included", "Badge Deal",
+            "Check-in", "Adults", "Children", "Rooms"]
+    
+    existing_cols = [c for c in cols if c in df.columns]
+    df = df[existing_cols]
+
+    numeric_cols = ["Stars", "Rating Score", "Review Count", "Location Score"]
+    for col in numeric_cols:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    rename_map = {
+        "search_location": "search_location",
+        "Scenario": "scenario",
+        "Hotel Name": "hotel_name",
+        "Hotel Link": "hotel_link",
+        "Stars": "stars",
+        "Final Price": "final_price",
+        "Original Price": "original_price",
+        "Rating Score": "rating_score",
+        "Review Count": "review_count",
+        "Location Score": "location_score",
+        "Address": "address",
+        "Distance": "distance",
+        "Room Type": "room_type",
+        "Bed Type": "bed_type",
+        "Free Cancellation": "free_cancellation",
+        "Breakfast Included": "breakfast_included",
+        "Badge Deal": "badge_deal",
+        "Check-in": "check_in",
+        "Adults": "adults",
+        "Children": "children",
+        "Rooms": "rooms"
+    }
+    return df.rename(columns=rename_map)
+
+
+def print_wait_reports(wait_reports):
+    """In bảng thời gian chờ / làm việc của từng kịch bản."""
+    if not wait_reports:
+        return
+    print("\n BÁO CÁO THỜI GIAN (chờ vs làm việc):")
+    for r in wait_reports:
+        detail = ", ".join(
+            f"{name}={w['seconds']:.1f}s/{w['count']}" + (f" ({w['timeouts']} timeout)" if w['timeouts'] else "")
+            for name, w in r["waits"].items()
+        )
+        print(f"   - {r['scenario']}: tổng {r['total_s']}s | chờ {r['wait_s']}s | làm {r['work_s']}s | {detail}")
+    total_wait = sum(r["wait_s"] for r in wait_reports)
+    total_work = sum(r["work_s"] for r in wait_reports)
+    print(f"   => Tổng chờ {total_wait:.1f}s | tổng làm việc {total_work:.1f}s")
+
+
+def finish_unit(engine, key, status, row_count, error, write_error, aliases=()):
+    """
+    Callback sau flush: dòng chưa vào DB thì kịch bản không được coi là xong (resume sẽ cào lại).
+    aliases: các đơn vị trùng URL với key, nhận cùng trạng thái.
+    """
+    if write_error is not None:
+        status, error = crawl_state.FAILED, f"Lỗi ghi DB: {write_error}"[:500]
+    crawl_state.mark_unit(engine, key, status, row_count, error)
+    for alias in aliases:
+        crawl_state.mark_alias(engine, alias, key, status)
+
+
+async def scenario_worker(worker_id, pool, queue, throttle, writer, engine, c_in, c_out, wait_reports, aliases=None):
+    """
+    Mỗi worker mượn 1 context ấm trong pool cho từng kịch bản, lần lượt lấy kịch bản trong queue.
+    Mỗi đợt thẻ thu hoạch được đẩy vào writer; writer gom lô và COPY ở thread nền.
+    Trạng thái done/failed chỉ được ghi sau khi writer đã flush hết dòng của kịch bản.
+    """
+    while True:
+        key, loc_query, config = await queue.get()
+        loc_name = key[0]
+        try:
+            print(f" [Worker {worker_id}] {loc_name} | {config['name']}")
+            unit_aliases = (aliases or {}).get(key, ())
+            stats = WaitStats(f"{loc_name} | {config['name']}")
+            row_count = 0
+
+            async def on_batch(rows):
+                nonlocal row_count
+                row_count += len(rows)
+                await writer.put(rows, token=key)
+
+            try:
+                # Lỗi DB khi đánh dấu running xử lý như lỗi cào: đơn vị failed, worker vẫn sống
+                await asyncio.to_thread(crawl_state.mark_unit, engine, key, crawl_state.RUNNING)
+                async with throttle.slot(BASE_URL), pool.page() as page:
+                    await scrape_detailed_data(page, c_in, c_out, config, loc_name, loc_query, throttle, stats, on_batch=on_batch)
+                status, error = crawl_state.DONE, None
+                TELEMETRY.observe("cards_per_scenario", BASE_URL, row_count)
+            except Exception as e:
+                status, error = crawl_state.FAILED, str(e)[:500]
+                TELEMETRY.inc("errors_total", BASE_URL)
+            wait_reports.append(stats.report())
+            await writer.after_flush(
+                lambda write_error, key=key, status=status, n=row_count, error=error, dup=unit_aliases:
+                    finish_unit(engine, key, status, n, error, write_error, dup),
+                token=key,
+            )
+        except Exception as e:
+            # Không để 1 lỗi ngoài dự kiến giết worker: hết worker thì queue.join() treo mãi
+            print(f" [Worker {worker_id}] Lỗi với {loc_name} | {config['name']}: {e}")
+        finally:
+            queue.task_done()
+
+
 async def main():
+    # In ra kiểm tra
+    print(json.dumps(RANDOM_CONFIGS, indent=2))
+
     # 1. Khởi tạo Engine Database
     print(" Đang kết nối Database Postgres...")
     try:
         engine = create_engine(DB_CONNECTION_STR)
         
         with engine.connect() as conn:
-            # DROP table cũ
-            print(f"   Đang xóa bảng cũ '{TABLE_NAME}' (nếu có) để cập nhật cấu trúc mới...")
-            conn.execute(text(f"DROP TABLE IF EXISTS {TABLE_NAME};"))
+            if RESET_TABLES:
+                # DROP table cũ
+                print(f"   Đang xóa bảng cũ '{TABLE_NAME}' và '{crawl_state.STATE_TABLE}' để cào lại từ đầu...")
+                conn.execute(text(f"DROP TABLE IF EXISTS {TABLE_NAME};"))
+                conn.execute(text(f"DROP TABLE IF EXISTS {crawl_state.STATE_TABLE};"))
             
-            print("   Đang tạo bảng mới...")
+            print("   Đang tạo bảng (nếu chưa có)...")
             conn.execute(text(CREATE_TABLE_SQL))
             conn.commit()
-            print("   Đã chuẩn bị Database xong!")
+        crawl_state.ensure_state_table(engine)
+        print("   Đã chuẩn bị Database xong!")
 
     except Exception as e:
         print(f" Lỗi kết nối/xóa Database: {e}")
         return
 
+    # --- NGÀY Ở ---
+    if CHECK_IN_DATE:
+        tomorrow = datetime.strptime(CHECK_IN_DATE, "%Y-%m-%d")
+    else:
+        tomorrow = datetime.now() + timedelta(days=5)
+    next_day = tomorrow + timedelta(days=5)
+    c_in = tomorrow.strftime("%Y-%m-%d")
+    c_out = next_day.strftime("%Y-%m-%d")
+
+    # --- XÁC ĐỊNH ĐƠN VỊ CẦN CÀO (bỏ qua đơn vị đã done) ---
+    units = []
+    for loc_name, loc_query in LOCATIONS.items():
+        for config in RANDOM_CONFIGS:
+            units.append(((loc_name, config['name'], c_in), loc_query, config))
+    crawl_state.register_units(engine, [key for key, _, _ in units])
+    statuses = crawl_state.load_statuses(engine, c_in)
+
+    # Không bao giờ mở cùng 1 URL tìm kiếm 2 lần: đơn vị trùng URL đi theo trạng thái của đơn vị đại diện
+    todo, aliases, done_aliases = crawl_state.group_by_url(
+        units, statuses, lambda unit: build_search_url(c_in, c_out, unit[2], unit[1]))
+    for key, owner in done_aliases:
+        crawl_state.mark_alias(engine, key, owner)
+        statuses[key] = crawl_state.DONE
+
+    n_done = sum(1 for st in statuses.values() if st == crawl_state.DONE)
+    print(f" Check-in {c_in}: {n_done} đơn vị đã xong, {len(todo)} đơn vị cần cào (pending/running/failed).")
+    if not todo:
+        print(" Không còn gì để cào.")
+        return
+    removed = crawl_state.discard_partial_rows(engine, TABLE_NAME, [key for key, _, _ in todo])
+    if removed:
+        print(f" Đã xóa {removed} dòng dở dang của các đơn vị sẽ cào lại.")
+
     async with async_playwright() as p:
         print(" KHỞI ĐỘNG TRÌNH DUYỆT...")
         
-        tomorrow = datetime.now() + timedelta(days=5)
-        next_day = tomorrow + timedelta(days=5)
-        c_in = tomorrow.strftime("%Y-%m-%d")
-        c_out = next_day.strftime("%Y-%m-%d")
-        
         browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context(viewport={'width': 1366, 'height': 768}, locale="vi-VN")
-        page = await context.new_page()
 
-        for loc_name, loc_query in LOCATIONS.items():
-            print(f"\n==========================================")
-            print(f" BẮT ĐẦU CÀO DỮ LIỆU TẠI: {loc_name.upper()}")
-            print(f"==========================================")
-            
-            for config in RANDOM_CONFIGS:
-                # Truyền thêm tham số location vào hàm cào
-                data = await scrape_detailed_data(page, c_in, c_out, config, loc_name, loc_query)
-                
-                if data:
-                    df = pd.DataFrame(data)
-                    
-                    # Danh sách cột
-                    cols = ["search_location", "Scenario", "Hotel Name", "Hotel Link", "Stars", "Final Price", "Original Price", 
-                            "Rating Score", "Review Count", "Location Score", 
-                            "Address", "Distance", "Room Type", "Bed Type", 
-                            "Free Cancellation", "Breakfast Included", "Badge Deal",
-                            "Check-in", "Adults", "Children", "Rooms"]
-                    
-                    existing_cols = [c for c in cols if c in df.columns]
-                    df = df[existing_cols]
-
-                    numeric_cols = ["Stars", "Rating Score", "Review Count", "Location Score"]
-                    for col in numeric_cols:
-                        if col in df.columns:
-                            df[col] = pd.to_numeric(df[col], errors='coerce')
-
-                    rename_map = {
-                        "search_location": "search_location",
-                        "Scenario": "scenario",
-                        "Hotel Name": "hotel_name",
-                        "Hotel Link": "hotel_link",
-                        "Stars": "stars",
-                        "Final Price": "final_price",
-                        "Original Price": "original_price",
-                        "Rating Score": "rating_score",
-                        "Review Count": "review_count",
-                        "Location Score": "location_score",
-                        "Address": "address",
-                        "Distance": "distance",
-                        "Room Type": "room_type",
-                        "Bed Type": "bed_type",
-                        "Free Cancellation": "free_cancellation",
-                        "Breakfast Included": "breakfast_included",
-                        "Badge Deal": "badge_deal",
-                        "Check-in": "check_in",
-                        "Adults": "adults",
-                        "Children": "children",
-                        "Rooms": "rooms"
-                    }
-                    df = df.rename(columns=rename_map)
+        # --- HÀNG ĐỢI KỊCH BẢN: (location × scenario) ---
+        queue = asyncio.Queue()
+        for item in todo:
+            queue.put_nowait(item)
 
-                    try:
-                        df.to_sql(TABLE_NAME, engine, if_exists='append', index=False)
-                        print(f"    ->  Đã lưu {len(data)} dòng của {loc_name} vào Database.")
-                    except Exception as e:
-                        print(f"    ->  Lỗi lưu Database: {e}")
-                
-                await asyncio.sleep(2) 
+        total = queue.qsize()
+        n_workers = min(MAX_CONCURRENT_SCENARIOS, total)
+        print(f" Tổng {total} kịch bản | tối đa {n_workers} worker song song (bắt đầu {CONCURRENCY_INITIAL})")
+
+        pool = await BrowserPool(
+            browser, size=n_workers, storage_state_path=BROWSER_STATE_FILE, warmup=warm_booking,
+            max_navigations=CONTEXT_MAX_NAVIGATIONS, max_memory_mb=CONTEXT_MAX_MEMORY_MB,
+            context_options={"viewport": {'width': 1366, 'height': 768}, "locale": "vi-VN"},
+        ).start()
+
+        throttle = AdaptiveRateLimiter(
+            rate=RATE_INITIAL, min_rate=RATE_MIN, max_rate=RATE_MAX,
+            concurrency=min(CONCURRENCY_INITIAL, n_workers), max_concurrency=n_workers,
+            telemetry=TELEMETRY,
+        )
+        started = time.monotonic()
+        wait_reports = []
+        writer = BatchedCopyWriter(
+            engine, TABLE_NAME, TABLE_COLUMNS, prepare=prepare_scenario_frame,
+            batch_size=WRITER_BATCH_SIZE, flush_interval=WRITER_FLUSH_INTERVAL,
+        ).start()
+        workers = [
+            asyncio.create_task(scenario_worker(i + 1, pool, queue, throttle, writer, engine, c_in, c_out, wait_reports, aliases))
+            for i in range(n_workers)
+        ]
+        await queue.join()
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await asyncio.to_thread(writer.close)
+        w = writer.stats()
+        print(f" [writer] {w['rows_written']} dòng / {w['batches']} lô | lỗi {w['rows_failed']} dòng | "
+              f"{w['rows_per_second']} dòng/s | thời gian COPY {w['flush_seconds']}s")
 
+        throttle.print_report()
+        print(f" [pool] Đã thay {pool.recycled} context trong lượt chạy.")
+        await pool.close()
         await browser.close()
-        print(f"\n HOÀN TẤT TOÀN BỘ QUÁ TRÌNH CÀO DỮ LIỆU!")
+        print_wait_reports(wait_reports)
+        TELEMETRY.write()
+        print(f"\n HOÀN TẤT TOÀN BỘ QUÁ TRÌNH CÀO DỮ LIỆU! ({time.monotonic() - started:.0f}s)")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
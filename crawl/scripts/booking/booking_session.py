@@ -0,0 +1,26 @@
+"""
+Xử lý phiên Booking.com dùng chung cho booking_scraper.py và details_scraper.py:
+tắt popup đăng nhập và hàm warmup cho BrowserPool (lưu consent vào storage_state).
+"""
+import os
+
+BROWSER_STATE_FILE = os.path.join("browser_state", "booking.json")
+HOME_URL = "https://www.booking.com/index.vi.html"
+
+
+async def dismiss_popups(page):
+    try: await page.keyboard.press("Escape")
+    except: pass
+    try:
+        close_btn = page.locator('button[aria-label="Bỏ qua thông tin đăng nhập"], button[aria-label="Đóng"]')
+        if await close_btn.count() > 0: await close_btn.first.click()
+    except: pass
+
+
+async def warm_booking(page):
+    """Chạy 1 lần cho pool: chấp nhận cookie consent + tắt popup đăng nhập, rồi pool lưu storage_state."""
+    await page.goto(HOME_URL, timeout=60000)
+    try:
+        await page.locator("#onetrust-accept-btn-handler").click(timeout=5000)
+    except: pass
+    await dismiss_popups(page)
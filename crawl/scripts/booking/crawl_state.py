@@ -0,0 +1,126 @@
+"""
+Trạng thái cào theo đơn vị (location, scenario, check_in) để chạy tiếp sau khi bị ngắt.
+
+Mỗi đơn vị có status: pending -> running -> done | failed, kèm số dòng đã ghi
+và số lần thử. Chạy lại thì bỏ qua đơn vị `done`, chỉ cào lại `pending`/`failed`
+(và `running` bị bỏ dở do tắt ngang).
+"""
+from sqlalchemy import text
+
+STATE_TABLE = "crawl_state"
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+CREATE_STATE_SQL = f"""
+CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+    search_location VARCHAR(100) NOT NULL,
+    scenario VARCHAR(255) NOT NULL,
+    check_in DATE NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT '{PENDING}',
+    row_count INTEGER DEFAULT 0,
+    attempts INTEGER DEFAULT 0,
+    last_error TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (search_location, scenario, check_in)
+);
+"""
+
+
+def ensure_state_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(CREATE_STATE_SQL))
+
+
+def register_units(engine, keys):
+    """Thêm các đơn vị chưa có vào bảng trạng thái (status = pending)."""
+    if not keys:
+        return
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"""
+                INSERT INTO {STATE_TABLE} (search_location, scenario, check_in, status)
+                VALUES (:loc, :sc, :ci, '{PENDING}')
+                ON CONFLICT (search_location, scenario, check_in) DO NOTHING
+            """),
+            [{"loc": loc, "sc": sc, "ci": ci} for loc, sc, ci in keys],
+        )
+
+
+def load_statuses(engine, check_in):
+    """Trả về {(location, scenario, check_in): status} của 1 ngày check-in."""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(f"SELECT search_location, scenario, status FROM {STATE_TABLE} WHERE check_in = :ci"),
+            {"ci": check_in},
+        ).fetchall()
+    return {(r[0], r[1], check_in): r[2] for r in rows}
+
+
+def group_by_url(units, statuses, url_of):
+    """
+    Gom các đơn vị trùng URL tìm kiếm (cào 1 lần cho cả nhóm).
+    units: [(key, ...)]; url_of(unit) -> URL. Trả về (todo, aliases, done_aliases):
+      todo         : đơn vị đại diện cần cào (chưa done), giữ thứ tự units
+      aliases      : {key đại diện trong todo: [key trùng URL]} -- đánh dấu theo đại diện khi xong
+      done_aliases : [(key, key đã done cùng URL)] -- nhóm đã có đơn vị done, các key này xong luôn
+    """
+    groups = {}
+    for unit in units:
+        groups.setdefault(url_of(unit), []).append(unit)
+    todo, aliases, done_aliases = [], {}, []
+    for unit in units:
+        group = groups.get(url_of(unit))
+        if not group or group[0] is not unit:
+            continue
+        keys = [u[0] for u in group]
+        done = next((k for k in keys if statuses.get(k) == DONE), None)
+        if done is not None:
+            done_aliases.extend((k, done) for k in keys if statuses.get(k) != DONE)
+            continue
+        todo.append(unit)
+        if len(keys) > 1:
+            aliases[keys[0]] = keys[1:]
+    return todo, aliases, done_aliases
+
+
+def mark_alias(engine, key, owner, status=DONE, row_count=0):
+    """Đơn vị trùng URL với `owner`: nhận trạng thái của owner (dòng dữ liệu nằm dưới owner)."""
+    mark_unit(engine, key, status, row_count, f"Trùng URL tìm kiếm với {owner[0]} | {owner[1]}")
+
+
+def mark_unit(engine, key, status, row_count=None, error=None):
+    loc, sc, ci = key
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"""
+                UPDATE {STATE_TABLE}
+                SET status = :status,
+                    row_count = COALESCE(:rows, row_count),
+                    attempts = attempts + CASE WHEN :status = '{RUNNING}' THEN 1 ELSE 0 END,
+                    last_error = :err,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE search_location = :loc AND scenario = :sc AND check_in = :ci
+            """),
+            {"status": status, "rows": row_count, "err": error, "loc": loc, "sc": sc, "ci": ci},
+        )
+
+
+def discard_partial_rows(engine, data_table, keys):
+    """Xóa dòng dở dang của các đơn vị sắp cào lại để không bị ghi trùng."""
+    if not keys:
+        return 0
+    deleted = 0
+    with engine.begin() as conn:
+        for loc, sc, ci in keys:
+            result = conn.execute(
+                text(f"""
+                    DELETE FROM {data_table}
+                    WHERE search_location = :loc AND scenario = :sc AND check_in = :ci
+                """),
+                {"loc": loc, "sc": sc, "ci": ci},
+            )
+            deleted += result.rowcount or 0
+    return deleted
@@ -0,0 +1,291 @@
+"""
+Ghi dữ liệu theo lô bằng PostgreSQL COPY FROM STDIN ở thread nền.
+
+Các coroutine cào chỉ việc `await writer.put(rows)` (đẩy vào hàng đợi, không
+chặn event loop); thread nền gom dòng từ mọi kịch bản đang chạy và flush khi
+đủ `batch_size` dòng hoặc sau `flush_interval` giây.
+
+Với engine không phải PostgreSQL (vd SQLite làm bản thay thế khi kiểm thử),
+writer tự chuyển sang INSERT nhiều dòng.
+
+Có `conflict_key` thì mỗi lô là 1 upsert: COPY vào bảng tạm rồi
+INSERT ... SELECT ... ON CONFLICT (conflict_key) DO UPDATE (PostgreSQL),
+hoặc executemany INSERT ... ON CONFLICT DO UPDATE với engine khác.
+
+Lô ghi lỗi không làm dừng writer (bị bỏ qua, đếm vào rows_failed), nhưng callback của
+after_flush() nhận lỗi đó để người gọi không đánh dấu "xong" cho dữ liệu chưa vào DB.
+
+Chạy thử nhanh (mặc định SQLite trong bộ nhớ):
+    python db_writer.py [DB_URL] [SỐ_DÒNG]
+"""
+import asyncio
+import csv
+import io
+import queue
+import sys
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+_STOP = object()
+
+
+class _Callback:
+    __slots__ = ("fn", "token")
+
+    def __init__(self, fn, token):
+        self.fn = fn
+        self.token = token
+
+
+class BatchedCopyWriter:
+    def __init__(self, engine, table, columns, prepare=None,
+                 batch_size=1000, flush_interval=2.0, max_pending=10000,
+                 conflict_key=None, touch_column=None):
+        """
+        engine: SQLAlchemy engine
+        table, columns: bảng đích và thứ tự cột khi COPY
+        prepare: hàm (list dict) -> DataFrame đã chuẩn hóa tên cột, chạy ở thread nền
+        max_pending: số lô tối đa chờ trong hàng đợi (quá thì put() phải đợi)
+        conflict_key: cột khóa (hoặc list cột của khóa ghép) -> ghi kiểu upsert
+                      (dòng trùng khóa trong lô giữ dòng cuối)
+        touch_column: cột thời gian được đặt CURRENT_TIMESTAMP khi upsert cập nhật dòng cũ
+        """
+        self.engine = engine
+        self.table = table
+        self.columns = list(columns)
+        if isinstance(conflict_key, str):
+            conflict_key = [conflict_key]
+        self.conflict_key = list(conflict_key) if conflict_key else None
+        self.touch_column = touch_column
+        self.prepare = prepare or pd.DataFrame
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.use_copy = engine.dialect.name == "postgresql"
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name=f"writer-{table}", daemon=True)
+        self._lock = threading.Lock()
+        self._failed = {}           # token -> lỗi của lô chứa dòng mang token đó
+        self._last_error = None     # lỗi bất kỳ từ sau callback không token gần nhất
+
+        # --- Bộ đếm throughput ---
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.batches = 0
+        self.flush_seconds = 0.0
+        self.started_at = None
+
+    # ---------- phía event loop ----------
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread.start()
+        return self
+
+    async def put(self, rows, token=None):
+        """
+        Đẩy 1 đợt dòng vào hàng đợi; chỉ đợi khi hàng đợi đầy.
+        token: nhãn của đơn vị công việc (vd khóa kịch bản) để after_flush biết lô lỗi có dòng của nó không.
+        """
+        if not rows:
+            return
+        item = (token, list(rows))
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            await asyncio.to_thread(self._queue.put, item)
+
+    async def after_flush(self, callback, token=None):
+        """
+        Xếp callback vào hàng đợi: thread nền sẽ flush hết các dòng đã put() trước đó
+        rồi mới gọi callback(error) (vd đánh dấu 1 kịch bản đã ghi xong).
+        error là None nếu mọi lô chứa dòng mang `token` đều ghi được, ngược lại là lỗi ghi;
+        không có token thì error là lỗi bất kỳ kể từ callback không token trước đó.
+        """
+        await asyncio.to_thread(self._queue.put, _Callback(callback, token))
+
+    def close(self):
+        """Flush phần còn lại và dừng thread nền (blocking, gọi qua asyncio.to_thread)."""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+            return {
+                "rows_written": self.rows_written,
+                "rows_failed": self.rows_failed,
+                "batches": self.batches,
+                "flush_seconds": round(self.flush_seconds, 3),
+                "elapsed_seconds": round(elapsed, 3),
+                "rows_per_second": round(self.rows_written / elapsed, 1) if elapsed else 0.0,
+            }
+
+    # ---------- phía thread nền ----------
+    def _run(self):
+        buffer, tokens = [], []     # tokens[i] = token của buffer[i]
+        deadline = time.monotonic() + self.flush_interval
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stopping = True
+            elif isinstance(item, _Callback):
+                while buffer:
+                    self._flush_tagged(buffer[:self.batch_size], tokens[:self.batch_size])
+                    buffer, tokens = buffer[self.batch_size:], tokens[self.batch_size:]
+                if item.token is None:
+                    error, self._last_error = self._last_error, None
+                else:
+                    error = self._failed.pop(item.token, None)
+                try:
+                    item.fn(error)
+                except Exception as e:
+                    print(f"    ->  Lỗi callback sau flush: {e}")
+                continue
+            elif item:
+                token, rows = item
+                buffer.extend(rows)
+                tokens.extend([token] * len(rows))
+
+            # Đủ lô thì flush ngay; hết hạn flush_interval (hoặc đang dừng) thì flush phần lẻ
+            while len(buffer) >= self.batch_size:
+                self._flush_tagged(buffer[:self.batch_size], tokens[:self.batch_size])
+                buffer, tokens = buffer[self.batch_size:], tokens[self.batch_size:]
+            now = time.monotonic()
+            if buffer and (stopping or now >= deadline):
+                self._flush_tagged(buffer, tokens)
+                buffer, tokens = [], []
+            if now >= deadline:
+                deadline = now + self.flush_interval
+
+    def _flush_tagged(self, rows, tokens):
+        error = self._flush(rows)
+        if error is not None:
+            self._last_error = error
+            for token in set(tokens):
+                if token is not None:
+                    self._failed[token] = error
+
+    def _flush(self, rows):
+        """Ghi 1 lô; trả về lỗi (lô bị bỏ qua) hoặc None."""
+        t0 = time.monotonic()
+        try:
+            df = self.prepare(rows)
+            df = df.reindex(columns=self.columns)
+            if self.conflict_key:
+                df = df.drop_duplicates(subset=self.conflict_key, keep="last")
+                if self.use_copy:
+                    self._copy_upsert(df)
+                else:
+                    self._upsert(df)
+            elif self.use_copy:
+                self._copy(df)
+            else:
+                df.to_sql(self.table, self.engine, if_exists="append", index=False, method="multi")
+            ok, failed, error = len(df), 0, None
+        except Exception as e:
+            print(f"    ->  Lỗi ghi lô {len(rows)} dòng vào {self.table}: {e}")
+            ok, failed, error = 0, len(rows), e
+        with self._lock:
+            self.rows_written += ok
+            self.rows_failed += failed
+            self.batches += 1 if ok else 0
+            self.flush_seconds += time.monotonic() - t0
+        if ok:
+            print(f"    ->  [writer] +{ok} dòng vào {self.table} (tổng {self.rows_written}).")
+        return error
+
+    def _copy(self, df, table=None, cursor=None):
+        buf = io.StringIO()
+        # CSV: ô rỗng không có ngoặc = NULL
+        df.to_csv(buf, header=False, index=False, quoting=csv.QUOTE_MINIMAL)
+        buf.seek(0)
+        cols = ", ".join(self.columns)
+        sql = f"COPY {table or self.table} ({cols}) FROM STDIN WITH (FORMAT csv)"
+        if cursor is not None:
+            cursor.copy_expert(sql, buf)
+            return
+        raw = self.engine.raw_connection()
+        try:
+            with raw.cursor() as cur:
+                cur.copy_expert(sql, buf)
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            raw.close()
+
+    def _upsert_sql(self, source_sql):
+        cols = ", ".join(self.columns)
+        updates = [f"{c} = EXCLUDED.{c}" for c in self.columns if c not in self.conflict_key]
+        if self.touch_column:
+            updates.append(f"{self.touch_column} = CURRENT_TIMESTAMP")
+        action = "DO UPDATE SET " + ", ".join(updates) if updates else "DO NOTHING"
+        return f"INSERT INTO {self.table} ({cols}) {source_sql} ON CONFLICT ({', '.join(self.conflict_key)}) {action}"
+
+    def _copy_upsert(self, df):
+        """COPY vào bảng tạm (tự xóa khi commit) rồi merge vào bảng đích bằng 1 câu upsert."""
+        stage = f"_stage_{self.table}"
+        cols = ", ".join(self.columns)
+        raw = self.engine.raw_connection()
+        try:
+            with raw.cursor() as cur:
+                cur.execute(f"CREATE TEMP TABLE {stage} (LIKE {self.table} INCLUDING DEFAULTS) ON COMMIT DROP")
+                self._copy(df, table=stage, cursor=cur)
+                cur.execute(self._upsert_sql(f"SELECT {cols} FROM {stage}"))
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            raw.close()
+
+    def _upsert(self, df):
+        values = ", ".join(f":{c}" for c in self.columns)
+        records = df.astype(object).where(df.notna(), None).to_dict("records")
+        with self.engine.begin() as conn:
+            conn.execute(text(self._upsert_sql(f"VALUES ({values})")), records)
+
+
+async def _demo(db_url, n_rows):
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.pool import StaticPool
+
+    # SQLite trong bộ nhớ: dùng chung 1 kết nối giữa event loop và thread nền
+    if db_url == "sqlite://":
+        engine = create_engine(db_url, poolclass=StaticPool, connect_args={"check_same_thread": False})
+    else:
+        engine = create_engine(db_url)
+    cols = ["scenario", "hotel_name", "final_price"]
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS writer_demo"))
+        conn.execute(text("CREATE TABLE writer_demo (scenario VARCHAR(255), hotel_name TEXT, final_price BIGINT)"))
+
+    writer = BatchedCopyWriter(engine, "writer_demo", cols, batch_size=1000, flush_interval=0.5).start()
+    # Giả lập 8 kịch bản song song, mỗi kịch bản đẩy từng đợt 25 dòng
+    async def scenario(k):
+        for start in range(0, n_rows // 8, 25):
+            await writer.put([
+                {"scenario": f"S{k}", "hotel_name": f"Hotel {k}-{i}", "final_price": 100000 + i}
+                for i in range(start, start + 25)
+            ])
+            await asyncio.sleep(0)
+    await asyncio.gather(*(scenario(k) for k in range(8)))
+    await asyncio.to_thread(writer.close)
+
+    with engine.connect() as conn:
+        total = conn.execute(text("SELECT COUNT(*) FROM writer_demo")).scalar()
+    print(f"Trong bảng: {total} dòng | {writer.stats()}")
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else "sqlite://"
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    asyncio.run(_demo(url, n))
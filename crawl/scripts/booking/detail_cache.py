@@ -0,0 +1,80 @@
+"""
+Cache lâu dài (qua nhiều lượt chạy) cho diện tích + tiện ích theo (khách sạn, loại phòng).
+
+Mỗi lượt cào hotel_scenarios sinh id mới nhưng diện tích / tiện ích của 1 loại phòng
+hầu như không đổi. details_scraper tra cache trước: entry còn hạn (CACHE_TTL_DAYS)
+thì ghi thẳng vào room_details, chỉ cào các dòng trượt cache hoặc đã hết hạn.
+
+Khóa: link khách sạn bỏ query/fragment (hotel_key) + loại phòng đã chuẩn hóa
+(chữ thường, gộp khoảng trắng). Bảng nằm trong cùng DB nên mọi tiến trình dùng chung.
+"""
+import datetime as dt
+
+from sqlalchemy import text
+
+CACHE_TABLE = "room_detail_cache"
+CACHE_COLUMNS = ["hotel_key", "room_type", "area_m2", "facilities"]
+
+CREATE_CACHE_SQL = f"""
+CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (
+    hotel_key TEXT NOT NULL,
+    room_type TEXT NOT NULL,
+    area_m2 TEXT,
+    facilities TEXT,
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (hotel_key, room_type)
+);
+"""
+
+
+def normalize_room_type(room_type):
+    return " ".join(str(room_type or "").lower().split())
+
+
+def ensure_cache_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(CREATE_CACHE_SQL))
+
+
+def lookup(engine, hotel_keys, ttl_days):
+    """
+    Đọc mọi entry của các khách sạn trong 1 câu truy vấn.
+    Trả về {(hotel_key, room_type chuẩn hóa): (area_m2, facilities, còn_hạn)}.
+    """
+    if not hotel_keys:
+        return {}
+    cutoff = dt.datetime.now() - dt.timedelta(days=ttl_days)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(f"""
+                SELECT hotel_key, room_type, area_m2, facilities, fetched_at
+                FROM {CACHE_TABLE}
+                WHERE hotel_key = ANY(:keys)
+            """),
+            {"keys": list(hotel_keys)},
+        ).fetchall()
+    return {(r[0], r[1]): (r[2], r[3], r[4] is not None and r[4] >= cutoff) for r in rows}
+
+
+def cache_row(hotel_key, room_type, details):
+    return {
+        "hotel_key": hotel_key,
+        "room_type": normalize_room_type(room_type),
+        "area_m2": details["area"],
+        "facilities": details["facilities"],
+    }
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses + self.expired
+        return self.hits / total if total else 0.0
+
+    def report(self):
+        print(f" [cache] {self.hits} hit | {self.misses} miss | {self.expired} hết hạn | "
+              f"hit rate {self.hit_rate():.1%}")
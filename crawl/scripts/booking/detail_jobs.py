@@ -0,0 +1,200 @@
+"""
+Bảng việc cho details_scraper: mỗi khách sạn (link bỏ query/fragment) là 1 job.
+
+Job được sinh từ hotel_scenarios trừ các id đã có trong room_details. Bao nhiêu
+tiến trình cũng được: mỗi tiến trình "thuê" (lease) 1 lô job bằng
+SELECT ... FOR UPDATE SKIP LOCKED nên không bao giờ 2 nơi lấy trùng 1 job.
+Job thuê quá hạn (tiến trình chết giữa chừng) được tiến trình khác thuê lại, hoặc
+bị đánh failed nếu đã ở lượt thử cuối; job lỗi được thử lại tới max_attempts lần.
+Job done / failed được mở lại (pending, attempts = 0) khi lượt cào sau thêm id mới
+cho khách sạn đó. Chỉ dùng với PostgreSQL.
+
+    python detail_jobs.py            # in thống kê trạng thái job
+"""
+import os
+import socket
+import sys
+
+from sqlalchemy import text
+
+JOB_TABLE = "detail_jobs"
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+# Khóa khách sạn trong SQL, phải khớp hotel_key() của details_scraper.py
+HOTEL_KEY_SQL = "split_part(split_part({col}, '#', 1), '?', 1)"
+
+CREATE_JOB_SQL = f"""
+CREATE TABLE IF NOT EXISTS {JOB_TABLE} (
+    hotel_key TEXT PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT '{PENDING}',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    leased_by TEXT,
+    lease_until TIMESTAMP,
+    row_count INTEGER DEFAULT 0,
+    max_source_id BIGINT DEFAULT 0,
+    last_error TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS {JOB_TABLE}_status_idx ON {JOB_TABLE} (status, lease_until);
+"""
+# Bảng tạo từ phiên bản trước chưa có cột max_source_id
+MIGRATE_JOB_SQL = f"ALTER TABLE {JOB_TABLE} ADD COLUMN IF NOT EXISTS max_source_id BIGINT DEFAULT 0"
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def ensure_job_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(CREATE_JOB_SQL))
+        conn.execute(text(MIGRATE_JOB_SQL))
+
+
+def _range_filter(id_ranges, alias="s"):
+    """ID_RANGES -> (điều kiện SQL, params); None = không giới hạn."""
+    if not id_ranges:
+        return "TRUE", {}
+    clauses, params = [], {}
+    for i, (start, end) in enumerate(id_ranges):
+        clauses.append(f"({alias}.id BETWEEN :s{i} AND :e{i})")
+        params[f"s{i}"] = start
+        params[f"e{i}"] = end
+    return "(" + " OR ".join(clauses) + ")", params
+
+
+def sync_jobs(engine, source_table, target_table, id_ranges=None):
+    """
+    Thêm job cho mọi khách sạn còn dòng chưa có trong room_details. Job đã done / failed được
+    mở lại (pending, attempts = 0) chỉ khi khách sạn có id còn thiếu lớn hơn max_source_id lần
+    đồng bộ trước (lượt cào mới thêm kịch bản); job hết lượt thử mà không có id mới thì giữ nguyên.
+    Job pending / leased không đổi (id mới được tính lại ở lần đồng bộ sau khi job xong).
+    Trả về số job mới + số job được mở lại.
+    """
+    where_range, params = _range_filter(id_ranges)
+    key = HOTEL_KEY_SQL.format(col="s.hotel_link")
+    with engine.begin() as conn:
+        result = conn.execute(text(f"""
+            INSERT INTO {JOB_TABLE} (hotel_key, max_source_id)
+            SELECT {key}, MAX(s.id)
+            FROM {source_table} s
+            WHERE s.hotel_link LIKE 'http%'
+              AND {where_range}
+              AND NOT EXISTS (SELECT 1 FROM {target_table} r WHERE r.hotel_id = s.id)
+            GROUP BY 1
+            ON CONFLICT (hotel_key) DO UPDATE
+            SET status = '{PENDING}',
+                attempts = 0,
+                max_source_id = EXCLUDED.max_source_id,
+                last_error = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE {JOB_TABLE}.status IN ('{DONE}', '{FAILED}')
+              AND EXCLUDED.max_source_id > COALESCE({JOB_TABLE}.max_source_id, 0)
+        """), params)
+        return result.rowcount or 0
+
+
+def fail_expired_leases(engine, max_attempts=3):
+    """
+    Job leased quá hạn đã dùng hết lượt thử (tiến trình chết ở lượt cuối) -> failed.
+    Không làm vậy thì job kẹt ở leased mãi: lease_jobs không thuê lại, sync_jobs không mở lại.
+    """
+    with engine.begin() as conn:
+        result = conn.execute(text(f"""
+            UPDATE {JOB_TABLE}
+            SET status = '{FAILED}',
+                last_error = 'Hết hạn thuê ở lượt thử cuối (tiến trình dừng giữa chừng?)',
+                lease_until = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE status = '{LEASED}'
+              AND lease_until < CURRENT_TIMESTAMP
+              AND attempts >= :max_attempts
+        """), {"max_attempts": max_attempts})
+        return result.rowcount or 0
+
+
+def lease_jobs(engine, n, lease_seconds=600, max_attempts=3, worker=None):
+    """
+    Thuê tối đa n job: pending, failed còn lượt thử, hoặc leased đã quá hạn.
+    FOR UPDATE SKIP LOCKED bỏ qua các dòng tiến trình khác đang khóa.
+    """
+    fail_expired_leases(engine, max_attempts)
+    with engine.begin() as conn:
+        rows = conn.execute(text(f"""
+            UPDATE {JOB_TABLE} j
+            SET status = '{LEASED}',
+                leased_by = :worker,
+                lease_until = CURRENT_TIMESTAMP + make_interval(secs => :lease),
+                attempts = j.attempts + 1,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE j.hotel_key IN (
+                SELECT hotel_key FROM {JOB_TABLE}
+                WHERE attempts < :max_attempts
+                  AND (status IN ('{PENDING}', '{FAILED}')
+                       OR (status = '{LEASED}' AND lease_until < CURRENT_TIMESTAMP))
+                ORDER BY attempts, hotel_key
+                LIMIT :n
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING j.hotel_key
+        """), {"worker": worker or worker_name(), "lease": lease_seconds,
+               "max_attempts": max_attempts, "n": n}).fetchall()
+    return [r[0] for r in rows]
+
+
+def load_job_rows(engine, source_table, target_table, keys, id_ranges=None):
+    """Các dòng (id, hotel_link, room_type) còn thiếu chi tiết của những khách sạn vừa thuê."""
+    if not keys:
+        return []
+    where_range, params = _range_filter(id_ranges)
+    params["keys"] = list(keys)
+    key = HOTEL_KEY_SQL.format(col="s.hotel_link")
+    with engine.connect() as conn:
+        return conn.execute(text(f"""
+            SELECT s.id, s.hotel_link, s.room_type
+            FROM {source_table} s
+            WHERE {key} = ANY(:keys)
+              AND s.hotel_link LIKE 'http%'
+              AND {where_range}
+              AND NOT EXISTS (SELECT 1 FROM {target_table} r WHERE r.hotel_id = s.id)
+            ORDER BY s.id
+        """), params).fetchall()
+
+
+def complete_job(engine, key, row_count=0):
+    _finish(engine, key, DONE, row_count=row_count)
+
+
+def fail_job(engine, key, error):
+    _finish(engine, key, FAILED, error=str(error)[:500])
+
+
+def _finish(engine, key, status, row_count=None, error=None):
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            UPDATE {JOB_TABLE}
+            SET status = :status,
+                row_count = COALESCE(:rows, row_count),
+                last_error = :err,
+                lease_until = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE hotel_key = :key
+        """), {"status": status, "rows": row_count, "err": error, "key": key})
+
+
+def job_stats(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"SELECT status, COUNT(*) FROM {JOB_TABLE} GROUP BY status")).fetchall()
+    return {r[0]: r[1] for r in rows}
+
+
+if __name__ == "__main__":
+    from sqlalchemy import create_engine
+    from details_scraper import DB_CONNECTION_STR
+
+    engine = create_engine(sys.argv[1] if len(sys.argv) > 1 else DB_CONNECTION_STR)
+    print(job_stats(engine))
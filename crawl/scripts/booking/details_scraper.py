@@ -1,8 +1,21 @@
 import asyncio
+import os
+import sys
+import time
 from playwright.async_api import async_playwright
 from sqlalchemy import create_engine, text
 import re
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.browser_pool import BrowserPool, BLOCK_IMAGES
+from common.snapshot_archive import SnapshotArchive
+from common.telemetry import Telemetry
+from common.rate_limit import AdaptiveRateLimiter, RetryPolicy
+from booking_session import BROWSER_STATE_FILE, warm_booking
+from db_writer import BatchedCopyWriter
+import detail_jobs
+import detail_cache
+
 # --- CẤU HÌNH DATABASE ---
 DB_CONFIG = {
     "dbname": "booking_data",  
@@ -17,179 +30,541 @@ DB_CONNECTION_STR = f"postgresql+psycopg2://{DB_CONFIG['user']}:{DB_CONFIG['pass
 SOURCE_TABLE = "hotel_scenarios" 
 TARGET_TABLE = "room_details"  
 
-# --- CẤU HÌNH CÁC KHOẢNG ID MUỐN CHẠY ---
-# Định dạng: (Từ ID, Đến ID)
-ID_RANGES = [
-    (20669, 38650)
-]
+# --- PHẠM VI ID (tùy chọn) ---
+# None = mọi dòng của SOURCE_TABLE chưa có trong TARGET_TABLE. Không cần chia khoảng tay cho
+# từng máy nữa: mỗi tiến trình tự thuê việc từ bảng detail_jobs (xem detail_jobs.py).
+# Định dạng: [(Từ ID, Đến ID), ...]
+ID_RANGES = None
+
+# --- CẤU HÌNH POOL CONTEXT (dùng chung file trạng thái với booking_scraper.py) ---
+CONTEXT_MAX_NAVIGATIONS = 200
+CONTEXT_MAX_MEMORY_MB = 1024
+
+# --- CHẠY SONG SONG ---
+# Số worker (mỗi worker giữ 1 context/tab riêng, lấy khách sạn từ hàng đợi chung)
+DETAIL_WORKERS = 4
+# Mỗi worker tự thay context sau N khách sạn (ngoài ngưỡng điều hướng / bộ nhớ của pool)
+WORKER_RECYCLE_EVERY = 50
+PROGRESS_EVERY = 20
+
+# --- THUÊ VIỆC TỪ BẢNG detail_jobs (chạy bao nhiêu tiến trình / máy cũng được) ---
+LEASE_BATCH = 8           # số khách sạn thuê mỗi lần
+LEASE_SECONDS = 900       # quá hạn mà chưa xong thì tiến trình khác được thuê lại
+JOB_MAX_ATTEMPTS = 3      # số lần thử tối đa của 1 khách sạn
+
+# --- GHI DB THEO LÔ (upsert ON CONFLICT (hotel_id) qua bảng tạm + COPY) ---
+WRITER_BATCH_SIZE = 500        # số dòng mỗi lần flush
+WRITER_FLUSH_INTERVAL = 5.0    # flush phần lẻ sau N giây; khi dừng chương trình luôn flush hết
+TARGET_COLUMNS = ["hotel_id", "area_m2", "facilities"]
+
+# --- CACHE (khách sạn, loại phòng) QUA NHIỀU LƯỢT CHẠY (detail_cache.py) ---
+# Entry mới hơn CACHE_TTL_DAYS ngày được ghi thẳng vào room_details, không cào lại
+USE_CACHE = True
+CACHE_TTL_DAYS = 30
+
+# --- LƯU HTML THÔ (None = tắt); re-extract offline bằng common/reextract.py --kind hotel ---
+SNAPSHOT_DIR = None
+
+# --- TELEMETRY: telemetry/details_scraper.prom + details_scraper_summary.json ---
+TELEMETRY = Telemetry("details_scraper", out_dir="telemetry")
+
+# --- GIỚI HẠN TỐC ĐỘ THÍCH ỨNG + RETRY (thay cho sleep(1) cố định sau mỗi dòng) ---
+# Số worker thực sự chạy cùng lúc bắt đầu từ 2, tăng dần tới DETAIL_WORKERS khi Booking phản hồi tốt
+LIMITER = AdaptiveRateLimiter(rate=1.0, min_rate=0.2, max_rate=4.0, concurrency=min(2, DETAIL_WORKERS),
+                              max_concurrency=DETAIL_WORKERS, telemetry=TELEMETRY)
+RETRY = RetryPolicy(max_attempts=3, telemetry=TELEMETRY)
+
+# --- JS: LẤY DIỆN TÍCH + TIỆN ÍCH CHO NHIỀU LOẠI PHÒNG TRONG 1 LẦN EVALUATE ---
+# Đọc mọi nguồn Booking nhúng sẵn trong trang, không click gì:
+#   1. "row"    : ô diện tích / tiện ích hiện ngay trên dòng của bảng giá
+#   2. "script" : JSON phòng trong <script> inline (b_rooms_available_and_soldout...) theo room id
+#   3. "hidden" : khối mô tả phòng ẩn (#blocktoggleRD<id>, lightbox render sẵn) theo room id
+# Trả về {loại phòng: null | {selector, area, facilities, source}}; area = null khi không nguồn
+# nào có diện tích (khi đó mới phải mở modal của dòng đó, source = null).
+EXTRACT_ROOMS_JS = r"""(targetNames) => {
+    const clean = str => str ? str.toLowerCase().replace(/\s+/g, ' ').trim() : "";
+    const areaOf = text => {
+        const m = String(text || '').match(/(\d+(?:[.,]\d+)?)\s*(m²|m2)/i);
+        return m ? Math.round(parseFloat(m[1].replace(',', '.'))) + " m²" : null;
+    };
+    const textOf = el => (el.innerText || el.textContent || '').trim();
+
+    // --- 1. JSON phòng trong <script> inline: cắt mảng sau tên biến bằng cách đếm ngoặc ---
+    const sliceArray = (src, from) => {
+        const start = src.indexOf('[', from);
+        if (start < 0) return null;
+        let depth = 0, inStr = null, esc = false;
+        for (let j = start; j < src.length; j++) {
+            const c = src[j];
+            if (inStr) {
+                if (esc) esc = false;
+                else if (c === '\\') esc = true;
+                else if (c === inStr) inStr = null;
+            } else if (c === '"' || c === "'") inStr = c;
+            else if (c === '[') depth++;
+            else if (c === ']' && --depth === 0) return src.slice(start, j + 1);
+        }
+        return null;
+    };
+    const scriptRooms = {};
+    const addScriptRoom = r => {
+        if (!r || typeof r !== 'object') return;
+        const id = r.b_id ?? r.b_room_id ?? r.room_id ?? r.id;
+        if (id == null) return;
+        let area = null, facs = [];
+        for (const [k, v] of Object.entries(r)) {
+            if (!area && /surface|room_size|size_in|area/i.test(k) && v != null && typeof v !== 'object') {
+                area = areaOf(String(v) + (/m2|m²/i.test(String(v)) ? '' : ' m²'));
+            }
+            if (/facilit|amenit/i.test(k) && Array.isArray(v)) {
+                v.forEach(f => {
+                    const t = typeof f === 'string' ? f : (f && (f.name || f.b_name || f.title));
+                    if (t) facs.push(String(t).trim());
+                });
+            }
+        }
+        scriptRooms[String(id)] = { area, facilities: facs, name: clean(r.b_name || r.name || '') };
+    };
+    const ROOM_VARS = ['b_rooms_available_and_soldout', 'b_rooms', 'rooms_data'];
+    document.querySelectorAll('script:not([src])').forEach(sc => {
+        const src = sc.textContent || '';
+        ROOM_VARS.forEach(v => {
+            const at = src.indexOf(v);
+            if (at < 0) return;
+            const json = sliceArray(src, at + v.length);
+            if (!json) return;
+            try { JSON.parse(json).forEach(addScriptRoom); } catch (e) {}
+        });
+    });
+
+    // --- 2. Khối mô tả phòng ẩn (có sẵn trong DOM, modal chỉ là hiển thị nó) ---
+    const hiddenRoom = id => {
+        const box = document.getElementById('blocktoggleRD' + id)
+            || document.getElementById('RD' + id)
+            || document.querySelector(`[data-room-id="${id}"].hprt-lightbox, [data-room-id="${id}"] .rt-lightbox-content`);
+        if (!box) return null;
+        const sizeEl = box.querySelector('[data-testid="rp-room-size"], .hprt-lightbox-room-size');
+        const area = areaOf(sizeEl ? sizeEl.textContent : box.textContent);
+        const facs = [];
+        box.querySelectorAll('.hprt-facilities-facility, .hprt-lightbox-list li, .hprt-facilities-others li, [data-testid="rp-facility"]')
+            .forEach(el => {
+                const t = el.textContent.replace(/\s+/g, ' ').trim();
+                if (t && !areaOf(t)) facs.push(t);
+            });
+        return { area, facilities: facs };
+    };
+
+    // --- 3. Các dòng của bảng giá ---
+    const rows = Array.from(document.querySelectorAll('#hprt-table tbody tr'));
+    const named = [];
+    rows.forEach((row, i) => {
+        const nameEl = row.querySelector('.hprt-table-cell-roomtype .hprt-roomtype-icon-link');
+        if (!nameEl) return;
+        const ids = [];
+        if (nameEl.dataset.roomId) ids.push(nameEl.dataset.roomId);
+        const href = (nameEl.getAttribute('href') || '').match(/RD(\d+)/);
+        if (href) ids.push(href[1]);
+        if (row.dataset.blockId) ids.push(row.dataset.blockId.split('_')[0]);
+        named.push({ row, index: i, name: clean(textOf(nameEl)), ids });
+    });
+
+    const out = {};
+    targetNames.forEach(target => {
+        const tName = clean(target);
+        const hit = named.find(r => r.name.includes(tName) || tName.includes(r.name));
+        if (!hit) { out[target] = null; return; }
+
+        let source = null;
+        const sizeEl = hit.row.querySelector('[data-testid="rp-room-size"]');
+        let area = sizeEl ? areaOf(textOf(sizeEl)) : null;
+        if (area) source = "row";
+
+        let facs = [];
+        hit.row.querySelectorAll('.hprt-facilities-facility').forEach(el => {
+            const t = textOf(el);
+            if (t && !t.includes('m²') && !t.includes('m2')) facs.push(t);
+        });
+        hit.row.querySelectorAll('.hprt-facilities-others li').forEach(el => {
+            const t = textOf(el);
+            if (t) facs.push(t);
+        });
+
+        // Dòng không hiện diện tích -> tìm theo room id trong JSON nhúng, rồi khối ẩn
+        const scriptHit = hit.ids.map(id => scriptRooms[id]).find(Boolean)
+            || Object.values(scriptRooms).find(r => r.name && r.name === hit.name);
+        if (!area && scriptHit && scriptHit.area) { area = scriptHit.area; source = "script"; }
+        if (!facs.length && scriptHit) facs = scriptHit.facilities;
+        if (!area || !facs.length) {
+            const box = hit.ids.map(hiddenRoom).find(b => b && (b.area || b.facilities.length));
+            if (box) {
+                if (!area && box.area) { area = box.area; source = "hidden"; }
+                if (!facs.length) facs = box.facilities;
+            }
+        }
+
+        out[target] = {
+            selector: `#hprt-table tbody tr:nth-child(${hit.index + 1})`,
+            area: area,
+            facilities: facs.join(', '),
+            source: source
+        };
+    });
+    return out;
+}"""
+
+# Nguồn diện tích: 3 nguồn trong EXTRACT_ROOMS_JS, "modal" = phải click mở modal (dự phòng cuối),
+# "modal_failed" = modal cũng không có, "not_found" = không có dòng nào khớp loại phòng
+EXTRACT_SOURCES = ("row", "script", "hidden", "modal", "modal_failed", "not_found")
+
 
-async def scrape_detail_by_link(page, url, target_room_type):
-    print(f"   -> Truy cập: {url[:60]}...")
+class ExtractStats:
+    """Đếm số loại phòng lấy được từ mỗi nguồn để biết modal dự phòng còn chạy bao nhiêu."""
+    def __init__(self):
+        self.counts = dict.fromkeys(EXTRACT_SOURCES, 0)
+
+    def add(self, source, url=""):
+        self.counts[source] += 1
+        TELEMETRY.inc(f"room_source_{source}_total", url)
+
+    def fallback_rate(self):
+        found = sum(self.counts.values()) - self.counts["not_found"]
+        return (self.counts["modal"] + self.counts["modal_failed"]) / found if found else 0.0
+
+    def report(self):
+        parts = " | ".join(f"{k} {v}" for k, v in self.counts.items())
+        print(f" [nguồn diện tích] {parts} | modal dự phòng {self.fallback_rate():.1%}")
+
+
+EXTRACT_STATS = ExtractStats()
+
+# Số biến thể link (query khác nhau) tối đa được mở cho 1 khách sạn
+# khi trang đầu tiên không có đủ các loại phòng cần tìm
+MAX_LINK_VARIANTS = 2
+
+
+def hotel_key(link):
+    """Link khách sạn bỏ query/fragment: mọi kịch bản của cùng 1 khách sạn chung 1 khóa."""
+    return link.split("#")[0].split("?")[0]
+
+
+def group_rows_by_hotel(rows):
+    """(id, hotel_link, room_type) -> {hotel_key: [(id, hotel_link, room_type), ...]} giữ thứ tự id."""
+    groups = {}
+    for row in rows:
+        groups.setdefault(hotel_key(row[1]), []).append(tuple(row))
+    return groups
+
+
+async def scrape_room_modal(page, row_selector):
+    """Mở modal chi tiết của 1 dòng để lấy diện tích / tiện ích bị ẩn."""
+    clickable_link = page.locator(row_selector).locator('.hprt-roomtype-icon-link')
     try:
-        await page.route("**/*.{png,jpg,jpeg,gif,webp,svg}", lambda route: route.abort())
-        await page.goto(url, timeout=6000, wait_until="domcontentloaded")
+        await clickable_link.click()
         
+        # 1. Chờ khung Modal hiện ra
+        modal_selector = '.rt-lightbox-content, .hprt-lightbox, div[role="dialog"]'
+        modal = page.locator(f"{modal_selector} >> visible=true").first
+        await modal.wait_for(timeout=5000)
+
+        # 2. QUAN TRỌNG: NGỦ 1.5 GIÂY ĐỂ DỮ LIỆU ĐƯỢC ĐIỀN VÀO MODAL
+        # (Tránh trường hợp modal vừa hiện lên nhưng chữ chưa load xong)
+        await asyncio.sleep(1.5)
+
+        # 3. Cố gắng chờ thẻ diện tích cụ thể trong modal (nếu có)
         try:
-            await page.wait_for_selector("#hprt-table", timeout=5000)
+            modal_size_el = modal.locator('[data-testid="rp-room-size"]')
+            await modal_size_el.wait_for(timeout=2000) # Chờ tối đa 2s cho thẻ size hiện
         except:
-            print("      ! Không thấy bảng giá.")
-            return None
+            pass
 
-        # --- BƯỚC 1: TÌM DÒNG CHỨA LOẠI PHÒNG ---
-        target_row_selector = await page.evaluate(r"""(targetName) => {
-            const rows = Array.from(document.querySelectorAll('#hprt-table tbody tr'));
-            const clean = str => str ? str.toLowerCase().trim() : "";
-            const tName = clean(targetName);
-
-            for (let i = 0; i < rows.length; i++) {
-                const nameEl = rows[i].querySelector('.hprt-table-cell-roomtype .hprt-roomtype-icon-link');
-                if (nameEl) {
-                    const rowName = clean(nameEl.innerText);
-                    if (rowName.includes(tName) || tName.includes(rowName)) {
-                        return `#hprt-table tbody tr:nth-child(${i + 1})`;
-                    }
-                }
+        # 4. TRÍCH XUẤT DỮ LIỆU VÀ LỌC RÁC
+        data = await modal.evaluate(r"""(el) => {
+            const fullText = el.innerText;
+
+            // --- TÌM DIỆN TÍCH ---
+            let areaVal = null;
+            // Ưu tiên tìm trong thẻ định danh
+            const specificSizeEl = el.querySelector('[data-testid="rp-room-size"]');
+            if (specificSizeEl) {
+                 const m = specificSizeEl.innerText.match(/(\d+)\s*(m²|m2)/i);
+                 if (m) areaVal = m[1] + " m²";
+            }
+            // Nếu không thấy, quét toàn bộ text
+            if (!areaVal) {
+                const mAll = fullText.match(/(\d+)\s*(m²|m2)/i);
+                if (mAll) areaVal = mAll[1] + " m²";
             }
-            return null;
-        }""", target_room_type)
 
-        if not target_row_selector:
-            print(f"      ! Không tìm thấy dòng nào khớp với: {target_room_type}")
-            return None
+            // --- LỌC TIỆN ÍCH ---
+            const lines = fullText.split('\n').map(l => l.trim());
+            const cleanLines = lines.filter(line => {
+                const l = line.toLowerCase();
+                if (l.length < 2) return false; 
+
+                const badWords = [
+                    'đóng', 'close', 
+                    'bắt đầu nội dung', 'start of dialog', 
+                    'kết thúc nội dung', 'end of dialog',
+                    'hộp thoại', 'mô tả', 'description',
+                    'diện tích', 'kích thước phòng', 'room size',
+                    'trong phòng tắm riêng của bạn',
+                    'tầm nhìn', 'hướng nhìn', 'views'
+                ];
+
+                for (let bad of badWords) {
+                    if (l.includes(bad)) return false;
+                }
+                return true;
+            });
+
+            // Lấy tối đa 500 ký tự tiện ích
+            const facStr = cleanLines.join(', ').substring(0, 500);
 
-        target_row = page.locator(target_row_selector)
+            return { area: areaVal, facilities: facStr };
+        }""")
 
-        # --- BƯỚC 2: TÌM DIỆN TÍCH Ở NGOÀI TRƯỚC ---
-        area = "N/A"
+        area = data['area'] if data['area'] else "N/A"
+        facilities = data['facilities']
+
+        # Đóng modal
         try:
-            size_el = target_row.locator('[data-testid="rp-room-size"]')
-            # Chờ nhẹ 0.5s để xem nó có hiện không
-            try: await size_el.wait_for(state="attached", timeout=500)
-            except: pass
-
-            if await size_el.count() > 0:
-                raw_text = await size_el.inner_text()
-                match = re.search(r'(\d+)\s*(m²|m2)', raw_text, re.IGNORECASE)
-                if match:
-                    area = match.group(1) + " m²"
+            close_btn = modal.locator('button[aria-label="Close"], button.modal-close-button')
+            if await close_btn.count() > 0:
+                await close_btn.click()
+            else:
+                await page.keyboard.press('Escape')
         except:
             pass
 
-        # --- BƯỚC 3: XỬ LÝ CLICK MODAL ---
-        facilities = "N/A"
+        return {'area': area, 'facilities': facilities}
+    except Exception:
+        return None
 
-        if area == "N/A": 
-            print("      ... Đang click mở chi tiết phòng ...")
-            clickable_link = target_row.locator('.hprt-roomtype-icon-link')
-            
-            try:
-                await clickable_link.click()
-                
-                # 1. Chờ khung Modal hiện ra
-                modal_selector = '.rt-lightbox-content, .hprt-lightbox, div[role="dialog"]'
-                modal = page.locator(f"{modal_selector} >> visible=true").first
-                await modal.wait_for(timeout=5000)
-                
-                # 2. QUAN TRỌNG: NGỦ 1.5 GIÂY ĐỂ DỮ LIỆU ĐƯỢC ĐIỀN VÀO MODAL
-                # (Tránh trường hợp modal vừa hiện lên nhưng chữ chưa load xong)
-                await asyncio.sleep(1.5)
-
-                # 3. Cố gắng chờ thẻ diện tích cụ thể trong modal (nếu có)
-                try:
-                    modal_size_el = modal.locator('[data-testid="rp-room-size"]')
-                    await modal_size_el.wait_for(timeout=2000) # Chờ tối đa 2s cho thẻ size hiện
-                except:
-                    pass
-
-                # 4. TRÍCH XUẤT DỮ LIỆU VÀ LỌC RÁC
-                data = await modal.evaluate(r"""(el) => {
-                    const fullText = el.innerText;
-                    
-                    // --- TÌM DIỆN TÍCH ---
-                    let areaVal = null;
-                    // Ưu tiên tìm trong thẻ định danh
-                    const specificSizeEl = el.querySelector('[data-testid="rp-room-size"]');
-                    if (specificSizeEl) {
-                         const m = specificSizeEl.innerText.match(/(\d+)\s*(m²|m2)/i);
-                         if (m) areaVal = m[1] + " m²";
-                    }
-                    // Nếu không thấy, quét toàn bộ text
-                    if (!areaVal) {
-                        const mAll = fullText.match(/(\d+)\s*(m²|m2)/i);
-                        if (mAll) areaVal = mAll[1] + " m²";
-                    }
-
-                    // --- LỌC TIỆN ÍCH ---
-                    const lines = fullText.split('\n').map(l => l.trim());
-                    const cleanLines = lines.filter(line => {
-                        const l = line.toLowerCase();
-                        if (l.length < 2) return false; 
-                        
-                        const badWords = [
-                            'đóng', 'close', 
-                            'bắt đầu nội dung', 'start of dialog', 
-                            'kết thúc nội dung', 'end of dialog',
-                            'hộp thoại', 'mô tả', 'description',
-                            'diện tích', 'kích thước phòng', 'room size',
-                            'trong phòng tắm riêng của bạn',
-                            'tầm nhìn', 'hướng nhìn', 'views'
-                        ];
-                        
-                        for (let bad of badWords) {
-                            if (l.includes(bad)) return false;
-                        }
-                        return true;
-                    });
-
-                    // Lấy tối đa 500 ký tự tiện ích
-                    const facStr = cleanLines.join(', ').substring(0, 500);
-                    
-                    return { area: areaVal, facilities: facStr };
-                }""")
-                
-                area = data['area'] if data['area'] else "N/A"
-                facilities = data['facilities']
-
-                # Đóng modal
-                try:
-                    close_btn = modal.locator('button[aria-label="Close"], button.modal-close-button')
-                    if await close_btn.count() > 0:
-                        await close_btn.click()
-                    else:
-                        await page.keyboard.press('Escape')
-                except:
-                    pass
-                    
-            except Exception as e:
-                pass
+
+async def scrape_hotel_rooms(page, url, room_types, archive=None):
+    """
+    Mở trang khách sạn 1 lần, lấy diện tích + tiện ích cho tất cả room_types.
+    Trả về {loại phòng: {'area', 'facilities'}}; loại không tìm thấy thì không có trong dict.
+    Trả về None nếu trang không tải được bảng giá.
+    """
+    print(f"   -> Truy cập: {url[:60]}... ({len(room_types)} loại phòng)")
+    try:
+        with TELEMETRY.timer("nav_seconds", url):
+            await RETRY.run(url, lambda: page.goto(url, timeout=6000, wait_until="domcontentloaded"), LIMITER)
         
-        else:
-             # Logic lấy tiện ích ngay tại dòng (khi đã có diện tích bên ngoài)
-            try:
-                facilities = await target_row.evaluate(r"""(row) => {
-                    let facs = [];
-                    row.querySelectorAll('.hprt-facilities-facility').forEach(el => {
-                        const t = el.innerText.trim();
-                        if (t && !t.includes('m²') && !t.includes('m2')) facs.push(t);
-                    });
-                    row.querySelectorAll('.hprt-facilities-others li').forEach(el => {
-                        const t = el.innerText.trim();
-                        if (t) facs.push(t);
-                    });
-                    return facs.join(', ');
-                }""")
-            except:
-                pass
-
-        return {
-            'area': area,
-            'facilities': facilities
-        }
+        try:
+            with TELEMETRY.timer("wait_seconds", url):
+                await page.wait_for_selector("#hprt-table", timeout=5000)
+        except:
+            TELEMETRY.inc("timeouts_total", url)
+            print("      ! Không thấy bảng giá.")
+            return None
+
+        if archive:
+            await archive.aput(await page.content(), source="booking", kind="hotel",
+                               url=url, room_types=list(room_types))
+
+        t_extract = time.monotonic()
+        found = await page.evaluate(EXTRACT_ROOMS_JS, list(room_types))
+
+        results = {}
+        for r_type in room_types:
+            hit = found.get(r_type)
+            if not hit:
+                EXTRACT_STATS.add("not_found", url)
+                print(f"      ! Không tìm thấy dòng nào khớp với: {r_type}")
+                continue
+            if hit['area']:
+                EXTRACT_STATS.add(hit['source'], url)
+                results[r_type] = {'area': hit['area'], 'facilities': hit['facilities']}
+                continue
+            # Không nguồn nhúng nào có diện tích -> dự phòng cuối: mở modal của đúng dòng đó
+            print(f"      ... Đang click mở chi tiết phòng: {r_type}")
+            details = await scrape_room_modal(page, hit['selector'])
+            EXTRACT_STATS.add("modal" if details and details['area'] != "N/A" else "modal_failed", url)
+            results[r_type] = details or {'area': "N/A", 'facilities': "N/A"}
+
+        TELEMETRY.observe("extract_seconds", url, time.monotonic() - t_extract)
+        return results
 
     except Exception as e:
         print(f"      ! Lỗi Scraping tổng quát: {e}")
+        TELEMETRY.inc("errors_total", url)
         return None
 
+
+async def scrape_hotel_group(page, items, archive=None):
+    """
+    items: các dòng (id, hotel_link, room_type) cùng 1 khách sạn.
+    Trang được mở 1 lần cho mọi loại phòng; loại nào thiếu mới thử thêm biến thể link khác
+    (tối đa MAX_LINK_VARIANTS trang). Trả về {id: {'area', 'facilities'} | None};
+    ném lỗi nếu không mở được trang nào.
+    """
+    results = {}
+    pending = list(items)
+    tried = set()
+    loaded = False
+    while pending and len(tried) < MAX_LINK_VARIANTS:
+        link = pending[0][1]
+        tried.add(link)
+        room_types = list(dict.fromkeys(r_type for _, _, r_type in pending))
+        found = await scrape_hotel_rooms(page, link, room_types, archive)
+        if found is not None:
+            loaded = True
+            for p_id, _, r_type in pending:
+                if r_type in found:
+                    results[p_id] = found[r_type]
+        # Link đã thử (mở được hay không) không thử lại -> lượt sau sang biến thể khác
+        pending = [item for item in pending if item[0] not in results and item[1] not in tried]
+
+    if not loaded:
+        # Không mở được trang nào -> để job được thử lại thay vì lưu N/A
+        raise RuntimeError("Không tải được bảng giá của khách sạn")
+    for p_id, _, _ in items:
+        results.setdefault(p_id, None)
+    return results
+
+
+def room_detail_row(p_id, details):
+    area = "N/A"
+    facilities = "N/A"
+    
+    if details:
+        area = details['area']
+        facilities = details['facilities']
+        print(f"      + [ID: {p_id}] {area} | {facilities[:30]}...")
+    else:
+        print(f"      ! [ID: {p_id}] Không tìm thấy (Lưu N/A).")
+    return {"hotel_id": p_id, "area_m2": area, "facilities": facilities}
+
+
+class Progress:
+    """Đếm khách sạn / dòng đã xong của mọi worker trong tiến trình, in tốc độ định kỳ."""
+    def __init__(self, total_hotels):
+        self.total = total_hotels   # số job chờ lúc bắt đầu (gồm cả phần các tiến trình khác sẽ làm)
+        self.hotels = 0
+        self.rows = 0
+        self.started = time.monotonic()
+
+    def add(self, n_rows):
+        self.hotels += 1
+        self.rows += n_rows
+        if self.hotels % PROGRESS_EVERY == 0 or self.hotels == self.total:
+            minutes = (time.monotonic() - self.started) / 60
+            rate = self.hotels / minutes if minutes else 0
+            print(f" [tiến độ] {self.hotels}/{self.total} khách sạn | {self.rows} dòng | {rate:.1f} khách sạn/phút")
+
+
+async def fill_from_cache(engine, groups, writer, cache_stats):
+    """
+    Tra cache cho các dòng vừa thuê: dòng trúng cache (còn hạn) được đẩy thẳng vào writer.
+    Trả về {hotel_key: các dòng còn phải cào} (list rỗng = cả khách sạn đã đủ từ cache).
+    """
+    cached = await asyncio.to_thread(detail_cache.lookup, engine, list(groups), CACHE_TTL_DAYS)
+    remaining = {}
+    for key, items in groups.items():
+        hits, misses = [], []
+        for item in items:
+            entry = cached.get((key, detail_cache.normalize_room_type(item[2])))
+            if entry and entry[2]:
+                hits.append({"hotel_id": item[0], "area_m2": entry[0], "facilities": entry[1]})
+            else:
+                misses.append(item)
+                if entry:
+                    cache_stats.expired += 1
+                else:
+                    cache_stats.misses += 1
+        cache_stats.hits += len(hits)
+        TELEMETRY.inc("cache_hits_total", key, len(hits))
+        TELEMETRY.inc("cache_misses_total", key, len(misses))
+        if hits:
+            await writer.put(hits, token=key)
+        remaining[key] = misses
+    return remaining
+
+
+def finish_job(engine, key, row_count, write_error):
+    """Callback sau flush: job chỉ done khi các dòng của nó đã vào DB, lỗi ghi -> failed (được thuê lại)."""
+    if write_error is None:
+        detail_jobs.complete_job(engine, key, row_count)
+    else:
+        detail_jobs.fail_job(engine, key, f"Lỗi ghi DB: {write_error}")
+
+
+async def lease_feeder(engine, queue, n_workers, writer=None, cache_stats=None):
+    """
+    Thuê thêm job từ detail_jobs mỗi khi hàng đợi cục bộ sắp cạn; hết job thì dừng.
+    Có cache_stats thì tra cache trước, chỉ đưa vào hàng đợi các dòng trượt cache / hết hạn.
+    """
+    leased = 0
+    while True:
+        if queue.qsize() >= n_workers:
+            await asyncio.sleep(0.5)
+            continue
+        keys = await asyncio.to_thread(
+            detail_jobs.lease_jobs, engine, LEASE_BATCH, LEASE_SECONDS, JOB_MAX_ATTEMPTS)
+        if not keys:
+            return leased
+        rows = await asyncio.to_thread(
+            detail_jobs.load_job_rows, engine, SOURCE_TABLE, TARGET_TABLE, keys, ID_RANGES)
+        groups = group_rows_by_hotel(rows)
+        todo = await fill_from_cache(engine, groups, writer, cache_stats) if cache_stats else groups
+        for key in keys:
+            if todo.get(key):
+                queue.put_nowait((key, todo[key]))
+            elif key in groups:
+                # Đủ từ cache -> job xong sau khi writer flush các dòng vừa đẩy
+                await writer.after_flush(
+                    lambda error, key=key, n=len(groups[key]): finish_job(engine, key, n, error), token=key)
+            else:
+                # Các dòng đã có chi tiết (vd tiến trình khác vừa ghi) -> xong luôn
+                await asyncio.to_thread(detail_jobs.complete_job, engine, key)
+        leased += len(keys)
+
+
+async def detail_worker(worker_id, pool, queue, writer, cache_writer, engine, archive, progress):
+    """
+    Giữ 1 context của pool suốt vòng đời worker, lần lượt lấy (khóa, các dòng) của 1 khách sạn trong queue.
+    Kết quả đẩy vào writer (upsert theo lô ở thread nền); job chỉ được đánh dấu done sau khi writer
+    đã flush các dòng của khách sạn. Lỗi -> job failed, được thuê lại tới JOB_MAX_ATTEMPTS lần.
+    Kết quả tìm được cũng được ghi vào cache (cache_writer) cho các lượt chạy sau.
+    """
+    pooled = await pool.acquire()
+    handled = 0
+    try:
+        while True:
+            key, items = await queue.get()
+            try:
+                async with LIMITER.slot(key):
+                    page = TELEMETRY.attach_page(await pooled.page())
+                    print(f" [Worker {worker_id}] {key[:60]} | {len(items)} dòng")
+                    details_by_id = await scrape_hotel_group(page, items, archive)
+
+                await writer.put([room_detail_row(p_id, details_by_id[p_id]) for p_id, _, _ in items], token=key)
+                if cache_writer:
+                    await cache_writer.put([
+                        detail_cache.cache_row(key, r_type, details_by_id[p_id])
+                        for p_id, _, r_type in items
+                        # Không cache kết quả rỗng (modal lỗi...) để lượt sau còn cào lại
+                        if details_by_id[p_id] and details_by_id[p_id]['area'] != "N/A"
+                    ])
+                await writer.after_flush(
+                    lambda error, key=key, n=len(items): finish_job(engine, key, n, error), token=key)
+                progress.add(len(items))
+            except Exception as e:
+                TELEMETRY.inc("errors_total", key)
+                print(f" [Worker {worker_id}] ! Lỗi khách sạn {key[:60]}: {e}")
+                await asyncio.to_thread(detail_jobs.fail_job, engine, key, e)
+            finally:
+                queue.task_done()
+
+            handled += 1
+            force = f"worker {worker_id} đã xử lý {handled} khách sạn" if handled % WORKER_RECYCLE_EVERY == 0 else None
+            pooled = await pool.refresh(pooled, force)
+    finally:
+        await pool.release(pooled)
+
+
 async def main():
     engine = create_engine(DB_CONNECTION_STR)
 
@@ -215,102 +590,71 @@ async def main():
     async with async_playwright() as p:
         print(" KHỞI ĐỘNG BROWSER...")
         browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context(locale="vi-VN")
-        page = await context.new_page()
+        # Chặn ảnh/media ở mức context để tăng tốc độ
+        pool = await BrowserPool(
+            browser, size=DETAIL_WORKERS, storage_state_path=BROWSER_STATE_FILE, warmup=warm_booking,
+            max_navigations=CONTEXT_MAX_NAVIGATIONS, max_memory_mb=CONTEXT_MAX_MEMORY_MB,
+            context_options={"locale": "vi-VN"}, block_resources=[BLOCK_IMAGES],
+        ).start()
+        archive = SnapshotArchive(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
 
-        print(f"\n>> Đang lấy dữ liệu cho các khoảng: {ID_RANGES} ...")
-        
-        # --- TẠO CÂU SQL ĐỘNG CHO NHIỀU KHOẢNG ---
-        # Logic: WHERE (id BETWEEN x AND y) OR (id BETWEEN a AND b) ...
-        where_clauses = []
-        params = {}
-        
-        for i, (start, end) in enumerate(ID_RANGES):
-            p_start = f"s{i}"
-            p_end = f"e{i}"
-            where_clauses.append(f"(id BETWEEN :{p_start} AND :{p_end})")
-            params[p_start] = start
-            params[p_end] = end
-            
-        where_sql = " OR ".join(where_clauses)
-        
-        full_sql = text(f"""
-            SELECT id, hotel_link, room_type
-            FROM {SOURCE_TABLE}
-            WHERE ({where_sql})
-              AND hotel_link LIKE 'http%'
-            ORDER BY id ASC
-        """)
-        
-        with engine.connect() as conn:
-            rows = conn.execute(full_sql, params).fetchall()
-
-        if not rows:
-            print("!!! Không tìm thấy dữ liệu nào trong các khoảng ID này.")
-            await browser.close()
-            return
-
-        print(f"-> Tổng cộng tìm thấy {len(rows)} khách sạn cần xử lý.")
-
-        for row in rows:
-            p_id = row[0]
-            link = row[1]
-            r_type = row[2]
-
-            print(f" [ID: {p_id}] Xử lý chi tiết cho: {r_type}")
-            
-            # Cào dữ liệu
-            details = await scrape_detail_by_link(page, link, r_type)
-            
-            area = "N/A"
-            facilities = "N/A"
-            
-            if details:
-                area = details['area']
-                facilities = details['facilities']
-                print(f"      + Tìm thấy: {area} | {facilities[:30]}...")
-            else:
-                print("      ! Không tìm thấy (Lưu N/A).")
+        # --- SINH JOB TỪ SOURCE_TABLE TRỪ CÁC ID ĐÃ CÓ TRONG TARGET_TABLE ---
+        print(f"\n>> Đồng bộ bảng việc '{detail_jobs.JOB_TABLE}' (phạm vi ID: {ID_RANGES or 'tất cả'}) ...")
+        detail_jobs.ensure_job_table(engine)
+        added = detail_jobs.sync_jobs(engine, SOURCE_TABLE, TARGET_TABLE, ID_RANGES)
+        stats = detail_jobs.job_stats(engine)
+        print(f"-> Thêm / mở lại {added} job | trạng thái: {stats} | tiến trình: {detail_jobs.worker_name()}")
 
-            # --- LOGIC KIỂM TRA & UPDATE ---
-            try:
-                with engine.begin() as trans_conn:
-                    # 1. Kiểm tra xem hotel_id này đã có trong bảng room_details chưa
-                    check_sql = text(f"SELECT 1 FROM {TARGET_TABLE} WHERE hotel_id = :hid")
-                    exists = trans_conn.execute(check_sql, {"hid": p_id}).scalar()
-
-                    if exists:
-                        # 2A. NẾU CÓ RỒI -> UPDATE
-                        update_sql = text(f"""
-                            UPDATE {TARGET_TABLE}
-                            SET area_m2 = :area, 
-                                facilities = :facs
-                            WHERE hotel_id = :hid
-                        """)
-                        trans_conn.execute(update_sql, {
-                            "hid": p_id,
-                            "area": area,
-                            "facs": facilities
-                        })
-                        print("      -> [UPDATE] Đã cập nhật dữ liệu cũ.")
-                    else:
-                        # 2B. NẾU CHƯA CÓ -> INSERT
-                        insert_sql = text(f"""
-                            INSERT INTO {TARGET_TABLE} (hotel_id, area_m2, facilities)
-                            VALUES (:hid, :area, :facs)
-                        """)
-                        trans_conn.execute(insert_sql, {
-                            "hid": p_id,
-                            "area": area,
-                            "facs": facilities
-                        })
-                        print("      -> [INSERT] Đã thêm mới.")
-            except Exception as e:
-                print(f"      ! Lỗi DB Action: {e}")
+        queue = asyncio.Queue()
+        progress = Progress(stats.get(detail_jobs.PENDING, 0) + stats.get(detail_jobs.FAILED, 0))
 
-            await asyncio.sleep(1) 
+        writer = BatchedCopyWriter(
+            engine, TARGET_TABLE, TARGET_COLUMNS,
+            batch_size=WRITER_BATCH_SIZE, flush_interval=WRITER_FLUSH_INTERVAL,
+            conflict_key="hotel_id", touch_column="updated_at",
+        ).start()
+        cache_writer, cache_stats = None, None
+        if USE_CACHE:
+            detail_cache.ensure_cache_table(engine)
+            cache_stats = detail_cache.CacheStats()
+            cache_writer = BatchedCopyWriter(
+                engine, detail_cache.CACHE_TABLE, detail_cache.CACHE_COLUMNS,
+                batch_size=WRITER_BATCH_SIZE, flush_interval=WRITER_FLUSH_INTERVAL,
+                conflict_key=["hotel_key", "room_type"], touch_column="fetched_at",
+            ).start()
+        workers = [
+            asyncio.create_task(detail_worker(i + 1, pool, queue, writer, cache_writer, engine, archive, progress))
+            for i in range(DETAIL_WORKERS)
+        ]
+        try:
+            # Thuê tới khi hết; job lỗi trong lượt vừa rồi (còn lượt thử) được thuê lại ở vòng sau
+            leased = 0
+            while True:
+                n = await lease_feeder(engine, queue, DETAIL_WORKERS, writer, cache_stats)
+                await queue.join()
+                leased += n
+                if n == 0:
+                    break
+            print(f"-> Tiến trình này đã thuê {leased} khách sạn; không còn job nào để thuê.")
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            # Dừng giữa chừng (Ctrl+C, lỗi) vẫn flush hết các dòng đã cào
+            await asyncio.to_thread(writer.close)
+            if cache_writer:
+                await asyncio.to_thread(cache_writer.close)
+                cache_stats.report()
+            w = writer.stats()
+            print(f" [writer] {w['rows_written']} dòng / {w['batches']} lô | lỗi {w['rows_failed']} dòng | "
+                  f"{w['rows_per_second']} dòng/s")
 
         print("\n=== HOÀN TẤT ===")
+        print(f"-> Trạng thái job: {detail_jobs.job_stats(engine)}")
+        EXTRACT_STATS.report()
+        LIMITER.print_report()
+        TELEMETRY.write()
+        await pool.close()
         await browser.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,269 @@
+"""
+Chế độ bắt payload mạng cho trang kết quả tìm kiếm Booking.com.
+
+Thay vì quét DOM của từng property-card, module này nghe các response
+XHR/fetch (GraphQL) và JSON nhúng trong HTML, rồi giải mã thẳng các trường
+khách sạn / giá / đánh giá / phòng thành dict cùng khuôn với bản DOM
+(`Hotel Name`, `Hotel Link`, `Final Price`, ...).
+
+Chạy offline trên fixture đã ghi:
+    python payload_capture.py fixtures/search_graphql_page1.json
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+
+# Các URL chứa payload kết quả tìm kiếm
+PAYLOAD_URL_PATTERNS = ("/dml/graphql", "/searchresults")
+BOOKING_HOST = "https://www.booking.com"
+
+JSON_SCRIPT_RE = re.compile(
+    r'<script[^>]*type="application/json"[^>]*>(.*?)</script>', re.DOTALL | re.IGNORECASE
+)
+TAG_RE = re.compile(r"<[^>]+>")
+
+
+def _get(obj, *path, default=None):
+    """Lấy giá trị lồng nhau an toàn: _get(d, "a", "b", 0, "c")."""
+    for key in path:
+        if isinstance(obj, dict):
+            obj = obj.get(key)
+        elif isinstance(obj, list) and isinstance(key, int) and -len(obj) <= key < len(obj):
+            obj = obj[key]
+        else:
+            return default
+        if obj is None:
+            return default
+    return obj
+
+
+def _to_int(value):
+    try:
+        return int(round(float(value)))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _strip_tags(text):
+    return TAG_RE.sub("", text or "").strip()
+
+
+def iter_property_results(payload):
+    """Duyệt đệ quy JSON, trả về mọi object kết quả có `basicPropertyData`."""
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if isinstance(node.get("basicPropertyData"), dict):
+                yield node
+                continue
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def build_hotel_link(basic):
+    page_name = basic.get("pageName")
+    country = _get(basic, "location", "countryCode")
+    if not page_name or not country:
+        return "N/A"
+    return f"{BOOKING_HOST}/hotel/{country}/{page_name}.vi.html"
+
+
+def decode_property(result):
+    """Chuyển 1 object kết quả GraphQL thành dict cùng khuôn với bản trích xuất DOM."""
+    basic = result["basicPropertyData"]
+    info = {}
+
+    info["Hotel Name"] = _get(result, "displayName", "text") or basic.get("name") or "N/A"
+    info["Hotel Link"] = build_hotel_link(basic)
+
+    stars = _get(basic, "starRating", "value")
+    # Chuỗi như mọi cột khác (Final Price, Rating Score...) để 2 chế độ ghi cùng kiểu cột
+    info["Stars"] = str(stars) if stars else "N/A"
+
+    # --- Giá ---
+    price_info = result.get("priceDisplayInfoIrene") or {}
+    final_price = _to_int(_get(price_info, "displayPrice", "amountPerStay", "amountUnformatted"))
+    original_price = _to_int(_get(price_info, "priceBeforeDiscount", "amountPerStay", "amountUnformatted"))
+    if not final_price:
+        final_price = _to_int(_get(result, "blocks", 0, "finalPrice", "amount"))
+    if original_price < final_price:
+        original_price = final_price
+    info["Final Price"] = str(final_price)
+    info["Original Price"] = str(original_price)
+
+    # --- Đánh giá ---
+    score = _get(basic, "reviewScore", "score")
+    info["Rating Score"] = str(score) if score else "N/A"
+    review_count = _get(basic, "reviewScore", "reviewCount")
+    info["Review Count"] = str(review_count) if review_count else "N/A"
+    loc_score = _get(basic, "reviewScore", "secondaryScore")
+    # Điểm không phải số (chuỗi lạ, object) -> N/A thay vì làm hỏng cả payload
+    loc_value = _to_float(loc_score)
+    info["Location Score"] = str(loc_score) if loc_score and loc_value is not None and loc_value <= 10 else "N/A"
+
+    # --- Địa chỉ ---
+    info["Address"] = (
+        _get(result, "location", "displayLocation")
+        or _get(basic, "location", "address")
+        or "N/A"
+    )
+    info["Distance"] = _get(result, "location", "mainDistance") or "N/A"
+
+    # --- Phòng ---
+    unit = _get(result, "matchingUnitConfigurations", "unitConfigurations", 0) or {}
+    room_name = unit.get("name") or _strip_tags(result.get("unitConfigurationLabel", "").split(":")[0])
+    info["Room Type"] = room_name or "N/A"
+    beds = []
+    for bed_cfg in unit.get("bedConfigurations") or []:
+        for bed in bed_cfg.get("beds") or []:
+            if bed.get("text"):
+                beds.append(bed["text"])
+    info["Bed Type"] = ", ".join(beds) if beds else "N/A"
+
+    # --- Chính sách ---
+    info["Free Cancellation"] = "Yes" if _get(result, "policies", "showFreeCancellation") else "No"
+    meal_plan = _get(result, "mealPlanIncluded", "mealPlanType") or ""
+    info["Breakfast Included"] = "Yes" if "BREAKFAST" in meal_plan.upper() else "No"
+
+    badge = (
+        _get(price_info, "badges", 0, "name", "translation")
+        or _get(result, "badges", 0, "text")
+        or "None"
+    )
+    info["Badge Deal"] = badge
+    return info
+
+
+def decode_search_payload(payload):
+    """Giải mã 1 payload JSON bất kỳ -> list dict khách sạn."""
+    return [decode_property(r) for r in iter_property_results(payload)]
+
+
+def decode_html_document(html):
+    """Giải mã các khối <script type="application/json"> nhúng trong trang HTML."""
+    items = []
+    for block in JSON_SCRIPT_RE.findall(html or ""):
+        try:
+            payload = json.loads(block)
+        except ValueError:
+            continue
+        items.extend(decode_search_payload(payload))
+    return items
+
+
+def dedupe_items(items):
+    """Loại trùng theo (Hotel Link, Room Type), giữ thứ tự xuất hiện."""
+    seen = set()
+    result = []
+    for item in items:
+        key = (item.get("Hotel Link"), item.get("Room Type"))
+        if key in seen:
+            continue
+        seen.add(key)
+        result.append(item)
+    return result
+
+
+class SearchPayloadCollector:
+    """
+    Gắn vào 1 page Playwright, gom mọi response có payload kết quả tìm kiếm.
+
+    Dùng:
+        collector = SearchPayloadCollector(page, record_dir="fixtures/recorded")
+        collector.attach()
+        ... goto + load more ...
+        items = collector.items()
+        collector.detach()
+    """
+    def __init__(self, page, record_dir=None):
+        self.page = page
+        self.record_dir = record_dir
+        self.payload_count = 0
+        self._items = []
+        self._taken = 0
+        self._pending = set()
+
+    def attach(self):
+        self.page.on("response", self._on_response)
+
+    def detach(self):
+        self.page.remove_listener("response", self._on_response)
+
+    def _on_response(self, response):
+        if not any(p in response.url for p in PAYLOAD_URL_PATTERNS):
+            return
+        if response.request.resource_type not in ("xhr", "fetch", "document"):
+            return
+        # Handler đồng bộ -> tách việc đọc body sang task để không chặn sự kiện
+        task = asyncio.ensure_future(self._read(response))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _read(self, response):
+        try:
+            if response.request.resource_type == "document":
+                body = await response.text()
+                items = decode_html_document(body)
+                raw = body
+                ext = "html"
+            else:
+                payload = await response.json()
+                items = decode_search_payload(payload)
+                raw = json.dumps(payload, ensure_ascii=False)
+                ext = "json"
+        except Exception:
+            return
+        if not items:
+            return
+        self.payload_count += 1
+        self._items.extend(items)
+        if self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+            name = f"search_{int(time.time() * 1000)}_{self.payload_count}.{ext}"
+            with open(os.path.join(self.record_dir, name), "w", encoding="utf-8") as f:
+                f.write(raw)
+
+    async def drain(self):
+        """Chờ các response đang đọc dở."""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    def items(self):
+        return dedupe_items(self._items)
+
+    def take_new(self):
+        """Trả về các item mới bắt được kể từ lần gọi trước (phục vụ thu hoạch dần)."""
+        new_items = self._items[self._taken:]
+        self._taken = len(self._items)
+        return new_items
+
+
+def decode_fixture(path):
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    if path.endswith((".html", ".htm")):
+        return decode_html_document(content)
+    return decode_search_payload(json.loads(content))
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or [
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "search_graphql_page1.json")
+    ]
+    for path in paths:
+        rows = dedupe_items(decode_fixture(path))
+        print(f"{path}: {len(rows)} khách sạn")
+        for row in rows:
+            print("  ", json.dumps(row, ensure_ascii=False))
@@ -0,0 +1,184 @@
+"""
+Lập kế hoạch kịch bản tìm kiếm Booking: chuẩn hóa, loại trùng, chọn tập phủ rộng.
+
+- canonical_config(): gom tuổi trẻ em về nhóm tuổi (Booking tính giá theo nhóm,
+  các tuổi cùng nhóm cho ra cùng danh sách) và sắp xếp, để 2 cấu hình tương
+  đương sinh ra cùng 1 URL và cùng 1 tên kịch bản.
+- dedupe_configs() / draw_distinct(): bỏ cấu hình trùng sau chuẩn hóa.
+- plan_scenarios(): chọn N kịch bản khác nhau phủ rộng nhất không gian
+  (người lớn, trẻ em, phòng, nhóm tuổi) theo seed.
+
+Xem thử:
+    python scenario_planner.py 20 2024
+"""
+import itertools
+import json
+import math
+import random
+import sys
+
+# Nhóm tuổi trẻ em -> tuổi đại diện khi đưa vào URL
+AGE_BANDS = [
+    (0, 1, 0),     # em bé (nôi/cũi)
+    (2, 5, 4),
+    (6, 11, 8),
+    (12, 17, 14),
+]
+MAX_ADULTS = 6
+MAX_CHILDREN = 3
+MAX_PEOPLE_PER_ROOM = 4
+
+
+def age_band(age):
+    for idx, (low, high, _) in enumerate(AGE_BANDS):
+        if low <= age <= high:
+            return idx
+    return len(AGE_BANDS) - 1
+
+
+def representative_age(age):
+    return AGE_BANDS[age_band(age)][2]
+
+
+def scenario_name(adults, children, rooms, ages):
+    name = f"Random_{adults}A_{children}C_{rooms}R"
+    if children > 0:
+        name += f"_Ages({'_'.join(map(str, ages))})"
+    return name
+
+
+def canonical_key(config):
+    ages = tuple(sorted(representative_age(a) for a in config["ages"]))
+    return (config["adults"], len(ages), config["rooms"], ages)
+
+
+def config_from_key(key):
+    adults, children, rooms, ages = key
+    return {
+        "name": scenario_name(adults, children, rooms, ages),
+        "adults": adults,
+        "children": children,
+        "ages": list(ages),
+        "rooms": rooms,
+    }
+
+
+def canonical_config(config):
+    return config_from_key(canonical_key(config))
+
+
+def dedupe_configs(configs):
+    """Chuẩn hóa và bỏ cấu hình trùng, giữ thứ tự xuất hiện đầu tiên."""
+    seen = set()
+    result = []
+    for cfg in configs:
+        key = canonical_key(cfg)
+        if key in seen:
+            continue
+        seen.add(key)
+        result.append(config_from_key(key))
+    return result
+
+
+def draw_distinct(generator, n, max_tries=None):
+    """Gọi generator() tới khi đủ n cấu hình khác nhau (hoặc hết max_tries lần)."""
+    max_tries = max_tries or n * 50
+    seen = set()
+    result = []
+    for _ in range(max_tries):
+        if len(result) >= n:
+            break
+        key = canonical_key(generator())
+        if key not in seen:
+            seen.add(key)
+            result.append(config_from_key(key))
+    return result
+
+
+def enumerate_space():
+    """Toàn bộ cấu hình hợp lệ (cùng ràng buộc với generate_random_config)."""
+    band_ages = [band[2] for band in AGE_BANDS]
+    keys = []
+    for adults in range(1, MAX_ADULTS + 1):
+        for children in range(0, MAX_CHILDREN + 1):
+            min_rooms = min(math.ceil((adults + children) / MAX_PEOPLE_PER_ROOM), adults)
+            for rooms in range(min_rooms, adults + 1):
+                for ages in itertools.combinations_with_replacement(band_ages, children):
+                    keys.append((adults, children, rooms, tuple(ages)))
+    return keys
+
+
+def _features(key):
+    adults, children, rooms, ages = key
+    per_room = (adults + children) / rooms
+    bands = [0] * len(AGE_BANDS)
+    for age in ages:
+        bands[age_band(age)] += 1
+    return (
+        (adults - 1) / (MAX_ADULTS - 1),
+        children / MAX_CHILDREN,
+        (rooms - 1) / (MAX_ADULTS - 1),
+        per_room / MAX_PEOPLE_PER_ROOM,
+        *(b / MAX_CHILDREN for b in bands),
+    )
+
+
+def _coverage_values(key):
+    """Các giá trị (chiều, giá trị) mà 1 kịch bản phủ được, gồm cả cặp người lớn × trẻ em."""
+    adults, children, rooms, ages = key
+    values = {("adults", adults), ("children", children), ("rooms", rooms),
+              ("per_room", math.ceil((adults + children) / rooms)),
+              ("adults_children", (adults, children))}
+    values.update(("age_band", age_band(a)) for a in ages)
+    return values
+
+
+def plan_scenarios(n, seed=None):
+    """
+    Chọn n kịch bản khác nhau phủ rộng nhất theo seed (cùng seed -> cùng kết quả).
+    Mỗi bước tham lam chọn kịch bản phủ thêm nhiều giá trị chưa có nhất; hòa thì
+    chọn kịch bản xa tập đã chọn nhất trên không gian đặc trưng đã chuẩn hóa.
+    """
+    rng = random.Random(seed)
+    space = enumerate_space()
+    rng.shuffle(space)
+    n = min(n, len(space))
+    feats = {key: _features(key) for key in space}
+    values = {key: _coverage_values(key) for key in space}
+
+    covered = set()
+    chosen = []
+    min_dist = {key: math.inf for key in space}
+    remaining = list(space)
+    while len(chosen) < n:
+        # space đã xáo theo seed -> max() lấy phần tử đầu tiên khi bằng nhau
+        best = max(remaining, key=lambda k: (len(values[k] - covered), min_dist[k]))
+        chosen.append(best)
+        remaining.remove(best)
+        covered |= values[best]
+        for key in remaining:
+            d = math.dist(feats[key], feats[best])
+            if d < min_dist[key]:
+                min_dist[key] = d
+    return [config_from_key(key) for key in chosen]
+
+
+def coverage_report(configs):
+    """Đếm số giá trị khác nhau đã phủ trên từng chiều."""
+    keys = [canonical_key(c) for c in configs]
+    return {
+        "scenarios": len(set(keys)),
+        "adults": sorted({k[0] for k in keys}),
+        "children": sorted({k[1] for k in keys}),
+        "rooms": sorted({k[2] for k in keys}),
+        "age_bands": sorted({age_band(a) for k in keys for a in k[3]}),
+    }
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 2024
+    plan = plan_scenarios(n, seed)
+    for cfg in plan:
+        print(cfg["name"])
+    print(json.dumps(coverage_report(plan), ensure_ascii=False))
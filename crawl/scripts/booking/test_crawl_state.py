@@ -0,0 +1,45 @@
+from sqlalchemy import create_engine
+
+import crawl_state
+from crawl_state import DONE, FAILED, PENDING
+
+
+def unit(scenario, url):
+    return (("Vung Tau", scenario, "2026-01-01"), url)
+
+
+def keys(units):
+    return [u[0] for u in units]
+
+
+def test_group_by_url_queues_one_unit_per_url():
+    units = [unit("S1", "u1"), unit("S2", "u2"), unit("S3", "u1"), unit("S4", "u1")]
+    todo, aliases, done_aliases = crawl_state.group_by_url(units, {}, lambda u: u[1])
+    assert keys(todo) == keys(units[:2])
+    assert aliases == {units[0][0]: [units[2][0], units[3][0]]}
+    assert done_aliases == []
+
+
+def test_group_by_url_finishes_duplicates_of_a_done_unit():
+    units = [unit("S1", "u1"), unit("S2", "u1"), unit("S3", "u2")]
+    # Đơn vị done không phải đơn vị đầu nhóm (thứ tự kịch bản khác lượt trước)
+    statuses = {units[1][0]: DONE, units[2][0]: DONE}
+    todo, aliases, done_aliases = crawl_state.group_by_url(units, statuses, lambda u: u[1])
+    assert todo == [] and aliases == {}
+    assert done_aliases == [(units[0][0], units[1][0])]
+
+
+def test_mark_alias_takes_owner_status():
+    engine = create_engine("sqlite://")
+    crawl_state.ensure_state_table(engine)
+    owner, dup = ("Vung Tau", "S1", "2026-01-01"), ("Vung Tau", "S2", "2026-01-01")
+    crawl_state.register_units(engine, [owner, dup])
+    assert crawl_state.load_statuses(engine, "2026-01-01") == {owner: PENDING, dup: PENDING}
+
+    crawl_state.mark_unit(engine, owner, FAILED, 0, "lỗi")
+    crawl_state.mark_alias(engine, dup, owner, FAILED)
+    assert crawl_state.load_statuses(engine, "2026-01-01") == {owner: FAILED, dup: FAILED}
+
+    crawl_state.mark_unit(engine, owner, DONE, 30)
+    crawl_state.mark_alias(engine, dup, owner)
+    assert crawl_state.load_statuses(engine, "2026-01-01") == {owner: DONE, dup: DONE}
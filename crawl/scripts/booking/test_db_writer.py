@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from db_writer import BatchedCopyWriter
+
+COLUMNS = ["hotel_id", "area_m2"]
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE details (hotel_id INTEGER PRIMARY KEY, area_m2 TEXT NOT NULL)"))
+    return engine
+
+
+def run_writer(engine, steps, **kwargs):
+    """steps: list ("put", token, rows) | ("done", token); trả về [(token, lỗi)] theo thứ tự callback."""
+    calls = []
+
+    async def main():
+        writer = BatchedCopyWriter(engine, "details", COLUMNS, flush_interval=60, **kwargs).start()
+        for step in steps:
+            if step[0] == "put":
+                await writer.put(step[2], token=step[1])
+            else:
+                await writer.after_flush(lambda error, token=step[1]: calls.append((token, error)),
+                                         token=step[1])
+        await asyncio.to_thread(writer.close)
+        return writer
+
+    writer = asyncio.run(main())
+    return calls, writer
+
+
+def count(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT COUNT(*) FROM details")).scalar()
+
+
+def test_callback_gets_none_after_successful_flush(engine):
+    calls, writer = run_writer(engine, [("put", "a", [{"hotel_id": 1, "area_m2": "20"}]), ("done", "a")])
+    assert calls == [("a", None)]
+    assert count(engine) == 1
+    assert writer.stats()["rows_failed"] == 0
+
+
+def test_callback_gets_error_when_its_rows_failed(engine):
+    calls, writer = run_writer(engine, [("put", "a", [{"hotel_id": 1, "area_m2": None}]), ("done", "a")])
+    assert calls[0][0] == "a" and calls[0][1] is not None
+    assert writer.stats()["rows_failed"] == 1
+
+
+def test_failure_is_reported_to_the_unit_flushed_by_another_callback(engine):
+    # Dòng lỗi của "a" bị flush khi xử lý callback của "b": "a" vẫn phải nhận lỗi, "b" thì không
+    calls, _ = run_writer(engine, [
+        ("put", "a", [{"hotel_id": 1, "area_m2": None}]),
+        ("done", "b"),
+        ("done", "a"),
+    ])
+    assert calls[0] == ("b", None)
+    assert calls[1][0] == "a" and calls[1][1] is not None
+
+
+def test_batch_failure_marks_every_token_in_the_batch(engine):
+    calls, _ = run_writer(engine, [
+        ("put", "a", [{"hotel_id": 1, "area_m2": "20"}]),
+        ("put", "b", [{"hotel_id": 2, "area_m2": None}]),
+        ("done", "a"),
+        ("put", "c", [{"hotel_id": 3, "area_m2": "30"}]),
+        ("done", "b"),
+        ("done", "c"),
+    ])
+    errors = {token: error is not None for token, error in calls}
+    assert errors == {"a": True, "b": True, "c": False}
+    assert count(engine) == 1
+
+
+def test_upsert_keeps_last_row_per_key(engine):
+    calls, _ = run_writer(engine, [
+        ("put", "a", [{"hotel_id": 1, "area_m2": "20"}, {"hotel_id": 1, "area_m2": "25"}]),
+        ("done", "a"),
+    ], conflict_key="hotel_id")
+    assert calls == [("a", None)]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT area_m2 FROM details")).scalar() == "25"
@@ -0,0 +1,164 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import StaticPool
+
+import detail_jobs
+
+
+@pytest.fixture
+def engine():
+    # sync_jobs chỉ cần split_part ngoài SQL chuẩn -> giả lập trên SQLite
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def add_split_part(conn, _):
+        conn.create_function("split_part", 3, lambda s, sep, n: (s or "").split(sep)[n - 1]
+                             if len((s or "").split(sep)) >= n else "")
+
+    with engine.begin() as conn:
+        for stmt in detail_jobs.CREATE_JOB_SQL.split(";"):
+            if stmt.strip():
+                conn.execute(text(stmt))
+        conn.execute(text("CREATE TABLE scenarios (id INTEGER PRIMARY KEY, hotel_link TEXT, room_type TEXT)"))
+        conn.execute(text("CREATE TABLE details (hotel_id INTEGER PRIMARY KEY)"))
+    return engine
+
+
+def add_scenarios(engine, rows):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO scenarios (id, hotel_link, room_type) VALUES (:id, :link, 'Deluxe')"),
+                     [{"id": i, "link": link} for i, link in rows])
+
+
+def add_details(engine, ids):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO details (hotel_id) VALUES (:id)"), [{"id": i} for i in ids])
+
+
+def set_job(engine, key, status, attempts):
+    with engine.begin() as conn:
+        conn.execute(text(f"UPDATE {detail_jobs.JOB_TABLE} SET status = :st, attempts = :a WHERE hotel_key = :k"),
+                     {"st": status, "a": attempts, "k": key})
+
+
+def jobs(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"SELECT hotel_key, status, attempts FROM {detail_jobs.JOB_TABLE}")).fetchall()
+    return {r[0]: (r[1], r[2]) for r in rows}
+
+
+def sync(engine):
+    return detail_jobs.sync_jobs(engine, "scenarios", "details")
+
+
+def test_sync_creates_one_job_per_hotel_key(engine):
+    add_scenarios(engine, [(1, "https://h/a?x=1"), (2, "https://h/a#rooms"), (3, "https://h/b"), (4, "n/a")])
+    assert sync(engine) == 2
+    assert jobs(engine) == {"https://h/a": ("pending", 0), "https://h/b": ("pending", 0)}
+
+
+def test_sync_reopens_done_and_failed_jobs_that_gained_ids(engine):
+    add_scenarios(engine, [(1, "https://h/a"), (2, "https://h/b")])
+    sync(engine)
+    add_details(engine, [1])
+    set_job(engine, "https://h/a", "done", 1)
+    set_job(engine, "https://h/b", "failed", 3)
+
+    # Chưa có id mới: job done không còn dòng thiếu, job failed hết lượt vẫn giữ nguyên
+    assert sync(engine) == 0
+    assert jobs(engine) == {"https://h/a": ("done", 1), "https://h/b": ("failed", 3)}
+
+    add_scenarios(engine, [(10, "https://h/a"), (11, "https://h/b")])
+    assert sync(engine) == 2
+    assert jobs(engine) == {"https://h/a": ("pending", 0), "https://h/b": ("pending", 0)}
+
+
+def test_sync_leaves_leased_jobs_alone(engine):
+    add_scenarios(engine, [(1, "https://h/a")])
+    sync(engine)
+    set_job(engine, "https://h/a", "leased", 1)
+    add_scenarios(engine, [(2, "https://h/a")])
+    assert sync(engine) == 0
+    assert jobs(engine) == {"https://h/a": ("leased", 1)}
+
+    # Xong lượt thuê mà id 2 chưa có chi tiết -> lần đồng bộ sau mở lại
+    add_details(engine, [1])
+    set_job(engine, "https://h/a", "done", 1)
+    assert sync(engine) == 1
+    assert jobs(engine) == {"https://h/a": ("pending", 0)}
+
+
+def test_complete_and_fail_record_result(engine):
+    add_scenarios(engine, [(1, "https://h/a"), (2, "https://h/b")])
+    sync(engine)
+    detail_jobs.complete_job(engine, "https://h/a", row_count=4)
+    detail_jobs.fail_job(engine, "https://h/b", "x" * 600)
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"SELECT hotel_key, row_count, last_error FROM {detail_jobs.JOB_TABLE}")).fetchall()
+    result = {r[0]: (r[1], r[2]) for r in rows}
+    assert result["https://h/a"] == (4, None)
+    assert len(result["https://h/b"][1]) == 500
+    assert detail_jobs.job_stats(engine) == {"done": 1, "failed": 1}
+
+
+def test_expired_lease_on_last_attempt_becomes_failed(engine):
+    add_scenarios(engine, [(1, "https://h/a"), (2, "https://h/b"), (3, "https://h/c")])
+    sync(engine)
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            UPDATE {detail_jobs.JOB_TABLE} SET status = 'leased', attempts = :a, lease_until = :until
+            WHERE hotel_key = :k
+        """), [{"k": "https://h/a", "a": 3, "until": "2000-01-01 00:00:00"},   # chết ở lượt cuối
+               {"k": "https://h/b", "a": 1, "until": "2000-01-01 00:00:00"},   # còn lượt -> để lease_jobs thuê lại
+               {"k": "https://h/c", "a": 3, "until": "2999-01-01 00:00:00"}])  # đang thuê
+    assert detail_jobs.fail_expired_leases(engine, max_attempts=3) == 1
+    assert jobs(engine) == {"https://h/a": ("failed", 3), "https://h/b": ("leased", 1), "https://h/c": ("leased", 3)}
+
+    # Khách sạn có id mới -> job failed đó được mở lại như mọi job failed khác
+    add_scenarios(engine, [(10, "https://h/a")])
+    assert sync(engine) == 1
+    assert jobs(engine)["https://h/a"] == ("pending", 0)
+
+
+@pytest.fixture
+def pg_engine():
+    # lease_jobs dùng make_interval / FOR UPDATE SKIP LOCKED -> chỉ chạy được trên PostgreSQL thật
+    url = os.environ.get("DETAIL_JOBS_TEST_DB")
+    if not url:
+        pytest.skip("Đặt DETAIL_JOBS_TEST_DB=postgresql://... để chạy test thuê job")
+    schema = f"test_detail_jobs_{os.getpid()}"
+    admin = create_engine(url)
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = create_engine(url, connect_args={"options": f"-csearch_path={schema}"})
+    detail_jobs.ensure_job_table(engine)
+    yield engine
+    engine.dispose()
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+    admin.dispose()
+
+
+def test_lease_picks_only_available_jobs(pg_engine):
+    with pg_engine.begin() as conn:
+        conn.execute(text(f"""
+            INSERT INTO {detail_jobs.JOB_TABLE} (hotel_key, status, attempts, lease_until) VALUES
+            ('pending', 'pending', 0, NULL),
+            ('retry', 'failed', 1, NULL),
+            ('expired', 'leased', 1, CURRENT_TIMESTAMP - INTERVAL '1 minute'),
+            ('busy', 'leased', 1, CURRENT_TIMESTAMP + INTERVAL '10 minutes'),
+            ('exhausted', 'failed', 3, NULL),
+            ('dead', 'leased', 3, CURRENT_TIMESTAMP - INTERVAL '1 minute'),
+            ('done', 'done', 1, NULL)
+        """))
+    first = detail_jobs.lease_jobs(pg_engine, 2, max_attempts=3, worker="w1")
+    second = detail_jobs.lease_jobs(pg_engine, 10, max_attempts=3, worker="w2")
+    # Ít lượt thử trước, hòa thì theo hotel_key; hai lần thuê không bao giờ trùng job
+    assert sorted(first) == ["expired", "pending"]
+    assert second == ["retry"]
+    assert detail_jobs.lease_jobs(pg_engine, 10, worker="w3") == []
+    with pg_engine.connect() as conn:
+        status = conn.execute(text(f"SELECT status FROM {detail_jobs.JOB_TABLE} WHERE hotel_key = 'dead'")).scalar()
+    assert status == "failed"
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+import details_scraper
+
+
+def run_group(monkeypatch, pages, items):
+    """Chạy scrape_hotel_group với scrape_hotel_rooms giả: pages = {link: kết quả | None}."""
+    calls = []
+
+    async def fake_rooms(page, link, room_types, archive=None):
+        calls.append(link)
+        return pages.get(link)
+
+    monkeypatch.setattr(details_scraper, "scrape_hotel_rooms", fake_rooms)
+    result = asyncio.run(asyncio.wait_for(details_scraper.scrape_hotel_group(None, items), timeout=2))
+    return result, calls
+
+
+def test_group_raises_when_no_variant_loads(monkeypatch):
+    items = [(1, "https://a", "Deluxe"), (2, "https://a", "Suite")]
+    with pytest.raises(RuntimeError):
+        run_group(monkeypatch, {}, items)
+
+
+def test_group_tries_next_variant_after_failed_link(monkeypatch):
+    items = [(1, "https://a", "Deluxe"), (2, "https://b", "Deluxe")]
+    found = {"Deluxe": {"area": "20", "facilities": "Wifi"}}
+    result, calls = run_group(monkeypatch, {"https://b": found}, items)
+    assert calls == ["https://a", "https://b"]
+    assert result == {1: None, 2: found["Deluxe"]}
+
+
+def test_group_marks_missing_room_types_none(monkeypatch):
+    items = [(1, "https://a", "Deluxe"), (2, "https://a", "Suite")]
+    found = {"Deluxe": {"area": "20", "facilities": "Wifi"}}
+    result, calls = run_group(monkeypatch, {"https://a": found}, items)
+    assert calls == ["https://a"]
+    assert result == {1: found["Deluxe"], 2: None}
@@ -0,0 +1,61 @@
+import json
+import os
+
+from payload_capture import decode_fixture, decode_search_payload, dedupe_items
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+GRAPHQL_ROWS = [
+    {"Hotel Name": "Khách sạn Mẫu Sài Gòn", "Hotel Link": "https://www.booking.com/hotel/vn/khach-san-mau-sai-gon.vi.html",
+     "Stars": "4", "Final Price": "1850000", "Original Price": "2300000",
+     "Rating Score": "8.7", "Review Count": "1234", "Location Score": "9.4",
+     "Address": "Quận 1, TP. Hồ Chí Minh", "Distance": "Cách trung tâm 0,5 km",
+     "Room Type": "Phòng Deluxe Giường Đôi", "Bed Type": "1 giường đôi lớn",
+     "Free Cancellation": "Yes", "Breakfast Included": "Yes", "Badge Deal": "Ưu Đãi Đầu Năm"},
+    {"Hotel Name": "Homestay Biển Xanh", "Hotel Link": "https://www.booking.com/hotel/vn/homestay-bien-xanh.vi.html",
+     "Stars": "N/A", "Final Price": "650000", "Original Price": "650000",
+     "Rating Score": "7.9", "Review Count": "56", "Location Score": "N/A",
+     "Address": "Vũng Tàu", "Distance": "Cách trung tâm 2 km",
+     "Room Type": "Phòng Gia Đình", "Bed Type": "N/A",
+     "Free Cancellation": "No", "Breakfast Included": "No", "Badge Deal": "None"},
+]
+
+EMBEDDED_ROWS = [
+    {"Hotel Name": "Khách sạn Bình Dương Xanh", "Hotel Link": "https://www.booking.com/hotel/vn/binh-duong-xanh.vi.html",
+     "Stars": "3", "Final Price": "720000", "Original Price": "720000",
+     "Rating Score": "8.1", "Review Count": "210", "Location Score": "N/A",
+     "Address": "Thủ Dầu Một", "Distance": "Cách trung tâm 1,2 km",
+     "Room Type": "Phòng Tiêu Chuẩn", "Bed Type": "2 giường đơn",
+     "Free Cancellation": "Yes", "Breakfast Included": "No", "Badge Deal": "None"},
+]
+
+
+def load_graphql():
+    with open(os.path.join(FIXTURES, "search_graphql_page1.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_decode_graphql_fixture():
+    assert decode_fixture(os.path.join(FIXTURES, "search_graphql_page1.json")) == GRAPHQL_ROWS
+
+
+def test_decode_embedded_html_fixture():
+    assert decode_fixture(os.path.join(FIXTURES, "search_page_embedded.html")) == EMBEDDED_ROWS
+
+
+def test_every_field_is_a_string_like_the_dom_rows():
+    for row in decode_search_payload(load_graphql()):
+        assert all(isinstance(v, str) for v in row.values())
+
+
+def test_non_numeric_location_score_keeps_the_payload():
+    text = json.dumps(load_graphql()).replace('"secondaryScore": 9.4', '"secondaryScore": "Tuyệt vời"')
+    rows = decode_search_payload(json.loads(text))
+    assert len(rows) == 2
+    assert rows[0]["Location Score"] == "N/A"
+    assert rows[0]["Rating Score"] == "8.7"
+
+
+def test_dedupe_by_link_and_room():
+    rows = decode_search_payload(load_graphql())
+    assert dedupe_items(rows + rows) == rows
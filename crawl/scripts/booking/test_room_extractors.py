@@ -0,0 +1,68 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from lxml import html as lxml_html
+
+from details_scraper import EXTRACT_ROOMS_JS
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from reextract import parse_booking_rooms
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "hotel_rooms.html")
+ROOM_TYPES = ["Phòng Deluxe Giường Đôi", "Phòng Superior", "Phòng Gia Đình", "Phòng Tiêu Chuẩn", "Phòng Không Có"]
+ENTRY = {"url": "https://www.booking.com/hotel/vn/bien-xanh.vi.html", "meta": {"room_types": ROOM_TYPES}}
+
+# Kết quả tính tay theo EXTRACT_ROOMS_JS: mỗi dòng 1 nguồn diện tích; "Phòng Không Có" không khớp dòng nào
+EXPECTED = [
+    {"room_type": "Phòng Deluxe Giường Đôi", "area_m2": "20 m²", "facilities": "Điều hòa, Minibar", "area_source": "row"},
+    {"room_type": "Phòng Superior", "area_m2": "23 m²", "facilities": "Điều hòa, Wi-Fi", "area_source": "script"},
+    {"room_type": "Phòng Gia Đình", "area_m2": "35 m²", "facilities": "Ban công", "area_source": "hidden"},
+    {"room_type": "Phòng Tiêu Chuẩn", "area_m2": "N/A", "facilities": "N/A", "area_source": "modal"},
+]
+
+
+def load_fixture():
+    with open(FIXTURE, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_offline_parser_follows_live_room_rules():
+    assert parse_booking_rooms(lxml_html.fromstring(load_fixture()), ENTRY) == EXPECTED
+
+
+def test_snapshot_without_room_types_uses_every_named_row():
+    rows = parse_booking_rooms(lxml_html.fromstring(load_fixture()), {"meta": {}})
+    assert rows == EXPECTED
+
+
+def run_live_extractor(page_html, room_types):
+    playwright = pytest.importorskip("playwright.async_api")
+
+    async def main():
+        async with playwright.async_playwright() as p:
+            try:
+                browser = await p.chromium.launch()
+            except Exception as e:
+                pytest.skip(f"Không mở được Chromium: {str(e).splitlines()[0]}")
+            page = await browser.new_page()
+            await page.set_content(page_html)
+            found = await page.evaluate(EXTRACT_ROOMS_JS, room_types)
+            await browser.close()
+            return found
+
+    return asyncio.run(main())
+
+
+def test_offline_parser_matches_live_extractor():
+    page_html = load_fixture()
+    found = run_live_extractor(page_html, ROOM_TYPES)
+    offline = {row["room_type"]: row for row in parse_booking_rooms(lxml_html.fromstring(page_html), ENTRY)}
+    assert set(offline) == {t for t, hit in found.items() if hit}
+    for r_type, row in offline.items():
+        hit = found[r_type]
+        # Dòng không có diện tích: lúc cào mở modal, offline chỉ đánh dấu "modal"
+        assert row["area_source"] == (hit["source"] or "modal")
+        if hit["area"]:
+            assert (row["area_m2"], row["facilities"]) == (hit["area"], hit["facilities"])
@@ -0,0 +1,52 @@
+import itertools
+
+import pytest
+
+from scenario_planner import (MAX_PEOPLE_PER_ROOM, canonical_config, canonical_key, coverage_report,
+                              dedupe_configs, draw_distinct, enumerate_space, plan_scenarios)
+
+
+def cfg(adults, ages, rooms):
+    return {"adults": adults, "children": len(ages), "ages": ages, "rooms": rooms}
+
+
+def test_canonical_config_maps_ages_to_bands_and_sorts():
+    assert canonical_config(cfg(2, [7, 3], 1)) == {
+        "name": "Random_2A_2C_1R_Ages(4_8)", "adults": 2, "children": 2, "ages": [4, 8], "rooms": 1}
+    assert canonical_config(cfg(1, [], 1))["name"] == "Random_1A_0C_1R"
+
+
+def test_dedupe_keeps_first_of_equivalent_configs():
+    # 3 và 5 tuổi cùng nhóm 2-5 -> cùng 1 kịch bản
+    configs = [cfg(2, [3], 1), cfg(2, [5], 1), cfg(2, [9], 1), cfg(2, [3], 2)]
+    assert [c["name"] for c in dedupe_configs(configs)] == [
+        "Random_2A_1C_1R_Ages(4)", "Random_2A_1C_1R_Ages(8)", "Random_2A_1C_2R_Ages(4)"]
+
+
+def test_draw_distinct_stops_at_n_or_max_tries():
+    counter = itertools.count()
+    assert len(draw_distinct(lambda: cfg(1 + next(counter) % 6, [], 1), 4)) == 4
+    # Generator luôn trả cùng 1 cấu hình: dừng sau max_tries, không lặp vô hạn
+    assert len(draw_distinct(lambda: cfg(2, [], 1), 5, max_tries=20)) == 1
+
+
+def test_enumerated_space_respects_room_limits():
+    for adults, children, rooms, ages in enumerate_space():
+        assert 1 <= rooms <= adults
+        assert len(ages) == children
+        assert (adults + children) <= rooms * MAX_PEOPLE_PER_ROOM or rooms == adults
+
+
+@pytest.mark.parametrize("seed", [1, 2024])
+def test_plan_is_deterministic_distinct_and_covers_every_dimension(seed):
+    plan = plan_scenarios(12, seed)
+    assert plan == plan_scenarios(12, seed)
+    assert len({canonical_key(c) for c in plan}) == 12
+    report = coverage_report(plan)
+    assert report["adults"] == [1, 2, 3, 4, 5, 6]
+    assert report["children"] == [0, 1, 2, 3]
+    assert report["age_bands"] == [0, 1, 2, 3]
+
+
+def test_plan_is_capped_at_space_size():
+    assert len(plan_scenarios(10 ** 6, seed=1)) == len(enumerate_space())
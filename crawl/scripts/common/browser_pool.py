@@ -0,0 +1,200 @@
+"""
+Pool browser context "ấm" dùng chung cho các scraper Playwright
+(booking_scraper.py, details_scraper.py, ivivu/getDetailHotels.py).
+
+- Context được tạo từ `storage_state` đã lưu (cookie consent, popup đã tắt...),
+  lần đầu chưa có file thì chạy hàm `warmup(page)` rồi lưu lại.
+- Mỗi context đếm số lần điều hướng (mọi page trong context); vượt
+  `max_navigations` hoặc JS heap vượt `max_memory_mb` thì đóng và thay context mới.
+- Có thể chặn sẵn ảnh/media ở mức context (`block_resources`).
+
+Dùng:
+    pool = BrowserPool(browser, size=4, storage_state_path="booking_state.json",
+                       warmup=warm_booking, context_options={"locale": "vi-VN"})
+    await pool.start()
+    async with pool.page() as page:      # page chính của 1 context trong pool
+        await page.goto(url)
+    async with pool.context() as ctx:    # hoặc mượn cả context để tự mở tab
+        tab = await ctx.new_page()
+    await pool.close()
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+BLOCK_IMAGES = "**/*.{png,jpg,jpeg,gif,webp,svg}"
+
+JS_HEAP_USED = "() => (performance.memory ? performance.memory.usedJSHeapSize : 0)"
+
+
+class PooledContext:
+    """1 context trong pool + bộ đếm điều hướng và page chính (tạo khi cần)."""
+
+    def __init__(self, context, index):
+        self.context = context
+        self.index = index
+        self.navigations = 0
+        self.created_at = time.monotonic()
+        self._page = None
+        context.on("page", self._track_page)
+        for page in context.pages:
+            self._track_page(page)
+
+    def _track_page(self, page):
+        def on_nav(frame):
+            if frame == page.main_frame:
+                self.navigations += 1
+        page.on("framenavigated", on_nav)
+
+    async def page(self):
+        if self._page is None or self._page.is_closed():
+            self._page = await self.context.new_page()
+        return self._page
+
+    async def memory_mb(self):
+        total = 0
+        for page in self.context.pages:
+            try:
+                total += await page.evaluate(JS_HEAP_USED) or 0
+            except Exception:
+                pass
+        return total / (1024 * 1024)
+
+
+class BrowserPool:
+    def __init__(self, browser, size=4, storage_state_path=None, warmup=None,
+                 max_navigations=50, max_memory_mb=None, context_options=None,
+                 block_resources=None):
+        """
+        browser: Browser Playwright đã launch
+        size: số context giữ sẵn
+        storage_state_path: file JSON lưu cookie/localStorage giữa các lần chạy
+        warmup: async fn(page) chạy 1 lần khi chưa có storage_state (tắt consent...)
+        max_navigations / max_memory_mb: ngưỡng thay context
+        block_resources: list pattern route bị abort ở mức context
+        """
+        self.browser = browser
+        self.size = size
+        self.storage_state_path = storage_state_path
+        self.warmup = warmup
+        self.max_navigations = max_navigations
+        self.max_memory_mb = max_memory_mb
+        self.context_options = context_options or {}
+        self.block_resources = block_resources or []
+        self._idle = asyncio.Queue()
+        self._all = set()
+        self._created = 0
+        self.recycled = 0
+
+    async def start(self):
+        if self.storage_state_path and os.path.dirname(self.storage_state_path):
+            os.makedirs(os.path.dirname(self.storage_state_path), exist_ok=True)
+        if self.storage_state_path and not os.path.exists(self.storage_state_path) and self.warmup:
+            await self._warm_up()
+        for _ in range(self.size):
+            self._idle.put_nowait(await self._new_context())
+        return self
+
+    async def _warm_up(self):
+        print(f" [pool] Chưa có {self.storage_state_path} -> chạy warmup để lưu trạng thái...")
+        context = await self.browser.new_context(**self.context_options)
+        try:
+            page = await context.new_page()
+            await self.warmup(page)
+            await context.storage_state(path=self.storage_state_path)
+        except Exception as e:
+            print(f" [pool] Warmup lỗi: {e}")
+        finally:
+            await context.close()
+
+    async def _new_context(self):
+        options = dict(self.context_options)
+        if self.storage_state_path and os.path.exists(self.storage_state_path):
+            options["storage_state"] = self.storage_state_path
+        context = await self.browser.new_context(**options)
+        for pattern in self.block_resources:
+            await context.route(pattern, lambda route: route.abort())
+        self._created += 1
+        pooled = PooledContext(context, self._created)
+        self._all.add(pooled)
+        return pooled
+
+    async def _needs_recycle(self, pooled):
+        if pooled.navigations >= self.max_navigations:
+            return f"{pooled.navigations} lần điều hướng"
+        if self.max_memory_mb:
+            mem = await pooled.memory_mb()
+            if mem >= self.max_memory_mb:
+                return f"JS heap {mem:.0f} MB"
+        return None
+
+    async def _recycle(self, pooled, reason):
+        print(f" [pool] Thay context #{pooled.index} ({reason}).")
+        self._all.discard(pooled)
+        try:
+            # Lưu lại cookie mới nhất trước khi đóng
+            if self.storage_state_path:
+                await pooled.context.storage_state(path=self.storage_state_path)
+            await pooled.context.close()
+        except Exception:
+            pass
+        self.recycled += 1
+        return await self._new_context()
+
+    async def acquire(self):
+        return await self._idle.get()
+
+    async def refresh(self, pooled, force_reason=None):
+        """
+        Thay context nếu quá ngưỡng (hoặc bị ép bởi force_reason); dùng cho worker giữ context lâu dài.
+        Thay lỗi giữa chừng (context đã đóng, lưu storage_state lỗi...) thì bỏ context cũ, tạo context mới.
+        """
+        try:
+            reason = force_reason or await self._needs_recycle(pooled)
+            if reason:
+                pooled = await self._recycle(pooled, reason)
+            return pooled
+        except Exception as e:
+            print(f" [pool] Làm mới context #{pooled.index} lỗi: {e} -> tạo context mới")
+            self._all.discard(pooled)
+            try:
+                await pooled.context.close()
+            except Exception:
+                pass
+            return await self._new_context()
+
+    async def release(self, pooled):
+        """Luôn trả 1 entry về hàng đợi (kể cả khi không tạo được context mới) để pool không hụt dần."""
+        try:
+            pooled = await self.refresh(pooled)
+        except Exception as e:
+            # Không có context mới: trả lại entry cũ, người mượn sau nhận lỗi ngay thay vì chờ mãi
+            print(f" [pool] Không tạo được context thay cho #{pooled.index}: {e}")
+        self._idle.put_nowait(pooled)
+
+    @asynccontextmanager
+    async def context(self):
+        pooled = await self.acquire()
+        try:
+            yield pooled.context
+        finally:
+            await self.release(pooled)
+
+    @asynccontextmanager
+    async def page(self):
+        pooled = await self.acquire()
+        try:
+            yield await pooled.page()
+        finally:
+            await self.release(pooled)
+
+    async def close(self):
+        for i, pooled in enumerate(list(self._all)):
+            try:
+                if i == 0 and self.storage_state_path:
+                    await pooled.context.storage_state(path=self.storage_state_path)
+                await pooled.context.close()
+            except Exception:
+                pass
+        self._all.clear()
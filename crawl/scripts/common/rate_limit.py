@@ -0,0 +1,223 @@
+"""
+Giới hạn tốc độ thích ứng theo domain + chính sách retry dùng chung cho các crawler.
+
+AdaptiveRateLimiter: mỗi domain 1 token bucket (rate request/giây, burst) và 1 giới hạn
+số việc chạy đồng thời. Kiểu AIMD:
+- response nhanh (dưới target_latency), không lỗi -> tăng rate thêm `increase`,
+  đủ `grow_after` lần thành công liên tiếp thì tăng giới hạn đồng thời thêm 1;
+- timeout / HTTP 429 / 503 -> nhân rate với `backoff`, giảm nửa giới hạn đồng thời.
+
+RetryPolicy: thử lại với exponential backoff có jitter (full jitter), mỗi lần thử đều
+xin token từ limiter và báo kết quả lại cho limiter.
+
+    LIMITER = AdaptiveRateLimiter(rate=0.5, max_rate=3)
+    RETRY = RetryPolicy(max_attempts=4)
+    response = await RETRY.run(url, lambda: page.goto(url, timeout=60000), LIMITER)
+    html = RETRY.run_sync(url, lambda: driver.get(url), LIMITER)   # bản đồng bộ (Selenium, sync Playwright)
+"""
+import asyncio
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+THROTTLE_STATUSES = (429, 503)
+
+
+class ThrottledError(Exception):
+    """Server trả 429/503: coi như tín hiệu chậm lại và được retry."""
+    def __init__(self, status, url=""):
+        super().__init__(f"HTTP {status} {url}")
+        self.status = status
+
+
+def _domain(url):
+    return urlparse(url).netloc or url
+
+
+def is_timeout(error):
+    # Playwright TimeoutError, asyncio.TimeoutError, Selenium TimeoutException...
+    return error is not None and "Timeout" in type(error).__name__
+
+
+class _DomainState:
+    def __init__(self, rate, concurrency):
+        self.rate = rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.limit = concurrency
+        self.in_flight = 0
+        self.streak = 0
+        self.requests = 0
+        self.throttled = 0
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, rate=0.5, min_rate=0.1, max_rate=5.0, burst=1.0,
+                 concurrency=2, max_concurrency=8, target_latency=5.0,
+                 increase=0.05, backoff=0.5, grow_after=20, telemetry=None):
+        self.initial_rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.initial_concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.increase = increase
+        self.backoff = backoff
+        self.grow_after = grow_after
+        self.telemetry = telemetry
+        self._domains = {}
+        self._lock = threading.Lock()
+
+    def _state(self, domain):
+        state = self._domains.get(domain)
+        if state is None:
+            state = self._domains[domain] = _DomainState(self.initial_rate, self.initial_concurrency)
+        return state
+
+    def _reserve(self, url):
+        """Lấy 1 token (cho phép âm = đặt chỗ trước), trả về số giây phải chờ."""
+        with self._lock:
+            state = self._state(_domain(url))
+            now = time.monotonic()
+            state.tokens = min(self.burst, state.tokens + (now - state.updated) * state.rate)
+            state.updated = now
+            state.tokens -= 1
+            state.requests += 1
+            return 0.0 if state.tokens >= 0 else -state.tokens / state.rate
+
+    async def acquire(self, url):
+        delay = self._reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self, url):
+        delay = self._reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    @asynccontextmanager
+    async def slot(self, url):
+        """Giữ 1 chỗ trong giới hạn chạy đồng thời (thích ứng) của domain."""
+        domain = _domain(url)
+        while True:
+            with self._lock:
+                state = self._state(domain)
+                if state.in_flight < state.limit:
+                    state.in_flight += 1
+                    break
+            await asyncio.sleep(0.2)
+        try:
+            yield
+        finally:
+            with self._lock:
+                state.in_flight -= 1
+
+    def record(self, url, latency=None, status=None, error=None):
+        """Báo kết quả 1 request để chỉnh rate / giới hạn đồng thời."""
+        domain = _domain(url)
+        throttled = status in THROTTLE_STATUSES or isinstance(error, ThrottledError) or is_timeout(error)
+        with self._lock:
+            state = self._state(domain)
+            if throttled:
+                state.throttled += 1
+                state.streak = 0
+                state.rate = max(self.min_rate, state.rate * self.backoff)
+                state.limit = max(1, state.limit // 2)
+            elif error is None and (latency is None or latency <= self.target_latency):
+                state.streak += 1
+                state.rate = min(self.max_rate, state.rate + self.increase)
+                if state.streak >= self.grow_after and state.limit < self.max_concurrency:
+                    state.limit += 1
+                    state.streak = 0
+            else:
+                # chậm hoặc lỗi khác: giữ nguyên rate, không tính vào chuỗi thành công
+                state.streak = 0
+        if self.telemetry and is_timeout(error):
+            self.telemetry.inc("timeouts_total", url)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                domain: {"rate": round(s.rate, 3), "concurrency": s.limit,
+                         "requests": s.requests, "throttled": s.throttled}
+                for domain, s in self._domains.items()
+            }
+
+    def print_report(self):
+        for domain, s in self.snapshot().items():
+            print(f" [limiter] {domain}: {s['rate']} req/s | đồng thời {s['concurrency']} | "
+                  f"{s['requests']} request, {s['throttled']} lần bị chặn/timeout")
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=30.0,
+                 retry_on=(Exception,), telemetry=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+        self.telemetry = telemetry
+
+    def backoff(self, attempt):
+        """Full jitter: ngẫu nhiên trong [0, min(max_delay, base * 2^attempt)]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    @staticmethod
+    def _check(url, result):
+        status = getattr(result, "status", None)
+        if isinstance(status, int) and status in THROTTLE_STATUSES:
+            raise ThrottledError(status, url)
+        return status
+
+    def _on_failure(self, url, attempt, error):
+        if attempt + 1 >= self.max_attempts or not isinstance(error, self.retry_on):
+            return None
+        if self.telemetry:
+            self.telemetry.inc("retries_total", url)
+        delay = self.backoff(attempt)
+        print(f"      ↻ Thử lại lần {attempt + 1}/{self.max_attempts - 1} sau {delay:.1f}s ({type(error).__name__})")
+        return delay
+
+    async def run(self, url, fn, limiter=None):
+        """fn: hàm không tham số trả về awaitable (vd lambda: page.goto(url))."""
+        for attempt in range(self.max_attempts):
+            if limiter:
+                await limiter.acquire(url)
+            t0 = time.monotonic()
+            try:
+                result = await fn()
+                status = self._check(url, result)
+            except Exception as e:
+                if limiter:
+                    limiter.record(url, time.monotonic() - t0, error=e)
+                delay = self._on_failure(url, attempt, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            if limiter:
+                limiter.record(url, time.monotonic() - t0, status=status)
+            return result
+
+    def run_sync(self, url, fn, limiter=None):
+        for attempt in range(self.max_attempts):
+            if limiter:
+                limiter.acquire_sync(url)
+            t0 = time.monotonic()
+            try:
+                result = fn()
+                status = self._check(url, result)
+            except Exception as e:
+                if limiter:
+                    limiter.record(url, time.monotonic() - t0, error=e)
+                delay = self._on_failure(url, attempt, e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            if limiter:
+                limiter.record(url, time.monotonic() - t0, status=status)
+            return result
@@ -0,0 +1,658 @@
+"""
+Trích xuất lại dữ liệu từ kho snapshot HTML (snapshot_archive.py) mà không cần cào lại.
+
+Mỗi (source, kind) có 1 parser lxml riêng, chạy song song trong process pool.
+Khi selector đổi hoặc cần thêm trường: sửa parser tương ứng rồi chạy lại.
+Parser Booking / iVIVU theo đúng quy tắc của JS trích xuất lúc cào (EXTRACT_CARDS_JS, EXTRACT_ROOMS_JS,
+PRICES_JS + EXTRACT_ROOMS_BULK_JS). Giới hạn: snapshot chụp trước khi mở modal, nên dữ liệu chỉ có
+trong modal (phòng không có nguồn nhúng nào) không trích lại được -- xem area_source / detail_source.
+
+    python reextract.py ARCHIVE_DIR --source booking --kind search_cards --out booking_cards.csv
+    python reextract.py ARCHIVE_DIR --source booking --kind hotel --out booking_rooms.csv --workers 8
+    python reextract.py ARCHIVE_DIR --source ivivu --kind hotel --out ivivu_rooms.csv
+    python reextract.py ARCHIVE_DIR --source mytour --kind hotel --out mytour_hotels.csv
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urljoin
+
+from lxml import html as lxml_html
+
+from snapshot_archive import iter_index, read_snapshot
+
+NUM_RE = re.compile(r"\d+")
+SCORE_RE = re.compile(r"(\d+(?:\.\d+)?)")
+BASE_FIELDS = ["snapshot_digest", "url"]
+
+
+def _text(el):
+    return " ".join(" ".join(el.itertext()).split()) if el is not None else ""
+
+
+def _first(node, *xpaths, **variables):
+    """Phần tử đầu tiên khớp xpath nào trước (thử lần lượt)."""
+    for xpath in xpaths:
+        found = node.xpath(xpath, **variables)
+        if found:
+            return found[0]
+    return None
+
+
+def _testid(tag, testid):
+    return f".//{tag}[@data-testid='{testid}']"
+
+
+def _cls(name):
+    """Điều kiện xpath tương đương selector CSS .name (khớp nguyên 1 class)."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _js_str(value):
+    """String(value) của JS cho giá trị đọc từ JSON."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "null"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, list):
+        return ",".join("" if v is None else _js_str(v) for v in value)
+    if isinstance(value, dict):
+        return "[object Object]"
+    return str(value)
+
+
+def _js_values(obj):
+    """Object.values của JS: khóa dạng số nguyên đứng trước theo thứ tự tăng dần, rồi tới các khóa khác."""
+    index = sorted((k for k in obj if k.isdigit() and (k == "0" or not k.startswith("0"))), key=int)
+    return [obj[k] for k in index] + [v for k, v in obj.items() if k not in set(index)]
+
+
+def _number(text):
+    digits = "".join(NUM_RE.findall(text or ""))
+    return int(digits) if digits else 0
+
+
+def _score(text):
+    m = SCORE_RE.search((text or "").replace(",", "."))
+    return m.group(1) if m else "N/A"
+
+
+def _text_content(el):
+    """Như textContent: nối mọi text con, kể cả text bị ẩn, không chuẩn hóa khoảng trắng."""
+    return "".join(el.itertext()) if el is not None else ""
+
+
+BLOCK_TAGS = {"div", "p", "li", "ul", "ol", "tr", "table", "section", "h1", "h2", "h3", "h4", "h5", "h6", "br"}
+
+
+def _lines(el):
+    """Xấp xỉ các dòng của innerText: xuống dòng ở ranh giới thẻ khối, gộp khoảng trắng trong dòng."""
+    parts = []
+
+    def walk(node):
+        block = node.tag in BLOCK_TAGS
+        if block:
+            parts.append("\n")
+        parts.append(node.text or "")
+        for child in node:
+            if isinstance(child.tag, str) and child.tag not in ("script", "style"):
+                walk(child)
+            parts.append(child.tail or "")
+        if block:
+            parts.append("\n")
+
+    if el is not None:
+        walk(el)
+    return [" ".join(line.split()) for line in "".join(parts).split("\n") if line.strip()]
+
+
+def _inner_text(el):
+    """innerText gộp về 1 dòng: không chèn khoảng trắng giữa các thẻ inline như itertext."""
+    return " ".join(_lines(el))
+
+
+def _js_score(text):
+    """Như JS: chỉ thay dấu phẩy đầu tiên rồi lấy số đầu tiên."""
+    m = SCORE_RE.search((text or "").strip().replace(",", ".", 1))
+    return m.group(1) if m else None
+
+
+def _prev_element(el):
+    """Như previousElementSibling: bỏ qua comment/processing instruction."""
+    sib = el.getprevious()
+    while sib is not None and not isinstance(sib.tag, str):
+        sib = sib.getprevious()
+    return sib
+
+
+# ================= BOOKING: THẺ KẾT QUẢ TÌM KIẾM =================
+# Phải cho cùng kết quả với EXTRACT_CARDS_JS (booking_scraper.py) trên cùng 1 thẻ:
+# sửa quy tắc bên này thì sửa cả bên kia (booking/test_card_extractors.py so sánh hai bên).
+BOOKING_CARD_FIELDS = [
+    "search_location", "scenario", "check_in",
+    "Hotel Name", "Hotel Link", "Stars", "Final Price", "Original Price",
+    "Rating Score", "Review Count", "Location Score", "Address", "Distance",
+    "Room Type", "Bed Type", "Free Cancellation", "Breakfast Included", "Badge Deal",
+]
+CANCEL_KEYS = ("free cancellation", "miễn phí hủy", "hủy miễn phí")
+BREAKFAST_KEYS = ("breakfast included", "bao gồm bữa sáng", "bữa sáng miễn phí", "ăn sáng miễn phí")
+REVIEW_SCORE = _testid("*", "review-score")
+
+
+def _card_stars(card):
+    stars = 0
+    star_box = _first(card, _testid("div", "rating-stars"), _testid("div", "rating-squares"))
+    if star_box is not None:
+        m = re.match(r"^(\d+)", star_box.get("aria-label") or "")
+        if m:
+            stars = int(m.group(1))
+        if stars == 0:
+            # JS chia đôi số svg, có thể ra số lẻ (3 svg -> 1.5)
+            n = len(star_box.xpath(".//svg"))
+            stars = n // 2 if n % 2 == 0 else n / 2
+    if stars == 0:
+        rating_div = _first(card, ".//div[contains(@aria-label,'sao') or contains(@aria-label,'star')]")
+        if rating_div is not None:
+            m = re.search(r"(\d+)", rating_div.get("aria-label"))
+            if m:
+                stars = int(m.group(1))
+    return stars if stars > 0 else "N/A"
+
+
+def _card_prices(card):
+    """(giá cuối, giá gốc) theo đúng thứ tự ưu tiên của EXTRACT_CARDS_JS."""
+    original = final = 0
+
+    # 1. Text ẩn "Original price ... Current price ..." (đọc textContent)
+    card_text = _text_content(card)
+    if "Original price" in card_text and "Current price" in card_text:
+        for div in card.iterdescendants("div"):
+            t = _text_content(div)
+            if "Original price" in t and "Current price" in t:
+                nums = [_number(m) for m in re.findall(r"[\d,.]+", t)]
+                if len(nums) >= 2:
+                    original, final = max(nums), min(nums)
+                break
+
+    # 2. Theo vị trí DOM: span ngay trước div chứa giá cuối, rồi span aria-hidden đầu tiên lớn hơn
+    if original == 0 or original == final:
+        final_el = _first(card, _testid("*", "price-and-discounted-price"))
+        if final_el is not None:
+            current = _number(_inner_text(final_el))
+            final = current
+            parent = _first(final_el, "ancestor-or-self::div[1]")
+            sibling = _prev_element(parent) if parent is not None else None
+            if sibling is not None and sibling.tag == "span":
+                val = _number(_inner_text(sibling))
+                if val > current:
+                    original = val
+            if original == 0:
+                for span in card.xpath(".//span[@aria-hidden='true']"):
+                    val = _number(_inner_text(span))
+                    if val > current:
+                        original = val
+                        break
+
+    if original == 0 or original < final:
+        original = final
+    return final, original
+
+
+def _card_location(card):
+    el = _first(card, _testid("*", "secondary-review-score-link"))
+    if el is None and any(k in _text_content(card) for k in ("Location", "Địa điểm")):
+        el = next((e for e in card.iterdescendants("span", "div")
+                   if ("Location" in _inner_text(e) or "Địa điểm" in _inner_text(e)) and re.search(r"\d+[.,]\d+", _inner_text(e))),
+                  None)
+    score = _js_score(_inner_text(el)) if el is not None else None
+    return score if score is not None and float(score) <= 10 else "N/A"
+
+
+def _card_breakfast(card):
+    # Giống JS: span/li/div bất kỳ có textContent chứa cụm bữa sáng; lọc trước bằng text cả thẻ
+    if any(k in _text_content(card).lower() for k in BREAKFAST_KEYS):
+        for el in card.iterdescendants("span", "li", "div"):
+            t = _text_content(el).lower()
+            if any(k in t for k in BREAKFAST_KEYS):
+                return "Yes"
+    units = _first(card, _testid("*", "recommended-units"))
+    if units is not None:
+        u_text = _inner_text(units).lower()
+        if "breakfast" in u_text or "bữa sáng" in u_text:
+            return "Yes"
+    return "No"
+
+
+def parse_booking_cards(doc, entry):
+    meta = entry.get("meta", {})
+    rows = []
+    for card in doc.xpath("//div[@data-testid='property-card']"):
+        info = {k: meta.get(k, "") for k in ("search_location", "scenario", "check_in")}
+        title = _first(card, _testid("div", "title"))
+        info["Hotel Name"] = _inner_text(title) if title is not None else "N/A"
+        link = _first(card, _testid("a", "title-link"))
+        info["Hotel Link"] = urljoin(entry.get("url") or "", link.get("href") or "") if link is not None else "N/A"
+        info["Stars"] = _card_stars(card)
+        info["Final Price"], info["Original Price"] = _card_prices(card)
+
+        score_el = _first(card, REVIEW_SCORE + "//div[@aria-hidden='true']",
+                          REVIEW_SCORE + "//div[not(preceding-sibling::*)]",
+                          f".//*[{_cls('ac4a7896c7')}]")
+        score = _js_score(_inner_text(score_el)) if score_el is not None else None
+        info["Rating Score"] = score if score is not None else "N/A"
+        review_el = _first(card, REVIEW_SCORE + "//div[not(following-sibling::*)]", REVIEW_SCORE)
+        m = re.search(r"(\d+)\s*(reviews|đánh giá)", _inner_text(review_el).replace(".", ""), re.IGNORECASE)
+        info["Review Count"] = m.group(1) if m else "N/A"
+        info["Location Score"] = _card_location(card)
+
+        for field, xpath in (("Address", _testid("span", "address")), ("Distance", _testid("span", "distance"))):
+            el = _first(card, xpath)
+            info[field] = _inner_text(el) if el is not None else "N/A"
+        room_el = _first(card, ".//h4[@role='link']", ".//h4")
+        info["Room Type"] = _inner_text(room_el) if room_el is not None else "N/A"
+
+        units = _first(card, _testid("div", "recommended-units"))
+        info["Bed Type"] = next((line for line in _lines(units)
+                                 if "bed" in line.lower() or "giường" in line.lower()), "N/A")
+
+        card_text = _inner_text(card).lower()
+        info["Free Cancellation"] = "Yes" if any(k in card_text for k in CANCEL_KEYS) else "No"
+        info["Breakfast Included"] = _card_breakfast(card)
+        badge = _first(card, _testid("*", "property-card-deal"))
+        if badge is None:
+            badge = _first(card, _testid("*", "badge"))
+        info["Badge Deal"] = _inner_text(badge) if badge is not None else "None"
+        rows.append(info)
+    return rows
+
+
+# ================= BOOKING: BẢNG PHÒNG TRANG KHÁCH SẠN =================
+# Cùng quy tắc với EXTRACT_ROOMS_JS (booking/details_scraper.py): mỗi loại phòng trong meta room_types
+# của snapshot -> dòng bảng giá đầu tiên khớp tên, diện tích lấy từ dòng, rồi JSON <script>, rồi khối ẩn.
+# Modal không có trong snapshot (chụp trước khi click): loại phòng lúc cào phải mở modal thì
+# area_m2 = "N/A", area_source = "modal". Loại không khớp dòng nào bị bỏ như lúc cào.
+BOOKING_ROOM_FIELDS = ["room_type", "area_m2", "facilities", "area_source"]
+BOOKING_ROOM_VARS = ("b_rooms_available_and_soldout", "b_rooms", "rooms_data")
+BOOKING_AREA_RE = re.compile(r"([0-9]+(?:[.,][0-9]+)?)\s*(m²|m2)", re.IGNORECASE)
+
+
+def _clean(text):
+    return " ".join(text.lower().split()) if text else ""
+
+
+def _area_of(text):
+    m = BOOKING_AREA_RE.search(text or "")
+    # Math.round của JS: .5 làm tròn lên
+    return f"{math.floor(float(m.group(1).replace(',', '.', 1)) + 0.5)} m²" if m else None
+
+
+def _slice_array(src, start_from):
+    """Cắt mảng JSON đầu tiên từ vị trí start_from bằng cách đếm ngoặc (bỏ qua ngoặc trong chuỗi)."""
+    start = src.find("[", start_from)
+    if start < 0:
+        return None
+    depth, in_str, esc = 0, None, False
+    for j in range(start, len(src)):
+        c = src[j]
+        if in_str:
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == in_str:
+                in_str = None
+        elif c in ('"', "'"):
+            in_str = c
+        elif c == "[":
+            depth += 1
+        elif c == "]":
+            depth -= 1
+            if depth == 0:
+                return src[start:j + 1]
+    return None
+
+
+def _booking_script_rooms(doc):
+    """{room id: {area, facilities, name}} từ JSON phòng trong <script> inline."""
+    rooms = {}
+    for script in doc.xpath("//script[not(@src)]"):
+        src = _text_content(script)
+        for var in BOOKING_ROOM_VARS:
+            at = src.find(var)
+            if at < 0:
+                continue
+            chunk = _slice_array(src, at + len(var))
+            if not chunk:
+                continue
+            try:
+                data = json.loads(chunk)
+            except ValueError:
+                continue
+            for r in data:
+                if not isinstance(r, dict):
+                    continue
+                room_id = next((r[k] for k in ("b_id", "b_room_id", "room_id", "id") if r.get(k) is not None), None)
+                if room_id is None:
+                    continue
+                area, facs = None, []
+                for k, v in r.items():
+                    if not area and re.search(r"surface|room_size|size_in|area", k, re.IGNORECASE) \
+                            and v is not None and not isinstance(v, (dict, list)):
+                        v = _js_str(v)
+                        area = _area_of(v + ("" if re.search(r"m2|m²", v, re.IGNORECASE) else " m²"))
+                    if re.search(r"facilit|amenit", k, re.IGNORECASE) and isinstance(v, list):
+                        for f in v:
+                            t = f if isinstance(f, str) else (
+                                (f.get("name") or f.get("b_name") or f.get("title")) if isinstance(f, dict) else None)
+                            if t:
+                                facs.append(_js_str(t).strip())
+                rooms[_js_str(room_id)] = {"area": area, "facilities": facs,
+                                           "name": _clean(_js_str(r.get("b_name") or r.get("name") or ""))}
+    return rooms
+
+
+def _booking_hidden_room(doc, room_id):
+    """Khối mô tả phòng ẩn theo room id (modal chỉ hiển thị lại khối này)."""
+    box = _first(doc, "//*[@id=$a]", "//*[@id=$b]",
+                 f"//*[(@data-room-id=$c and {_cls('hprt-lightbox')})"
+                 f" or ({_cls('rt-lightbox-content')} and ancestor::*[@data-room-id=$c])]",
+                 a=f"blocktoggleRD{room_id}", b=f"RD{room_id}", c=room_id)
+    if box is None:
+        return None
+    size_el = _first(box, f".//*[@data-testid='rp-room-size' or {_cls('hprt-lightbox-room-size')}]")
+    area = _area_of(_text_content(size_el if size_el is not None else box))
+    facs = []
+    for el in box.xpath(f".//*[{_cls('hprt-facilities-facility')} or @data-testid='rp-facility']"
+                        f" | .//*[{_cls('hprt-lightbox-list')} or {_cls('hprt-facilities-others')}]//li"):
+        t = " ".join(_text_content(el).split())
+        if t and not _area_of(t):
+            facs.append(t)
+    return {"area": area, "facilities": facs}
+
+
+def parse_booking_rooms(doc, entry):
+    script_rooms = _booking_script_rooms(doc)
+    named = []
+    for tr in doc.xpath("//*[@id='hprt-table']//tbody//tr"):
+        name_el = _first(tr, f".//*[{_cls('hprt-table-cell-roomtype')}]//*[{_cls('hprt-roomtype-icon-link')}]")
+        if name_el is None:
+            continue
+        ids = []
+        if name_el.get("data-room-id"):
+            ids.append(name_el.get("data-room-id"))
+        m = re.search(r"RD([0-9]+)", name_el.get("href") or "")
+        if m:
+            ids.append(m.group(1))
+        if tr.get("data-block-id"):
+            ids.append(tr.get("data-block-id").split("_")[0])
+        named.append({"row": tr, "name": _clean(_inner_text(name_el)), "raw": _inner_text(name_el), "ids": ids})
+
+    # Snapshot cũ không lưu room_types -> coi mỗi dòng có tên là 1 loại phòng
+    targets = entry.get("meta", {}).get("room_types") or [r["raw"] for r in named]
+    rows = []
+    for target in targets:
+        t_name = _clean(target)
+        hit = next((r for r in named if t_name in r["name"] or r["name"] in t_name), None)
+        if hit is None:
+            continue
+        row = hit["row"]
+        source = None
+        size_el = _first(row, ".//*[@data-testid='rp-room-size']")
+        area = _area_of(_inner_text(size_el)) if size_el is not None else None
+        if area:
+            source = "row"
+        facs = [t for t in (_inner_text(el) for el in row.xpath(f".//*[{_cls('hprt-facilities-facility')}]"))
+                if t and "m²" not in t and "m2" not in t]
+        facs += [t for t in (_inner_text(li) for li in row.xpath(f".//*[{_cls('hprt-facilities-others')}]//li")) if t]
+
+        script_hit = next((script_rooms[i] for i in hit["ids"] if script_rooms.get(i)), None) or next(
+            (r for r in _js_values(script_rooms) if r["name"] and r["name"] == hit["name"]), None)
+        if not area and script_hit and script_hit["area"]:
+            area, source = script_hit["area"], "script"
+        if not facs and script_hit:
+            facs = script_hit["facilities"]
+        if not area or not facs:
+            box = next((b for b in (_booking_hidden_room(doc, i) for i in hit["ids"])
+                        if b and (b["area"] or b["facilities"])), None)
+            if box:
+                if not area and box["area"]:
+                    area, source = box["area"], "hidden"
+                if not facs:
+                    facs = box["facilities"]
+
+        rows.append({
+            "room_type": target,
+            "area_m2": area or "N/A",
+            "facilities": ", ".join(facs) if area or facs else "N/A",
+            "area_source": source or "modal",
+        })
+    return rows
+
+
+# ================= IVIVU: KHỐI PHÒNG TRANG KHÁCH SẠN =================
+# Cùng quy tắc với PRICES_JS + EXTRACT_ROOMS_BULK_JS (ivivu/getDetailHotels.py): giá trung bình OTA
+# (không có thì TA), chi tiết từ dữ liệu phòng nhúng ghép theo id khối rồi theo tên. Khối không giá
+# bị bỏ như lúc cào. Modal không có trong snapshot: khối lúc cào phải mở modal thì các cột chi tiết
+# để trống, detail_source = "". room_id do writer cấp theo thứ tự lúc cào -> thay bằng room_block.
+IVIVU_ROOM_FIELDS = ["hotel_id", "room_block", "room_name", "price",
+                     "area_m2", "bed_type", "max_occupancy", "view", "amenities", "detail_source"]
+# Giống NO_ROOM_TEXT của getDetailHotels.py
+IVIVU_NO_ROOM_TEXT = "Rất tiếc, iVIVU không còn phòng"
+IVIVU_ROOMISH = re.compile(r"area|size|bed|occup|adult|view|facilit|amenit", re.IGNORECASE)
+IVIVU_ID_KEYS = ("id", "roomId", "RoomId", "room_id", "roomClassId", "RoomClassId")
+
+
+def _norm_name(text):
+    """Tên để so khớp: bỏ dấu, bỏ ký tự không phải chữ/số (như norm() trong JS)."""
+    t = unicodedata.normalize("NFD", _clean(_js_str(text) if text else ""))
+    t = re.sub(r"[\u0300-\u036f]", "", t).replace("đ", "d")
+    return re.sub(r"[^a-z0-9]+", " ", t).strip()
+
+
+def _ivivu_embedded(doc):
+    """Các object phòng (có khóa tên + khóa kiểu diện tích/giường/...) trong JSON nhúng của trang."""
+    found = []
+
+    def walk(node, depth):
+        if depth > 15:
+            return
+        if isinstance(node, list):
+            for n in node:
+                walk(n, depth + 1)
+            return
+        if not isinstance(node, dict):
+            return
+        name_key = next((k for k in node if re.fullmatch(r"room_?name|name|title", k, re.IGNORECASE)), None)
+        if name_key and isinstance(node[name_key], str) and any(IVIVU_ROOMISH.search(k) for k in node):
+            found.append({"obj": node, "name": _norm_name(node[name_key])})
+        for v in node.values():
+            walk(v, depth + 1)
+
+    for script in doc.xpath("//script[@id='__NEXT_DATA__' or @type='application/json'"
+                            " or @id='serverApp-state' or @id='ng-state']"):
+        t = _text_content(script)
+        # Angular transfer state mã hóa ký tự đặc biệt: &q; &a; &s; &l; &g;
+        if "&q;" in t:
+            t = t.replace("&q;", '"').replace("&s;", "'").replace("&l;", "<").replace("&g;", ">").replace("&a;", "&")
+        try:
+            walk(json.loads(t), 0)
+        except ValueError:
+            pass
+    return found
+
+
+def _pick(obj, pattern):
+    return next((v for k, v in obj.items() if re.search(pattern, k, re.IGNORECASE) and v is not None and v != ""), None)
+
+
+def _names(value):
+    items = value if isinstance(value, list) else [value]
+    items = [(x.get("name") or x.get("title") or x.get("Name") or "") if isinstance(x, dict)
+             else ("" if isinstance(x, list) else x) for x in items]
+    return [t for t in (_js_str(x).strip() if x else "" for x in items) if t]
+
+
+def _from_facilities(items):
+    area = view = bed = ""
+    for text in items:
+        t = text.lower()
+        if "m²" in t:
+            area = text
+        if "hướng" in t:
+            view = text
+        if "giường" in t:
+            bed = text
+    return {"area": area, "view": view, "bed": bed, "amenities": "; ".join(items)}
+
+
+def _from_embedded(obj):
+    f = _from_facilities(_names(_pick(obj, r"facilit|amenit|tien_?ich") or []))
+    area = _pick(obj, r"^(?!.*bed).*(area|size|surface|dien_?tich)")
+    if area is not None and not isinstance(area, (dict, list)):
+        area = _js_str(area) if re.search(r"m²|m2", _js_str(area), re.IGNORECASE) else f"{_js_str(area)} m²"
+    else:
+        area = f["area"]
+    bed = _pick(obj, r"bed")
+    occ = _pick(obj, r"max.*(occup|adult|person|guest|pax)|occupancy")
+    m = re.search(r"[0-9]+", _js_str(occ)) if occ is not None else None
+    view = _pick(obj, r"view|huong")
+    return {
+        "area_m2": area or "",
+        "bed_type": _js_str(bed) if bed is not None and not isinstance(bed, (dict, list))
+        else (", ".join(_names(bed or [])) or f["bed"]),
+        "max_occupancy": m.group(0) if m else "",
+        "view": _js_str(view) if view is not None and not isinstance(view, (dict, list)) else f["view"],
+        "amenities": f["amenities"],
+        "detail_source": "embedded",
+    }
+
+
+def _ivivu_price(block):
+    """Giá trung bình (làm tròn xuống) của khối: OTA nếu có phần tử OTA, không thì TA; None = không giá."""
+    els = block.xpath(f".//*[{_cls('rcct__price--ota-text')}]") or block.xpath(f".//*[{_cls('rcct__price--ta-text')}]")
+    prices = [int(t) for t in (_inner_text(el).replace(".", "").strip() for el in els) if re.fullmatch(r"[0-9]+", t)]
+    return sum(prices) // len(prices) if prices else None
+
+
+def parse_ivivu_rooms(doc, entry):
+    body = _first(doc, "//body")
+    if IVIVU_NO_ROOM_TEXT.lower() in _inner_text(body if body is not None else doc).lower():
+        return []
+    embedded = _ivivu_embedded(doc)
+    rows = []
+    for block in doc.xpath("//div[starts-with(@id,'room-class-')]"):
+        price = _ivivu_price(block)
+        if price is None:
+            continue
+        block_key = block.get("id").replace("room-class-", "", 1)
+        name_el = _first(block, f".//*[contains(@class,'room-name') or contains(@class,'room-title')"
+                                f" or self::h2 or self::h3]")
+        hit = next((e for e in embedded if any(e["obj"].get(k) is not None and _js_str(e["obj"][k]) == block_key
+                                               for k in IVIVU_ID_KEYS)), None)
+        block_name = _norm_name(_text_content(name_el)) if name_el is not None else ""
+        if hit is None and block_name:
+            hit = next((e for e in embedded if e["name"] == block_name), None)
+            if hit is None:
+                # Tên trong trang thường thêm/bớt tiền tố -> chỉ nhận khi đúng 1 ứng viên chứa nhau
+                partial = [e for e in embedded if e["name"] and (block_name in e["name"] or e["name"] in block_name)]
+                hit = partial[0] if len(partial) == 1 else None
+
+        row = {"hotel_id": entry.get("meta", {}).get("hotel_id", ""), "room_block": block.get("id"), "price": price}
+        if hit is not None:
+            row["room_name"] = _text_content(name_el).strip() if name_el is not None else (
+                hit["obj"].get("name") or hit["obj"].get("title"))
+            row.update(_from_embedded(hit["obj"]))
+        else:
+            row["room_name"] = _text_content(name_el).strip() if name_el is not None else ""
+            row.update(dict.fromkeys(["area_m2", "bed_type", "max_occupancy", "view", "amenities", "detail_source"], ""))
+        rows.append(row)
+    return rows
+
+
+# ================= MYTOUR: TRANG KHÁCH SẠN (dùng lại extract_* của scrape_hotels.py) =================
+MYTOUR_FIELDS = ["link", "ten", "gia_niem_yet", "discount", "gia_hien_tai",
+                 "dia_chi", "so_luong_danh_gia", "diem_danh_gia", "tien_nghi"]
+
+
+def parse_mytour_hotel(html_text, entry):
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "mytour"))
+    import scrape_hotels as mt
+
+    return [mt.parse_hotel(html_text, entry.get("url", ""))]
+
+
+# (source, kind) -> (parser, fields, nhận HTML thô thay vì cây lxml)
+PARSERS = {
+    ("booking", "search_cards"): (parse_booking_cards, BOOKING_CARD_FIELDS, False),
+    ("booking", "hotel"): (parse_booking_rooms, BOOKING_ROOM_FIELDS, False),
+    ("ivivu", "hotel"): (parse_ivivu_rooms, IVIVU_ROOM_FIELDS, False),
+    ("mytour", "hotel"): (parse_mytour_hotel, MYTOUR_FIELDS, True),
+}
+
+
+def parse_entry(task):
+    """Chạy trong process con: đọc + giải nén + parse 1 snapshot."""
+    root, entry = task
+    parser, _, wants_raw = PARSERS[(entry["source"], entry["kind"])]
+    try:
+        text = read_snapshot(root, entry)
+        rows = parser(text if wants_raw else lxml_html.fromstring(text), entry)
+    except Exception as e:
+        print(f"   ! Lỗi parse {entry['digest'][:12]}: {e}")
+        return []
+    for row in rows:
+        row["snapshot_digest"] = entry["digest"]
+        row["url"] = entry.get("url", "")
+    return rows
+
+
+def reextract(root, source, kind, out_csv, workers=None, limit=None):
+    if (source, kind) not in PARSERS:
+        raise ValueError(f"Chưa có parser cho ({source}, {kind}). Có: {sorted(PARSERS)}")
+    fields = PARSERS[(source, kind)][1] + BASE_FIELDS
+
+    # Bỏ dòng index lặp hoàn toàn (cùng nội dung, url và meta)
+    entries, seen = [], set()
+    for entry in iter_index(root, source, kind):
+        key = (entry["digest"], entry.get("url"), json.dumps(entry.get("meta"), sort_keys=True))
+        if key in seen:
+            continue
+        seen.add(key)
+        entries.append(entry)
+        if limit and len(entries) >= limit:
+            break
+
+    t0 = time.monotonic()
+    n_rows = 0
+    with open(out_csv, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for rows in pool.map(parse_entry, [(root, e) for e in entries], chunksize=32):
+                writer.writerows(rows)
+                n_rows += len(rows)
+    elapsed = time.monotonic() - t0
+    rate = len(entries) / elapsed if elapsed else 0
+    print(f"Đã parse {len(entries)} trang -> {n_rows} dòng trong {elapsed:.1f}s ({rate:.0f} trang/s) -> {out_csv}")
+    return n_rows
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("archive")
+    ap.add_argument("--source", required=True)
+    ap.add_argument("--kind", required=True)
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--limit", type=int, default=None)
+    args = ap.parse_args()
+    reextract(args.archive, args.source, args.kind, args.out, args.workers, args.limit)
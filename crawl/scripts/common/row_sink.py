@@ -0,0 +1,323 @@
+"""
+Ghi dòng ra file (CSV hoặc Parquet phân vùng) từ thread nền, dùng chung cho các crawler.
+
+Coroutine cào chỉ `await sink.put(rows)` (đẩy vào hàng đợi); thread nền gom dòng và
+ghi khi đủ `batch_size` dòng hoặc sau `flush_interval` giây, nên không có thao tác
+file nào chạy trong event loop.
+
+Hai cách bố trí file:
+- CSV 1 file (fmt="csv", không partition, không max_bytes): ghi tiếp vào `path` như cũ.
+- Thư mục (Parquet, hoặc CSV có partition / max_bytes):
+      <path>/<khóa>=<giá trị>/.../part-<run>-<n>.parquet|.csv
+  Segment đang ghi có tên ẩn `.part-...inprogress`; khi vượt `max_bytes` (hoặc close())
+  segment được đóng rồi os.replace sang tên thật, nên người đọc (ghepfile.py,
+  pandas.read_parquet(path)) chỉ thấy file hoàn chỉnh. Partition kiểu Hive nên
+  read_parquet tự thêm lại cột (vd city).
+
+Lô ghi lỗi không dừng thread nền nhưng được đếm (stats()["rows_failed"]) và close() ném
+lại lỗi đầu tiên, nên lượt cào không thể "xong" mà lặng lẽ thiếu dòng.
+
+Parquet cần pyarrow (pip install pyarrow).
+
+    sink = RowSink("ivivu_rooms", ROOM_COLUMNS, fmt="parquet",
+                   partition={"city": "ho-chi-minh"}, max_bytes=64 << 20).start()
+    await sink.put(rows)                 # list dòng (list theo columns hoặc dict)
+    await asyncio.to_thread(sink.close)  # flush hết + đổi tên segment cuối
+    df = read_table("ivivu_rooms")       # đọc lại: file CSV, thư mục CSV hoặc Parquet
+"""
+import asyncio
+import csv
+import glob
+import os
+import queue
+import threading
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+_STOP = object()
+INPROGRESS = ".inprogress"
+
+
+def _arrow_type(kind):
+    return {"int": pa.int64(), "float": pa.float64()}.get(kind, pa.string())
+
+
+class _Segment:
+    """1 file đang ghi trong 1 phân vùng; finalize() đổi tên nguyên tử sang tên thật."""
+    def __init__(self, final_path, fmt, columns, schema):
+        self.final_path = final_path
+        self.tmp_path = os.path.join(os.path.dirname(final_path),
+                                     "." + os.path.basename(final_path) + INPROGRESS)
+        self.fmt = fmt
+        self.rows = 0
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(self.tmp_path, schema, compression="zstd")
+        else:
+            self._file = open(self.tmp_path, "w", encoding="utf-8-sig", newline="")
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(columns)
+
+    def write(self, table_or_rows):
+        if self.fmt == "parquet":
+            self._writer.write_table(table_or_rows)
+            self.rows += table_or_rows.num_rows
+        else:
+            self._csv.writerows(table_or_rows)
+            self._file.flush()
+            self.rows += len(table_or_rows)
+
+    def size(self):
+        return os.path.getsize(self.tmp_path) if os.path.exists(self.tmp_path) else 0
+
+    def finalize(self):
+        if self.fmt == "parquet":
+            self._writer.close()
+        else:
+            self._file.close()
+        os.replace(self.tmp_path, self.final_path)
+        return self.final_path
+
+
+class RowSink:
+    def __init__(self, path, columns, fmt="csv", partition=None, schema=None,
+                 max_bytes=None, batch_size=500, flush_interval=2.0, max_pending=10000,
+                 append=False):
+        """
+        path: file CSV (chế độ 1 file) hoặc thư mục gốc (Parquet / CSV phân vùng / xoay vòng)
+        columns: thứ tự cột; dòng là list theo thứ tự này hoặc dict
+        fmt: "csv" | "parquet"
+        partition: {khóa: giá trị} cố định cho lượt chạy (vd {"city": "ho-chi-minh"})
+        schema: {cột: "int" | "float" | "str"} cho Parquet (mặc định mọi cột là str)
+        max_bytes: vượt thì đóng segment hiện tại (đổi tên nguyên tử) và mở segment mới
+        append: chế độ 1 file CSV: ghi tiếp vào file đã có thay vì tạo lại (header chỉ ghi khi file mới)
+        """
+        if fmt not in ("csv", "parquet"):
+            raise ValueError(f"fmt không hợp lệ: {fmt}")
+        if fmt == "parquet" and pa is None:
+            raise RuntimeError("Chưa cài pyarrow: pip install pyarrow (hoặc dùng fmt='csv')")
+        self.path = path
+        self.columns = list(columns)
+        self.fmt = fmt
+        self.partition = dict(partition or {})
+        self.types = dict(schema or {})
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.single_file = fmt == "csv" and not self.partition and not max_bytes
+        self.append = append
+        self.run_id = f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name=f"sink-{os.path.basename(path)}", daemon=True)
+        self._lock = threading.Lock()
+        self._segment = None
+        self._seq = 0
+
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.error = None           # lỗi ghi đầu tiên (close() ném lại)
+        self.files = []
+        self.flush_seconds = 0.0
+        self.started_at = None
+
+    # ---------- phía event loop ----------
+    def start(self):
+        if self.single_file and not (self.append and os.path.exists(self.path) and os.path.getsize(self.path)):
+            parent = os.path.dirname(self.path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            with open(self.path, "w", encoding="utf-8-sig", newline="") as f:
+                csv.writer(f).writerow(self.columns)
+        self.started_at = time.monotonic()
+        self._thread.start()
+        return self
+
+    async def put(self, rows):
+        """Đẩy 1 đợt dòng vào hàng đợi; chỉ đợi khi hàng đợi đầy."""
+        if not rows:
+            return
+        try:
+            self._queue.put_nowait(list(rows))
+        except queue.Full:
+            await asyncio.to_thread(self._queue.put, list(rows))
+
+    def close(self):
+        """
+        Flush phần còn lại, đóng segment cuối (blocking, gọi qua asyncio.to_thread).
+        Có lô ghi lỗi trong lượt chạy thì ném RuntimeError (kèm lỗi gốc) sau khi đã đóng xong.
+        """
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self.error is not None:
+            raise RuntimeError(f"{self.rows_failed} dòng không ghi được vào {self.path}: {self.error}") from self.error
+
+    def stats(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+            return {
+                "rows_written": self.rows_written,
+                "rows_failed": self.rows_failed,
+                "files": len(self.files),
+                "flush_seconds": round(self.flush_seconds, 3),
+                "rows_per_second": round(self.rows_written / elapsed, 1) if elapsed else 0.0,
+            }
+
+    # ---------- phía thread nền ----------
+    def _run(self):
+        buffer = []
+        deadline = time.monotonic() + self.flush_interval
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stopping = True
+            elif item:
+                buffer.extend(item)
+
+            now = time.monotonic()
+            if buffer and (stopping or now >= deadline or len(buffer) >= self.batch_size):
+                self._flush(buffer)
+                buffer = []
+            if now >= deadline:
+                deadline = now + self.flush_interval
+        if self._segment is not None:
+            try:
+                self.files.append(self._segment.finalize())
+            except Exception as e:
+                self._record_error(e, self._segment.rows)
+            self._segment = None
+
+    def _record_error(self, error, n_rows):
+        with self._lock:
+            self.rows_failed += n_rows
+            if self.error is None:
+                self.error = error
+
+    def _as_lists(self, rows):
+        return [[row.get(c, "") for c in self.columns] if isinstance(row, dict) else list(row)
+                for row in rows]
+
+    def _to_table(self, rows):
+        df = pd.DataFrame(rows, columns=self.columns)
+        arrays = []
+        for col in self.columns:
+            kind = self.types.get(col, "str")
+            if kind == "int":
+                values = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+            elif kind == "float":
+                values = pd.to_numeric(df[col], errors="coerce")
+            else:
+                values = df[col].where(df[col].notna(), None).map(lambda v: None if v is None else str(v))
+            arrays.append(pa.array(values, type=_arrow_type(kind), from_pandas=True))
+        return pa.Table.from_arrays(arrays, names=self.columns)
+
+    def _segment_path(self):
+        parts = [f"{k}={v}" for k, v in self.partition.items()]
+        self._seq += 1
+        name = f"part-{self.run_id}-{self._seq:05d}.{self.fmt}"
+        return os.path.join(self.path, *parts, name)
+
+    def _schema(self):
+        return pa.schema([(c, _arrow_type(self.types.get(c, "str"))) for c in self.columns]) if pa else None
+
+    def _flush(self, rows):
+        t0 = time.monotonic()
+        try:
+            rows = self._as_lists(rows)
+            if self.single_file:
+                with open(self.path, "a", encoding="utf-8-sig", newline="") as f:
+                    csv.writer(f).writerows(rows)
+            else:
+                if self._segment is None:
+                    self._segment = _Segment(self._segment_path(), self.fmt, self.columns, self._schema())
+                self._segment.write(self._to_table(rows) if self.fmt == "parquet" else rows)
+                if self.max_bytes and self._segment.size() >= self.max_bytes:
+                    self.files.append(self._segment.finalize())
+                    self._segment = None
+        except Exception as e:
+            print(f"    ->  Lỗi ghi {len(rows)} dòng vào {self.path}: {e}")
+            self._record_error(e, len(rows))
+            return
+        with self._lock:
+            self.rows_written += len(rows)
+            self.flush_seconds += time.monotonic() - t0
+
+
+def _parquet_files(path):
+    return glob.glob(os.path.join(path, "**", "part-*.parquet"), recursive=True)
+
+
+def _csv_parts(path):
+    """[(file, {khóa phân vùng: giá trị})] của thư mục CSV part-*.csv, theo thứ tự tên."""
+    parts = []
+    for file in sorted(glob.glob(os.path.join(path, "**", "part-*.csv"), recursive=True)):
+        rel = os.path.relpath(os.path.dirname(file), path)
+        values = {}
+        for part in ([] if rel == "." else rel.split(os.sep)):
+            key, _, value = part.partition("=")
+            if value:
+                values[key] = value
+        parts.append((file, values))
+    return parts
+
+
+def _categories_to_str(df):
+    # Cột phân vùng được đọc thành category -> trả về chuỗi như khi đọc CSV
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(str)
+    return df
+
+
+def read_table(path, **read_csv_kwargs):
+    """
+    Đọc lại đầu ra của RowSink thành 1 DataFrame:
+    file .csv; thư mục Parquet (kể cả cột phân vùng); hoặc thư mục CSV part-*.csv
+    (giá trị phân vùng lấy từ tên thư mục). Bỏ qua segment đang ghi dở.
+    """
+    if os.path.isfile(path):
+        return pd.read_csv(path, **read_csv_kwargs)
+    if _parquet_files(path):
+        if pa is None:
+            raise RuntimeError("Chưa cài pyarrow: pip install pyarrow")
+        return _categories_to_str(pd.read_parquet(path))
+    frames = [pd.read_csv(file, **read_csv_kwargs).assign(**values) for file, values in _csv_parts(path)]
+    if not frames:
+        raise FileNotFoundError(f"Không có dữ liệu trong {path}")
+    return pd.concat(frames, ignore_index=True)
+
+
+def iter_table(path, chunksize=100_000, **read_csv_kwargs):
+    """
+    Như read_table nhưng trả từng khúc tối đa `chunksize` dòng, để bộ nhớ không tăng
+    theo kích thước dữ liệu (vd gộp phòng của nhiều thành phố).
+    """
+    if os.path.isfile(path):
+        yield from pd.read_csv(path, chunksize=chunksize, **read_csv_kwargs)
+        return
+    if _parquet_files(path):
+        if pa is None:
+            raise RuntimeError("Chưa cài pyarrow: pip install pyarrow")
+        import pyarrow.dataset as ds
+        dataset = ds.dataset(path, format="parquet", partitioning="hive")
+        for batch in dataset.to_batches(batch_size=chunksize):
+            if batch.num_rows:
+                yield _categories_to_str(batch.to_pandas())
+        return
+    parts = _csv_parts(path)
+    if not parts:
+        raise FileNotFoundError(f"Không có dữ liệu trong {path}")
+    for file, values in parts:
+        for chunk in pd.read_csv(file, chunksize=chunksize, **read_csv_kwargs):
+            yield chunk.assign(**values)
@@ -0,0 +1,108 @@
+"""
+Kho snapshot HTML thô, định địa chỉ theo nội dung (content-addressed).
+
+Mỗi trang được nén (zstd nếu có thư viện `zstandard`, không thì gzip) và lưu tại
+    <root>/objects/<2 ký tự đầu sha256>/<sha256>.html.zst|.html.gz
+Trang trùng nội dung chỉ lưu 1 lần. Mỗi lần put() ghi thêm 1 dòng vào
+<root>/index.jsonl (digest, source, kind, url, fetched_at, codec, meta) để
+re-extract offline (xem reextract.py) mà không phải cào lại.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+INDEX_FILE = "index.jsonl"
+
+
+def _codec_ext(codec):
+    return ".html.zst" if codec == "zstd" else ".html.gz"
+
+
+def compress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class SnapshotArchive:
+    def __init__(self, root, codec=None):
+        """codec: "zstd" | "gzip" | None (tự chọn zstd nếu đã cài zstandard)."""
+        if codec is None:
+            codec = "zstd" if zstandard else "gzip"
+        if codec == "zstd" and zstandard is None:
+            raise RuntimeError("Chưa cài zstandard: pip install zstandard (hoặc dùng codec='gzip')")
+        self.root = root
+        self.codec = codec
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+
+    def object_path(self, digest, codec=None):
+        return os.path.join(self.root, "objects", digest[:2], digest + _codec_ext(codec or self.codec))
+
+    def put(self, html, source, kind, url="", **meta):
+        """Lưu 1 trang, trả về sha256 của nội dung HTML."""
+        data = html.encode("utf-8") if isinstance(html, str) else html
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(compress(data, self.codec))
+            os.replace(tmp, path)
+
+        entry = {
+            "digest": digest,
+            "source": source,
+            "kind": kind,
+            "url": url,
+            "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "codec": self.codec,
+            "meta": meta,
+        }
+        with self._lock:
+            with open(os.path.join(self.root, INDEX_FILE), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return digest
+
+    async def aput(self, html, source, kind, url="", **meta):
+        """Bản async: nén + ghi file ở thread phụ để không chặn event loop."""
+        return await asyncio.to_thread(self.put, html, source, kind, url, **meta)
+
+
+def iter_index(root, source=None, kind=None):
+    path = os.path.join(root, INDEX_FILE)
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if source and entry["source"] != source:
+                continue
+            if kind and entry["kind"] != kind:
+                continue
+            yield entry
+
+
+def read_snapshot(root, entry):
+    path = os.path.join(root, "objects", entry["digest"][:2], entry["digest"] + _codec_ext(entry["codec"]))
+    with open(path, "rb") as f:
+        return decompress(f.read(), entry["codec"]).decode("utf-8", errors="replace")
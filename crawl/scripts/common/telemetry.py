@@ -0,0 +1,179 @@
+"""
+Đo đạc dùng chung cho các crawler (Booking, iVIVU, Mytour).
+
+Ghi theo từng domain:
+- phân phối (summary có percentile): nav_seconds (goto), wait_seconds (chờ điều kiện),
+  extract_seconds (trích xuất), cards_per_scenario (số thẻ / kịch bản hoặc số phòng / trang)
+- bộ đếm: bytes_total, pages_total, retries_total, timeouts_total, errors_total
+
+Cuối lượt chạy write() xuất:
+    <out_dir>/<job>.prom           (Prometheus text format, đọc bằng node_exporter textfile collector)
+    <out_dir>/<job>_summary.json   (count/sum/mean/p50/p90/p95/p99/max theo domain)
+
+    from common.telemetry import Telemetry
+    TELEMETRY = Telemetry("booking_scraper")
+    with TELEMETRY.timer("nav_seconds", url):
+        await page.goto(url)
+    TELEMETRY.write()
+"""
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+# Mô tả cho dòng # HELP trong file .prom
+HELP = {
+    "nav_seconds": "Thời gian page.goto / driver.get (giây)",
+    "wait_seconds": "Thời gian chờ điều kiện trên trang (giây)",
+    "extract_seconds": "Thời gian trích xuất dữ liệu từ trang (giây)",
+    "cards_per_scenario": "Số thẻ/phòng lấy được mỗi kịch bản hoặc mỗi trang",
+    "bytes_total": "Số byte response nhận được (theo Content-Length)",
+    "pages_total": "Số trang đã mở",
+    "retries_total": "Số lần thử lại",
+    "timeouts_total": "Số lần hết thời gian chờ",
+    "errors_total": "Số lỗi",
+    "cache_hits_total": "Số dòng lấy từ cache",
+    "cache_misses_total": "Số dòng trượt cache / hết hạn phải cào",
+    "tab_utilisation": "Tỉ lệ thời gian tab bận / (số tab × thời gian chạy)",
+    "room_source_row_total": "Loại phòng lấy diện tích ngay trên dòng bảng giá",
+    "room_source_script_total": "Loại phòng lấy diện tích từ JSON nhúng trong <script>",
+    "room_source_hidden_total": "Loại phòng lấy diện tích từ khối mô tả ẩn",
+    "room_source_modal_total": "Loại phòng phải mở modal (dự phòng) mới có diện tích",
+    "room_source_modal_failed_total": "Loại phòng mở modal vẫn không có diện tích",
+    "room_source_not_found_total": "Loại phòng không khớp dòng nào trong bảng giá",
+    "room_source_embedded_total": "Phòng lấy chi tiết từ dữ liệu JSON nhúng trong trang",
+    "room_source_missing_total": "Phòng có giá nhưng không lấy được chi tiết",
+}
+
+
+def domain_of(url_or_domain):
+    """'https://www.booking.com/x' -> 'www.booking.com'; chuỗi không phải URL giữ nguyên."""
+    if not url_or_domain:
+        return "unknown"
+    netloc = urlparse(url_or_domain).netloc
+    return netloc or url_or_domain
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+class Telemetry:
+    def __init__(self, job, out_dir="telemetry"):
+        self.job = job
+        self.out_dir = out_dir
+        self.started = time.time()
+        self._samples = {}    # (metric, domain) -> [giá trị]
+        self._counters = {}   # (metric, domain) -> số
+        self._attached = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    # ---------- GHI ----------
+    def observe(self, metric, url_or_domain, value):
+        key = (metric, domain_of(url_or_domain))
+        with self._lock:
+            self._samples.setdefault(key, []).append(float(value))
+
+    def inc(self, metric, url_or_domain, n=1):
+        key = (metric, domain_of(url_or_domain))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    @contextmanager
+    def timer(self, metric, url_or_domain):
+        """Đo thời gian 1 khối lệnh (dùng được cả quanh await)."""
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(metric, url_or_domain, time.monotonic() - t0)
+
+    def attach_page(self, page):
+        """Đếm byte + số trang từ response của 1 Playwright page (không đọc body).
+        Page dùng lại nhiều lần (pool) chỉ được gắn listener 1 lần."""
+        if page in self._attached:
+            return page
+        self._attached.add(page)
+        def on_response(response):
+            try:
+                size = int(response.headers.get("content-length") or 0)
+            except ValueError:
+                size = 0
+            if size:
+                self.inc("bytes_total", response.url, size)
+            if response.request.is_navigation_request() and response.request.frame == page.main_frame:
+                self.inc("pages_total", response.url)
+        page.on("response", on_response)
+        return page
+
+    # ---------- XUẤT ----------
+    def summary(self):
+        with self._lock:
+            samples = {k: sorted(v) for k, v in self._samples.items()}
+            counters = dict(self._counters)
+
+        out = {
+            "job": self.job,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "duration_s": round(time.time() - self.started, 2),
+            "metrics": {},
+            "counters": {},
+        }
+        for (metric, domain), values in sorted(samples.items()):
+            stats = {
+                "count": len(values),
+                "sum": round(sum(values), 4),
+                "mean": round(sum(values) / len(values), 4),
+                "max": round(values[-1], 4),
+            }
+            for q in QUANTILES:
+                stats[f"p{int(q * 100)}"] = round(percentile(values, q), 4)
+            out["metrics"].setdefault(metric, {})[domain] = stats
+        for (metric, domain), value in sorted(counters.items()):
+            out["counters"].setdefault(metric, {})[domain] = value
+        return out
+
+    def to_prometheus(self, summary=None):
+        summary = summary or self.summary()
+        lines = []
+        for metric, by_domain in summary["metrics"].items():
+            name = f"crawl_{metric}"
+            lines.append(f"# HELP {name} {HELP.get(metric, metric)}")
+            lines.append(f"# TYPE {name} summary")
+            for domain, stats in by_domain.items():
+                labels = f'job="{self.job}",domain="{domain}"'
+                for q in QUANTILES:
+                    lines.append(f'{name}{{{labels},quantile="{q}"}} {stats[f"p{int(q * 100)}"]}')
+                lines.append(f"{name}_sum{{{labels}}} {stats['sum']}")
+                lines.append(f"{name}_count{{{labels}}} {stats['count']}")
+        for metric, by_domain in summary["counters"].items():
+            name = f"crawl_{metric}"
+            lines.append(f"# HELP {name} {HELP.get(metric, metric)}")
+            lines.append(f"# TYPE {name} counter")
+            for domain, value in by_domain.items():
+                lines.append(f'{name}{{job="{self.job}",domain="{domain}"}} {value}')
+        lines.append(f'crawl_run_duration_seconds{{job="{self.job}"}} {summary["duration_s"]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """Ghi file .prom + _summary.json (ghi file tạm rồi đổi tên để collector không đọc file dở)."""
+        os.makedirs(self.out_dir, exist_ok=True)
+        summary = self.summary()
+        prom_path = os.path.join(self.out_dir, f"{self.job}.prom")
+        json_path = os.path.join(self.out_dir, f"{self.job}_summary.json")
+        for path, content in ((prom_path, self.to_prometheus(summary)),
+                              (json_path, json.dumps(summary, ensure_ascii=False, indent=2))):
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        print(f"-> Telemetry: {prom_path} | {json_path}")
+        return summary
@@ -0,0 +1,108 @@
+import asyncio
+
+from common.browser_pool import BrowserPool
+
+
+class FakePage:
+    main_frame = object()
+
+    def on(self, event, handler):
+        pass
+
+    def is_closed(self):
+        return False
+
+
+class FakeContext:
+    def __init__(self, fail_close=False):
+        self.pages = []
+        self.closed = False
+        self.fail_close = fail_close
+
+    def on(self, event, handler):
+        pass
+
+    async def new_page(self):
+        page = FakePage()
+        self.pages.append(page)
+        return page
+
+    async def route(self, pattern, handler):
+        pass
+
+    async def storage_state(self, path=None):
+        if self.closed:
+            raise RuntimeError("context đã đóng")
+
+    async def close(self):
+        if self.fail_close:
+            raise RuntimeError("close lỗi")
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.created = 0
+        self.fail_new = False
+
+    async def new_context(self, **options):
+        if self.fail_new:
+            raise RuntimeError("browser đã đóng")
+        self.created += 1
+        return FakeContext()
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, timeout=2))
+
+
+def test_release_recycles_after_navigation_cap():
+    async def main():
+        browser = FakeBrowser()
+        pool = await BrowserPool(browser, size=1, max_navigations=2).start()
+        pooled = await pool.acquire()
+        pooled.navigations = 2
+        await pool.release(pooled)
+        again = await pool.acquire()
+        return browser, pool, pooled, again
+
+    browser, pool, old, new = run(main())
+    assert new is not old and old.context.closed
+    assert browser.created == 2 and pool.recycled == 1
+
+
+def test_release_replaces_context_when_recycle_fails():
+    async def main():
+        browser = FakeBrowser()
+        pool = await BrowserPool(browser, size=1, max_navigations=1, storage_state_path=None).start()
+        pooled = await pool.acquire()
+        pooled.navigations = 1
+        calls = {"n": 0}
+        original = browser.new_context
+
+        async def flaky(**options):
+            calls["n"] += 1
+            if calls["n"] == 1:           # _recycle -> _new_context lỗi lần đầu
+                raise RuntimeError("tạo context lỗi")
+            return await original(**options)
+        browser.new_context = flaky
+        await pool.release(pooled)
+        return pool, pooled, await pool.acquire()
+
+    pool, old, new = run(main())
+    assert new is not old and new in pool._all and old not in pool._all
+
+
+def test_release_always_returns_an_entry_when_browser_is_dead():
+    async def main():
+        browser = FakeBrowser()
+        pool = await BrowserPool(browser, size=2, max_navigations=1).start()
+        for _ in range(3):
+            pooled = await pool.acquire()
+            pooled.navigations = 5
+            browser.fail_new = True
+            await pool.release(pooled)
+        return pool._idle.qsize()
+
+    # Không tạo được context nào nữa nhưng pool không hụt (acquire không bị treo)
+    assert run(main()) == 2
@@ -0,0 +1,72 @@
+import asyncio
+import os
+
+import pandas as pd
+import pytest
+
+from common.row_sink import RowSink, iter_table, read_table
+
+COLUMNS = ["room_id", "city", "room_name"]
+
+
+def write(sink, *batches):
+    async def main():
+        sink.start()
+        for rows in batches:
+            await sink.put(rows)
+        await asyncio.to_thread(sink.close)
+    asyncio.run(main())
+    return sink
+
+
+def test_single_csv_file_round_trip(tmp_path):
+    path = str(tmp_path / "rooms.csv")
+    sink = write(RowSink(path, COLUMNS), [[1, "hcm", "Deluxe"]], [{"room_id": 2, "city": "vt", "room_name": "Suite"}])
+    assert read_table(path).to_dict("records") == [
+        {"room_id": 1, "city": "hcm", "room_name": "Deluxe"},
+        {"room_id": 2, "city": "vt", "room_name": "Suite"},
+    ]
+    assert sink.stats()["rows_written"] == 2
+
+
+def test_append_keeps_existing_rows_and_header(tmp_path):
+    path = str(tmp_path / "rooms.csv")
+    write(RowSink(path, COLUMNS), [[1, "hcm", "A"]])
+    write(RowSink(path, COLUMNS, append=True), [[2, "hcm", "B"]])
+    assert read_table(path)["room_id"].tolist() == [1, 2]
+
+
+def test_partitioned_csv_rotates_segments_and_reads_back(tmp_path):
+    path = str(tmp_path / "rooms")
+    batches = [[[i, f"Room {i}"] for i in range(start, start + 10)] for start in range(0, 50, 10)]
+    sink = RowSink(path, ["room_id", "room_name"], partition={"city": "hcm"}, max_bytes=200, batch_size=10)
+    write(sink, *batches)
+    assert len(sink.files) > 1
+    # Không còn segment đang ghi dở
+    assert not [f for _, _, files in os.walk(path) for f in files if f.endswith(".inprogress")]
+    df = read_table(path)
+    assert df["room_id"].tolist() == list(range(50))
+    assert set(df["city"]) == {"hcm"}
+    chunks = list(iter_table(path, chunksize=7))
+    assert sum(len(c) for c in chunks) == 50
+
+
+def test_parquet_partitions_read_back_as_strings(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = str(tmp_path / "rooms")
+    write(RowSink(path, ["room_id", "room_name"], fmt="parquet", partition={"city": "vt"},
+                  schema={"room_id": "int"}), [[1, "A"], [2, "B"]])
+    df = read_table(path).sort_values("room_id")
+    assert df["room_id"].tolist() == [1, 2]
+    assert df["city"].tolist() == ["vt", "vt"]
+    assert pd.api.types.is_object_dtype(df["city"]) or pd.api.types.is_string_dtype(df["city"])
+
+
+def test_failed_batch_is_counted_and_raised_on_close(tmp_path):
+    path = str(tmp_path / "rooms.csv")
+    sink = RowSink(path, COLUMNS, batch_size=1)
+    with pytest.raises(RuntimeError, match="1 dòng không ghi được"):
+        write(sink, [[1, "hcm", "A"]], [5], [[3, "hcm", "C"]])
+    stats = sink.stats()
+    assert stats["rows_written"] == 2
+    assert stats["rows_failed"] == 1
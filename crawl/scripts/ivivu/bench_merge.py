@@ -0,0 +1,121 @@
+"""
+Benchmark ghepfile.merge_city_files: cách cũ (đọc hết vào bộ nhớ, map id bằng vòng for
+Python) so với cách mới (glob N thành phố, bảng ánh xạ vector, rooms đi theo khúc).
+
+Sinh dữ liệu giả cùng cột với đầu ra getDetailHotels cho `--cities × --scale` thành phố
+(mặc định 3 × 10 = gấp 10 lần hiện tại), mỗi thành phố đánh id lại từ IVU_000001 như thật.
+Mỗi cách chạy trong 1 tiến trình mới (spawn); đo thời gian và RSS đỉnh tăng thêm
+so với lúc bắt đầu gộp (tính cả bộ nhớ của pyarrow/numpy, tracemalloc không thấy).
+
+Chạy:
+    python bench_merge.py --cities 3 --scale 10 --hotels 1500 --rooms 6
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing as mp
+import os
+import random
+import resource
+import tempfile
+import time
+
+import pandas as pd
+
+import ghepfile
+
+
+def make_city(src_dir, code, n_hotels, rooms_per_hotel, rng):
+    hotels = pd.DataFrame({
+        "hotel_id": [f"IVU_{i:06d}" for i in range(1, n_hotels + 1)],
+        "hotel_name": [f"Khách sạn {code} {i}" for i in range(1, n_hotels + 1)],
+        "hotel_link": [f"https://www.ivivu.com/khach-san-{code}/ks-{i}" for i in range(1, n_hotels + 1)],
+    })
+    hotels.to_csv(os.path.join(src_dir, f"ivivu_hotels_{code}.csv"), index=False, encoding="utf-8-sig")
+    hotel_of = [i for i in range(1, n_hotels + 1) for _ in range(rng.randint(1, 2 * rooms_per_hotel - 1))]
+    rooms = pd.DataFrame({
+        "room_id": [f"ROOM_{i:06d}" for i in range(1, len(hotel_of) + 1)],
+        "hotel_id": [f"IVU_{h:06d}" for h in hotel_of],
+        "room_name": "Phòng Deluxe giường đôi",
+        "price": [rng.randint(300, 5000) * 1000 for _ in hotel_of],
+        "area_m2": "25 m²",
+        "bed_type": "1 giường đôi",
+        "max_occupancy": 2,
+        "view": "Hướng thành phố",
+        "amenities": "Wi-Fi miễn phí; Điều hòa; TV màn hình phẳng; Minibar; Máy sấy tóc",
+    })
+    rooms.to_csv(os.path.join(src_dir, f"ivivu_rooms_{code}.csv"), index=False, encoding="utf-8-sig")
+    return len(rooms)
+
+
+def legacy_merge(src_dir, out_dir, codes):
+    """Cách cũ, tổng quát hóa cho N thành phố (đọc hết, dict + vòng for)."""
+    hotels = pd.concat([pd.read_csv(os.path.join(src_dir, f"ivivu_hotels_{c}.csv")) for c in codes], ignore_index=True)
+    mapping = {}
+    for idx, old_id in enumerate(hotels["hotel_id"]):
+        mapping[old_id] = f"IVU_HOTEL_{str(idx + 1).zfill(6)}"
+    hotels["hotel_id"] = hotels["hotel_id"].map(mapping)
+    rooms = pd.concat([pd.read_csv(os.path.join(src_dir, f"ivivu_rooms_{c}.csv")) for c in codes], ignore_index=True)
+    rooms["hotel_id"] = rooms["hotel_id"].map(mapping)
+    rooms["room_id"] = [f"IVU_ROOM_{str(i + 1).zfill(6)}" for i in range(len(rooms))]
+    hotels.to_csv(os.path.join(out_dir, "merged_hotels.csv"), index=False, encoding="utf-8-sig")
+    rooms.to_csv(os.path.join(out_dir, "merged_rooms.csv"), index=False, encoding="utf-8-sig")
+    return len(rooms)
+
+
+def _run(name, args, out):
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if name == "legacy":
+            result = legacy_merge(*args)
+        else:
+            result = ghepfile.merge_city_files(*args)[2]
+    wall = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base   # KB trên Linux
+    out.put((result, wall, peak / 1024))
+
+
+def measure(name, *args):
+    ctx = mp.get_context("spawn")
+    out = ctx.Queue()
+    proc = ctx.Process(target=_run, args=(name, args, out))
+    proc.start()
+    result = out.get()
+    proc.join()
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cities", type=int, default=3, help="số thành phố hiện tại")
+    ap.add_argument("--scale", type=int, default=10, help="nhân số thành phố")
+    ap.add_argument("--hotels", type=int, default=1500, help="khách sạn / thành phố")
+    ap.add_argument("--rooms", type=int, default=6, help="phòng trung bình / khách sạn")
+    ap.add_argument("--chunk", type=int, default=ghepfile.CHUNK_ROWS)
+    args = ap.parse_args()
+
+    rng = random.Random(7)
+    codes = [f"c{i:03d}" for i in range(args.cities * args.scale)]
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "src")
+        os.makedirs(src)
+        total_rooms = sum(make_city(src, code, args.hotels, args.rooms, rng) for code in codes)
+        print(f"{len(codes)} thành phố | {len(codes) * args.hotels} khách sạn | {total_rooms} phòng")
+
+        out_old, out_new = os.path.join(tmp, "old"), os.path.join(tmp, "new")
+        os.makedirs(out_old)
+        _, wall, peak = measure("legacy", src, out_old, codes)
+        print(f"      cách cũ: {wall:6.2f}s | RSS đỉnh +{peak:7.1f} MB")
+        stats, wall, peak = measure("merge", src, out_new, args.chunk)
+        print(f"     cách mới: {wall:6.2f}s | RSS đỉnh +{peak:7.1f} MB (khúc {args.chunk} dòng)")
+
+        # Cách cũ gộp id trùng giữa các thành phố (IVU_000001 của mọi city về cùng 1 khách sạn)
+        old_rooms = pd.read_csv(os.path.join(out_old, "merged_rooms.csv"))
+        new_rooms = pd.read_csv(os.path.join(out_new, "merged_rooms.csv"))
+        print(f"rooms: {len(new_rooms)} | khách sạn khác nhau trong rooms: cũ {old_rooms['hotel_id'].nunique()}, "
+              f"mới {new_rooms['hotel_id'].nunique()} | rooms không khớp: {stats['unmatched_rooms']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark tỉ lệ sử dụng tab khi cào phòng iVIVU: chia lô + asyncio.gather (cách cũ)
+so với hàng đợi + worker liên tục (hotel_worker trong getDetailHotels.py).
+
+Không mở trình duyệt: mỗi khách sạn là 1 lần asyncio.sleep với thời gian giả lập
+= thời gian mở trang + số phòng × thời gian mở modal; số phòng theo phân phối đuôi dài
+(phần lớn vài phòng, thỉnh thoảng 1 khách sạn rất nhiều phòng) như trên iVIVU.
+Cả 2 cách đều ghi qua OrderedRoomWriter và được kiểm tra room_id / thứ tự ghi giống nhau.
+
+Chạy:
+    python bench_tab_pool.py --hotels 200 --tabs 4 --scale 0.01
+"""
+import argparse
+import asyncio
+import csv
+import os
+import random
+import tempfile
+import time
+
+import getDetailHotels as gd
+from common.row_sink import RowSink
+
+
+def make_hotels(n, seed):
+    rng = random.Random(seed)
+    hotels = []
+    for i in range(n):
+        rooms = min(40, int(rng.paretovariate(1.3)) + 1)
+        hotels.append((i, f"IVU_{i + 1:06d}", f"Khách sạn {i + 1}", f"https://www.ivivu.com/fixture-{i + 1}", rooms))
+    return hotels
+
+
+def fake_scrape(hotels, nav_s, modal_s, scale):
+    rooms_of = {h[1]: h[4] for h in hotels}
+
+    async def scrape(hid, name, link):
+        rooms = rooms_of[hid]
+        await asyncio.sleep((nav_s + rooms * modal_s) * scale)
+        return [[hid, f"Phòng {k}", 1000000, "", "", "", "", ""] for k in range(rooms)]
+    return scrape
+
+
+async def run_batched(hotels, scrape, tabs, room_csv):
+    """Cách cũ: mỗi lô `tabs` khách sạn chờ khách sạn chậm nhất rồi mới sang lô sau."""
+    sink = RowSink(room_csv, gd.ROOM_COLUMNS).start()
+    writer = gd.OrderedRoomWriter(sink)
+    usage = gd.TabUsage(tabs)
+
+    async def one(seq, hid, name, link):
+        rows = []
+        try:
+            with usage.busy_tab():
+                rows = await scrape(hid, name, link)
+        finally:
+            await writer.done(seq, rows)
+
+    for i in range(0, len(hotels), tabs):
+        await asyncio.gather(*(one(*h[:4]) for h in hotels[i:i + tabs]))
+    await asyncio.to_thread(sink.close)
+    return usage
+
+
+async def run_pool(hotels, scrape, tabs, room_csv):
+    sink = RowSink(room_csv, gd.ROOM_COLUMNS).start()
+    writer = gd.OrderedRoomWriter(sink)
+    usage = gd.TabUsage(tabs)
+    queue, workers = await gd.start_hotel_workers(scrape, writer, usage, n_workers=tabs)
+    for h in hotels:
+        await queue.put(h[:4])
+    await gd.stop_hotel_workers(queue, workers)
+    await asyncio.to_thread(sink.close)
+    return usage
+
+
+def read_rows(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return list(csv.reader(f))
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hotels", type=int, default=200)
+    ap.add_argument("--tabs", type=int, default=gd.MAX_CONCURRENT_TABS)
+    ap.add_argument("--nav", type=float, default=8.0, help="giây mở trang + scroll mỗi khách sạn")
+    ap.add_argument("--modal", type=float, default=1.5, help="giây mở/đọc/đóng modal mỗi phòng")
+    ap.add_argument("--scale", type=float, default=0.01, help="nhân thời gian giả lập để chạy nhanh")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    hotels = make_hotels(args.hotels, args.seed)
+    scrape = fake_scrape(hotels, args.nav, args.modal, args.scale)
+    print(f"{args.hotels} khách sạn, {sum(h[4] for h in hotels)} phòng, {args.tabs} tab "
+          f"(tối đa {max(h[4] for h in hotels)} phòng / khách sạn)")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, runner in (("batch + gather", run_batched), ("worker pool", run_pool)):
+            path = os.path.join(tmp, f"{label}.csv")
+            t0 = time.perf_counter()
+            usage = await runner(hotels, scrape, args.tabs, path)
+            wall = time.perf_counter() - t0
+            results[label] = read_rows(path)
+            print(f"{label:>15}: {wall:7.2f}s | sử dụng tab {usage.utilisation():6.1%} | "
+                  f"{args.hotels / wall:7.1f} khách sạn/s")
+
+    a, b = results.values()
+    print(f"room_id + thứ tự ghi giống nhau: {a == b} ({len(a)} dòng)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,230 +1,539 @@
 import asyncio
-import csv
+import os
+import sys
+import time
+from contextlib import contextmanager
 from statistics import mean
 from playwright.async_api import async_playwright, TimeoutError
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.browser_pool import BrowserPool
+from common.snapshot_archive import SnapshotArchive
+from common.telemetry import Telemetry
+from common.rate_limit import AdaptiveRateLimiter, RetryPolicy
+from common.row_sink import RowSink
+
 # ================= CONFIG =================
 CITY_URL = "https://www.ivivu.com/khach-san-ho-chi-minh"
 HOTEL_CSV = "ivivu_hotels.csv"
 ROOM_CSV = "ivivu_rooms.csv"
 
+# Đầu ra ghi ở thread nền (common/row_sink.py):
+#   "csv"     : HOTEL_CSV / ROOM_CSV như cũ
+#   "parquet" : thư mục HOTEL_PARQUET_DIR / ROOM_PARQUET_DIR, phân vùng city=<CITY_SLUG>,
+#               mỗi file tối đa SINK_MAX_BYTES (ghepfile.py đọc được cả 2 dạng)
+OUTPUT_FORMAT = "csv"
+HOTEL_PARQUET_DIR = "ivivu_hotels"
+ROOM_PARQUET_DIR = "ivivu_rooms"
+SINK_MAX_BYTES = 64 * 1024 * 1024
+CITY_SLUG = CITY_URL.rstrip("/").split("/")[-1].replace("khach-san-", "")
+
 SEL_CARD = ".pdv__content-box"
 SEL_LOAD_MORE = "button.rgc__view-more-btn"
 NO_ROOM_TEXT = "Rất tiếc, iVIVU không còn phòng"
 
+# Cách lấy chi tiết phòng:
+#   "bulk"  : 1 lần evaluate cho cả trang (dữ liệu nhúng, thiếu thì mở modal lần lượt trong trang)
+#   "modal" : click "Xem chi tiết" từng phòng từ Python như cũ (chờ tối đa 15s mỗi phòng)
+ROOM_EXTRACT_MODE = "bulk"
+BULK_MODAL_TIMEOUT_MS = 5000
+
 # Số tab xử lý song song (QUAN TRỌNG NHẤT)
 MAX_CONCURRENT_TABS = 4
+# Số khách sạn chờ sẵn trong hàng đợi (trang danh sách không chạy quá xa các tab phòng)
+QUEUE_SIZE = MAX_CONCURRENT_TABS * 4
+
+# Pool context: +1 context cho trang danh sách, thay context sau N lần điều hướng
+BROWSER_STATE_FILE = os.path.join("browser_state", "ivivu.json")
+CONTEXT_MAX_NAVIGATIONS = 40
+CONTEXT_MAX_MEMORY_MB = 1024
+BLOCK_PATTERNS = ["**/*.{png,jpg,jpeg,webp,svg,gif}"]
+
+# Lưu HTML thô trang khách sạn (None = tắt); re-extract offline bằng common/reextract.py
+SNAPSHOT_DIR = None
+ARCHIVE = SnapshotArchive(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+
+# Telemetry: telemetry/ivivu_details.prom + ivivu_details_summary.json
+TELEMETRY = Telemetry("ivivu_details", out_dir="telemetry")
+
+# Giới hạn tốc độ thích ứng: số tab phòng chạy cùng lúc bắt đầu từ 2, tăng dần tới MAX_CONCURRENT_TABS
+LIMITER = AdaptiveRateLimiter(rate=1.0, min_rate=0.2, max_rate=4.0, concurrency=2,
+                              max_concurrency=MAX_CONCURRENT_TABS, telemetry=TELEMETRY)
+RETRY = RetryPolicy(max_attempts=3, telemetry=TELEMETRY)
+
+# ================= JS =================
+# Giá trung bình mỗi khối room-class-* (OTA trước, không có thì TA); null = không có giá
+PRICES_JS = """
+() => {
+    const blocks = document.querySelectorAll("div[id^='room-class-']");
+    const result = [];
+    
+    blocks.forEach(block => {
+        const prices = [];
+        
+        // Thử OTA trước
+        const otaPrices = block.querySelectorAll('.rcct__price--ota-text');
+        if (otaPrices.length > 0) {
+            otaPrices.forEach(p => {
+                const text = p.innerText.replace(/\\./g, '').trim();
+                if (/^\\d+$/.test(text)) {
+                    prices.push(parseInt(text));
+                }
+            });
+        } else {
+            // Không có OTA thì lấy TA
+            const taPrices = block.querySelectorAll('.rcct__price--ta-text');
+            taPrices.forEach(p => {
+                const text = p.innerText.replace(/\\./g, '').trim();
+                if (/^\\d+$/.test(text)) {
+                    prices.push(parseInt(text));
+                }
+            });
+        }
+        
+        if (prices.length > 0) {
+            const avgPrice = Math.floor(prices.reduce((a,b) => a+b, 0) / prices.length);
+            result.push(avgPrice);
+        } else {
+            result.push(null);
+        }
+    });
+    
+    return result;
+}
+"""
+
+# Chế độ "bulk": 1 lần evaluate cho mọi khối room-class-*.
+#   1. dữ liệu phòng nhúng trong trang (JSON __NEXT_DATA__ / transfer state / application/json)
+#   2. khối nào có giá mà chưa có dữ liệu nhúng thì mở modal lần lượt NGAY TRONG TRANG (chờ bằng
+#      polling 50ms, không round-trip về Python, không sleep cố định); khối không giá (hết phòng)
+#      bỏ qua như chế độ modal
+# Dữ liệu nhúng được ghép với khối theo id phòng, không có thì theo tên phòng (không ghép theo vị trí).
+# Trả về mỗi khối 1 object {name, area, bed, maxOcc, view, amenities, source}; source = null khi
+# không lấy được chi tiết.
+EXTRACT_ROOMS_BULK_JS = r"""
+async ({ modalTimeout, prices }) => {
+    const blocks = Array.from(document.querySelectorAll("div[id^='room-class-']"));
+    const clean = s => String(s || '').toLowerCase().replace(/\s+/g, ' ').trim();
+    // Tên để so khớp: bỏ dấu, bỏ ký tự không phải chữ/số ("Phòng Deluxe - Hướng biển" ~ "phong deluxe huong bien")
+    const norm = s => clean(s).normalize('NFD').replace(/[\u0300-\u036f]/g, '').replace(/đ/g, 'd')
+        .replace(/[^a-z0-9]+/g, ' ').trim();
+    const sleep = ms => new Promise(r => setTimeout(r, ms));
+    const waitFor = async (fn, timeout) => {
+        const t0 = performance.now();
+        while (performance.now() - t0 < timeout) {
+            const v = fn();
+            if (v) return v;
+            await sleep(50);
+        }
+        return null;
+    };
+    const visible = el => el && el.offsetParent !== null;
+
+    // Cùng quy tắc với modal: mỗi tiện ích 1 dòng, nhận diện diện tích / hướng / giường theo chữ
+    const fromFacilities = items => {
+        let area = '', view = '', bed = '';
+        items.forEach(text => {
+            const t = text.toLowerCase();
+            if (t.includes('m²')) area = text;
+            if (t.includes('hướng')) view = text;
+            if (t.includes('giường')) bed = text;
+        });
+        return { area, view, bed, amenities: items.join('; ') };
+    };
+
+    // ---------- 1. DỮ LIỆU NHÚNG ----------
+    const embedded = [];
+    const ROOMISH = /area|size|bed|occup|adult|view|facilit|amenit/i;
+    const walk = (node, depth) => {
+        if (!node || typeof node !== 'object' || depth > 15) return;
+        if (Array.isArray(node)) { node.forEach(n => walk(n, depth + 1)); return; }
+        const keys = Object.keys(node);
+        const nameKey = keys.find(k => /^(room_?name|name|title)$/i.test(k));
+        if (nameKey && typeof node[nameKey] === 'string' && keys.some(k => ROOMISH.test(k))) {
+            embedded.push({ obj: node, name: norm(node[nameKey]) });
+        }
+        keys.forEach(k => walk(node[k], depth + 1));
+    };
+    document.querySelectorAll('script#__NEXT_DATA__, script[type="application/json"], script#serverApp-state, script#ng-state')
+        .forEach(sc => {
+            let t = sc.textContent || '';
+            // Angular transfer state mã hóa ký tự đặc biệt: &q; &a; &s; &l; &g;
+            if (t.includes('&q;')) {
+                t = t.replace(/&q;/g, '"').replace(/&s;/g, "'").replace(/&l;/g, '<').replace(/&g;/g, '>').replace(/&a;/g, '&');
+            }
+            try { walk(JSON.parse(t), 0); } catch (e) {}
+        });
+
+    const pick = (obj, re) => {
+        const k = Object.keys(obj).find(key => re.test(key) && obj[key] != null && obj[key] !== '');
+        return k === undefined ? null : obj[k];
+    };
+    const names = v => (Array.isArray(v) ? v : [v])
+        .map(x => typeof x === 'object' && x ? (x.name || x.title || x.Name || '') : x)
+        .map(x => String(x || '').trim()).filter(Boolean);
+    const fromEmbedded = (obj, name) => {
+        const facs = names(pick(obj, /facilit|amenit|tien_?ich/i) || []);
+        const f = fromFacilities(facs);
+        let area = pick(obj, /^(?!.*bed).*(area|size|surface|dien_?tich)/i);
+        if (area != null && typeof area !== 'object') area = /m²|m2/i.test(String(area)) ? String(area) : `${area} m²`;
+        else area = f.area;
+        const bed = pick(obj, /bed/i);
+        const occ = pick(obj, /max.*(occup|adult|person|guest|pax)|occupancy/i);
+        const view = pick(obj, /view|huong/i);
+        return {
+            name: name,
+            area: area || '',
+            bed: bed != null && typeof bed !== 'object' ? String(bed) : (names(bed || []).join(', ') || f.bed),
+            maxOcc: occ != null ? String(String(occ).match(/\d+/)?.[0] || '') : '',
+            view: view != null && typeof view !== 'object' ? String(view) : f.view,
+            amenities: f.amenities,
+            source: 'embedded'
+        };
+    };
+
+    const byName = blockName => {
+        if (!blockName) return null;
+        const exact = embedded.find(e => e.name === blockName);
+        if (exact) return exact;
+        // Tên trong trang thường thêm/bớt tiền tố ("Phòng ...") -> chỉ nhận khi đúng 1 ứng viên chứa nhau
+        const partial = embedded.filter(e => e.name && (e.name.includes(blockName) || blockName.includes(e.name)));
+        return partial.length === 1 ? partial[0] : null;
+    };
+    const out = blocks.map(block => {
+        const blockKey = block.id.replace('room-class-', '');
+        const nameEl = block.querySelector('[class*="room-name"], [class*="room-title"], h2, h3');
+        let hit = embedded.find(e => ['id', 'roomId', 'RoomId', 'room_id', 'roomClassId', 'RoomClassId']
+            .some(k => e.obj[k] != null && String(e.obj[k]) === blockKey));
+        if (!hit) hit = byName(norm(nameEl ? nameEl.textContent : ''));
+        return hit ? fromEmbedded(hit.obj, nameEl ? nameEl.textContent.trim() : hit.obj.name || hit.obj.title) : null;
+    });
+
+    // ---------- 2. MODAL THEO LÔ (chỉ các khối có giá, chưa có dữ liệu nhúng) ----------
+    const MODAL = '.rtod__container';
+    for (let i = 0; i < blocks.length; i++) {
+        if (out[i]) continue;
+        // Hết phòng (không giá): không lưu dòng nào -> không tốn 1 lần click + chờ modal
+        if (prices && prices[i] == null) { out[i] = { source: null }; continue; }
+        const spans = Array.from(blocks[i].querySelectorAll('span')).filter(s => s.textContent.includes('Xem chi tiết'));
+        const btn = spans.find(s => !Array.from(s.querySelectorAll('span')).some(c => c.textContent.includes('Xem chi tiết')));
+        if (!btn) { out[i] = { source: null }; continue; }
+        btn.scrollIntoView({ block: 'center' });
+        btn.click();
+        const modal = await waitFor(() => {
+            const m = document.querySelector(MODAL);
+            return visible(m) && m.querySelector('.rcid__right--text__room-name')?.innerText.trim() ? m : null;
+        }, modalTimeout);
+        if (!modal) { out[i] = { source: null }; continue; }
+
+        const items = Array.from(modal.querySelectorAll('.fal__facilities--item')).map(el => el.innerText);
+        let maxOcc = '';
+        const pax = modal.querySelector('.pxn__col-1--title-html');
+        if (pax) {
+            const m = pax.innerText.match(/(\d+)/);
+            if (m) maxOcc = m[1];
+        }
+        out[i] = Object.assign(fromFacilities(items), {
+            name: modal.querySelector('.rcid__right--text__room-name').innerText,
+            maxOcc, source: 'modal'
+        });
+
+        const close = modal.querySelector('.rtod__header--close-icon');
+        if (close) close.click();
+        else document.dispatchEvent(new KeyboardEvent('keydown', { key: 'Escape', bubbles: true }));
+        await waitFor(() => !visible(document.querySelector(MODAL)), 2000);
+    }
+    return out;
+}
+"""
 
 # ================= INIT CSV =================
-def init_csv():
-    with open(HOTEL_CSV, "w", encoding="utf-8-sig", newline="") as f:
-        csv.writer(f).writerow([
-            "hotel_id", "hotel_name", "hotel_link"
-        ])
-    with open(ROOM_CSV, "w", encoding="utf-8-sig", newline="") as f:
-        csv.writer(f).writerow([
-            "room_id", "hotel_id", "room_name", "price",
-            "area_m2", "bed_type", "max_occupancy",
-            "view", "amenities"
-        ])
+HOTEL_COLUMNS = ["hotel_id", "hotel_name", "hotel_link"]
+ROOM_COLUMNS = [
+    "room_id", "hotel_id", "room_name", "price",
+    "area_m2", "bed_type", "max_occupancy",
+    "view", "amenities"
+]
+
+def open_sinks():
+    """Tạo + start sink khách sạn và sink phòng theo OUTPUT_FORMAT (ghi header / mở thư mục)."""
+    if OUTPUT_FORMAT == "parquet":
+        partition = {"city": CITY_SLUG}
+        hotels = RowSink(HOTEL_PARQUET_DIR, HOTEL_COLUMNS, fmt="parquet",
+                         partition=partition, max_bytes=SINK_MAX_BYTES)
+        rooms = RowSink(ROOM_PARQUET_DIR, ROOM_COLUMNS, fmt="parquet", partition=partition,
+                        schema={"price": "int"}, max_bytes=SINK_MAX_BYTES)
+    else:
+        hotels = RowSink(HOTEL_CSV, HOTEL_COLUMNS)
+        rooms = RowSink(ROOM_CSV, ROOM_COLUMNS)
+    return hotels.start(), rooms.start()
 
 # ================= UTILS =================
 def clean_price(p):
     p = p.replace(".", "").strip()
     return int(p) if p.isdigit() else None
 
+class OrderedRoomWriter:
+    """
+    Đẩy phòng vào sink theo đúng thứ tự khách sạn dù các tab xong lệch nhau.
+    room_id được cấp lúc ghi nên liên tục và chỉ phụ thuộc thứ tự khách sạn,
+    không phụ thuộc tab nào xong trước.
+    """
+    def __init__(self, sink, start_room_id=1):
+        self.sink = sink
+        self.next_room_id = start_room_id
+        self.next_seq = 0
+        self._pending = {}
+
+    async def done(self, seq, rows):
+        """Khách sạn thứ seq đã xong (rows không có cột room_id; lỗi thì rows = [])."""
+        self._pending[seq] = rows
+        ready = []
+        while self.next_seq in self._pending:
+            for row in self._pending.pop(self.next_seq):
+                ready.append([f"ROOM_{self.next_room_id:06d}"] + row)
+                self.next_room_id += 1
+            self.next_seq += 1
+        await self.sink.put(ready)
+
+    def waiting(self):
+        return len(self._pending)
+
+class TabUsage:
+    """Tỉ lệ sử dụng tab = tổng thời gian tab bận / (số tab × thời gian chạy)."""
+    def __init__(self, tabs):
+        self.tabs = tabs
+        self.busy = 0.0
+        self.hotels = 0
+        self.started = time.monotonic()
+
+    @contextmanager
+    def busy_tab(self):
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.busy += time.monotonic() - t0
+            self.hotels += 1
+
+    def utilisation(self):
+        wall = time.monotonic() - self.started
+        return self.busy / (self.tabs * wall) if wall > 0 else 0.0
+
+    def report(self):
+        wall = time.monotonic() - self.started
+        print(f" [tab] {self.hotels} khách sạn / {wall:.1f}s | sử dụng tab {self.utilisation():.1%} "
+              f"({self.tabs} tab)")
+
 # ================= SCRAPE ROOMS (TỐI ƯU) =================
-async def scrape_rooms(context, hotel_id, hotel_name, hotel_link, start_room_id):
+async def extract_rooms_modal(page, hotel_id, hotel_link, all_prices):
+    """Chế độ "modal" (cách cũ): click "Xem chi tiết" từng phòng, chờ modal, đọc, đóng."""
     rows = []
-    room_id = start_room_id
-    page = await context.new_page()
+    room_blocks = page.locator("div[id^='room-class-']")
+    total_rooms = len(all_prices)
 
-    print(f"      → Mở trang phòng: {hotel_name}")
+    for i in range(total_rooms):
+        price = all_prices[i]
+        if price is None:
+            continue
 
-    try:
-        await page.goto(hotel_link, timeout=60000)
-        await page.wait_for_timeout(3000)
+        block = room_blocks.nth(i)
 
-        # Scroll để load hết - GIỮ NGUYÊN
-        for _ in range(6):
-            await page.mouse.wheel(0, 1200)
-            await page.wait_for_timeout(600)
+        # ===== CLICK XEM CHI TIẾT =====
+        try:
+            btn = block.locator("span:has-text('Xem chi tiết')").first
+            await btn.scroll_into_view_if_needed()
+            await btn.click()
+        except:
+            continue
+
+        # ===== MODAL =====
+        try:
+            modal = page.locator(".rtod__container")
+            await modal.wait_for(timeout=15000)
+
+            # TỐI ƯU: Lấy tất cả data modal trong 1 lần
+            data = await modal.evaluate("""
+                () => {
+                    const name = document.querySelector(
+                      '.rcid__right--text__room-name'
+                    )?.innerText || '';
+
+                    let area='', view='', bed='';
+                    const amenities=[];
+
+                    document.querySelectorAll('.fal__facilities--item').forEach(i=>{
+                        const t=i.innerText.toLowerCase();
+                        amenities.push(i.innerText);
+                        if(t.includes('m²')) area=i.innerText;
+                        if(t.includes('hướng')) view=i.innerText;
+                        if(t.includes('giường')) bed=i.innerText;
+                    });
+
+                    let maxOcc='';
+                    const pax=document.querySelector('.pxn__col-1--title-html');
+                    if(pax){
+                        const m=pax.innerText.match(/(\\d+)/);
+                        if(m) maxOcc=m[1];
+                    }
+
+                    return {name, area, bed, view, maxOcc, amenities: amenities.join('; ')};
+                }
+            """)
+
+            rows.append([
+                hotel_id,
+                data["name"],
+                price,
+                data["area"],
+                data["bed"],
+                data["maxOcc"],
+                data["view"],
+                data["amenities"]
+            ])
+
+            await page.locator(".rtod__header--close-icon").click()
+            await page.wait_for_timeout(400)
+
+        except TimeoutError:
+            TELEMETRY.inc("timeouts_total", hotel_link)
+            print("      ❌ Modal lỗi → skip phòng")
+            try:
+                await page.keyboard.press("Escape")
+            except:
+                pass
+
+    return rows
 
-        if NO_ROOM_TEXT in await page.content():
+async def extract_rooms_bulk(page, hotel_id, hotel_link, all_prices):
+    """Chế độ "bulk": chi tiết mọi phòng từ 1 lần evaluate (dữ liệu nhúng, thiếu thì modal theo lô)."""
+    rooms = await page.evaluate(EXTRACT_ROOMS_BULK_JS, {"modalTimeout": BULK_MODAL_TIMEOUT_MS,
+                                                        "prices": all_prices})
+    rows = []
+    for price, data in zip(all_prices, rooms):
+        if price is None:
+            continue
+        if not data.get("source"):
+            TELEMETRY.inc("room_source_missing_total", hotel_link)
+            continue
+        TELEMETRY.inc(f"room_source_{data['source']}_total", hotel_link)
+        rows.append([
+            hotel_id,
+            data["name"],
+            price,
+            data["area"],
+            data["bed"],
+            data["maxOcc"],
+            data["view"],
+            data["amenities"]
+        ])
+    missing = sum(1 for price, data in zip(all_prices, rooms) if price is not None and not data.get("source"))
+    if missing:
+        print(f"      ❌ {missing} phòng không lấy được chi tiết → skip")
+    return rows
+
+
+async def scrape_rooms(context, hotel_id, hotel_name, hotel_link):
+    """Trả về các dòng phòng (chưa có room_id, OrderedRoomWriter cấp lúc ghi)."""
+    rows = []
+    page = TELEMETRY.attach_page(await context.new_page())
+
+    print(f"      → Mở trang phòng: {hotel_name}")
+
+    try:
+        with TELEMETRY.timer("nav_seconds", hotel_link):
+            await RETRY.run(hotel_link, lambda: page.goto(hotel_link, timeout=60000), LIMITER)
+        with TELEMETRY.timer("wait_seconds", hotel_link):
+            await page.wait_for_timeout(3000)
+
+            # Scroll để load hết - GIỮ NGUYÊN
+            for _ in range(6):
+                await page.mouse.wheel(0, 1200)
+                await page.wait_for_timeout(600)
+
+        t_extract = time.monotonic()
+        if ARCHIVE:
+            await ARCHIVE.aput(await page.content(), source="ivivu", kind="hotel", url=hotel_link,
+                               hotel_id=hotel_id, hotel_name=hotel_name)
+
+        # Kiểm tra hết phòng bằng locator (không kéo cả HTML về Python)
+        if await page.get_by_text(NO_ROOM_TEXT).count() > 0:
             print("      ⚠️ Không có phòng → đóng tab")
             await page.close()
-            return rows, room_id
+            return rows
 
         room_blocks = page.locator("div[id^='room-class-']")
         total_rooms = await room_blocks.count()
         
         if total_rooms == 0:
             await page.close()
-            return rows, room_id
+            return rows
             
         print(f"      🔍 {total_rooms} phòng")
 
         # ===== TỐI ƯU: Lấy tất cả giá trong 1 lần evaluate =====
-        all_prices = await page.evaluate("""
-            () => {
-                const blocks = document.querySelectorAll("div[id^='room-class-']");
-                const result = [];
-                
-                blocks.forEach(block => {
-                    const prices = [];
-                    
-                    // Thử OTA trước
-                    const otaPrices = block.querySelectorAll('.rcct__price--ota-text');
-                    if (otaPrices.length > 0) {
-                        otaPrices.forEach(p => {
-                            const text = p.innerText.replace(/\\./g, '').trim();
-                            if (/^\\d+$/.test(text)) {
-                                prices.push(parseInt(text));
-                            }
-                        });
-                    } else {
-                        // Không có OTA thì lấy TA
-                        const taPrices = block.querySelectorAll('.rcct__price--ta-text');
-                        taPrices.forEach(p => {
-                            const text = p.innerText.replace(/\\./g, '').trim();
-                            if (/^\\d+$/.test(text)) {
-                                prices.push(parseInt(text));
-                            }
-                        });
-                    }
-                    
-                    if (prices.length > 0) {
-                        const avgPrice = Math.floor(prices.reduce((a,b) => a+b, 0) / prices.length);
-                        result.push(avgPrice);
-                    } else {
-                        result.push(null);
-                    }
-                });
-                
-                return result;
-            }
-        """)
+        all_prices = await page.evaluate(PRICES_JS)
 
-        # Xử lý từng phòng
-        for i in range(total_rooms):
-            price = all_prices[i]
-            if price is None:
-                continue
-
-            block = room_blocks.nth(i)
-
-            # ===== CLICK XEM CHI TIẾT =====
-            try:
-                btn = block.locator("span:has-text('Xem chi tiết')").first
-                await btn.scroll_into_view_if_needed()
-                await btn.click()
-            except:
-                continue
-
-            # ===== MODAL =====
-            try:
-                modal = page.locator(".rtod__container")
-                await modal.wait_for(timeout=15000)
-
-                # TỐI ƯU: Lấy tất cả data modal trong 1 lần
-                data = await modal.evaluate("""
-                    () => {
-                        const name = document.querySelector(
-                          '.rcid__right--text__room-name'
-                        )?.innerText || '';
-
-                        let area='', view='', bed='';
-                        const amenities=[];
-
-                        document.querySelectorAll('.fal__facilities--item').forEach(i=>{
-                            const t=i.innerText.toLowerCase();
-                            amenities.push(i.innerText);
-                            if(t.includes('m²')) area=i.innerText;
-                            if(t.includes('hướng')) view=i.innerText;
-                            if(t.includes('giường')) bed=i.innerText;
-                        });
-
-                        let maxOcc='';
-                        const pax=document.querySelector('.pxn__col-1--title-html');
-                        if(pax){
-                            const m=pax.innerText.match(/(\\d+)/);
-                            if(m) maxOcc=m[1];
-                        }
-
-                        return {name, area, bed, view, maxOcc, amenities: amenities.join('; ')};
-                    }
-                """)
-
-                rows.append([
-                    f"ROOM_{room_id:06d}",
-                    hotel_id,
-                    data["name"],
-                    price,
-                    data["area"],
-                    data["bed"],
-                    data["maxOcc"],
-                    data["view"],
-                    data["amenities"]
-                ])
-                room_id += 1
-
-                await page.locator(".rtod__header--close-icon").click()
-                await page.wait_for_timeout(400)
-
-            except TimeoutError:
-                print("      ❌ Modal lỗi → skip phòng")
-                try:
-                    await page.keyboard.press("Escape")
-                except:
-                    pass
+        if ROOM_EXTRACT_MODE == "bulk":
+            rows = await extract_rooms_bulk(page, hotel_id, hotel_link, all_prices)
+        else:
+            rows = await extract_rooms_modal(page, hotel_id, hotel_link, all_prices)
 
         print(f"      ✅ Lấy {len(rows)} phòng")
+        TELEMETRY.observe("extract_seconds", hotel_link, time.monotonic() - t_extract)
+        TELEMETRY.observe("cards_per_scenario", hotel_link, len(rows))
 
     except Exception as e:
+        TELEMETRY.inc("errors_total", hotel_link)
         print(f"      ❌ Lỗi: {e}")
 
     await page.close()
-    return rows, room_id
+    return rows
 
 # ================= XỬ LÝ SONG SONG =================
-async def process_hotels_parallel(context, hotels_info, start_hotel_id, start_room_id):
-    """Xử lý nhiều hotel đồng thời"""
-    
-    # Write tất cả hotel info trước
-    with open(HOTEL_CSV, "a", encoding="utf-8-sig", newline="") as f:
-        writer = csv.writer(f)
-        for idx, (name, link) in enumerate(hotels_info):
-            hid = f"IVU_{start_hotel_id + idx:06d}"
-            writer.writerow([hid, name, link])
-    
-    # Tạo tasks song song
-    tasks = []
-    for idx, (name, link) in enumerate(hotels_info):
-        hid = f"IVU_{start_hotel_id + idx:06d}"
-        # Mỗi hotel có room_id riêng để tránh conflict
-        task_room_id = start_room_id + (idx * 1000)  # Reserve 1000 IDs per hotel
-        tasks.append(scrape_rooms(context, hid, name, link, task_room_id))
-    
-    # Chạy song song
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    
-    # Ghi rooms và tính room_id cuối cùng
-    max_room_id = start_room_id
-    for result in results:
-        if isinstance(result, Exception):
-            print(f"      ⚠️ Lỗi khi xử lý: {result}")
-            continue
-        rows, last_room_id = result
-        if rows:
-            with open(ROOM_CSV, "a", encoding="utf-8-sig", newline="") as f:
-                csv.writer(f).writerows(rows)
-            max_room_id = max(max_room_id, last_room_id)
-    
-    return start_hotel_id + len(hotels_info), max_room_id
+async def scrape_rooms_pooled(pool, hotel_id, hotel_name, hotel_link):
+    """Mượn 1 context ấm trong pool để mở tab phòng của 1 khách sạn."""
+    async with LIMITER.slot(hotel_link), pool.context() as context:
+        return await scrape_rooms(context, hotel_id, hotel_name, hotel_link)
+
+async def hotel_worker(queue, scrape, room_writer, usage):
+    """
+    1 tab: xong khách sạn nào lấy ngay khách sạn kế tiếp trong hàng đợi
+    (không chờ cả lô như gather theo batch). Item: (seq, hotel_id, name, link); None = dừng.
+    """
+    while True:
+        item = await queue.get()
+        try:
+            if item is None:
+                return
+            seq, hid, name, link = item
+            rows = []
+            try:
+                with usage.busy_tab():
+                    rows = await scrape(hid, name, link)
+            except Exception as e:
+                TELEMETRY.inc("errors_total", link)
+                print(f"      ⚠️ Lỗi khi xử lý {hid}: {e}")
+            finally:
+                # Luôn báo xong (kể cả lỗi) để các khách sạn sau không bị giữ lại
+                await room_writer.done(seq, rows)
+        finally:
+            queue.task_done()
+
+async def start_hotel_workers(scrape, room_writer, usage, n_workers=MAX_CONCURRENT_TABS):
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    workers = [asyncio.create_task(hotel_worker(queue, scrape, room_writer, usage))
+               for _ in range(n_workers)]
+    return queue, workers
+
+async def stop_hotel_workers(queue, workers):
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
 
 # ================= MAIN =================
 async def main():
-    init_csv()
+    hotel_sink, room_sink = open_sinks()
 
     async with async_playwright() as p:
         browser = await p.chromium.launch(
@@ -235,59 +544,85 @@ async def main():
             ]
         )
 
-        context = await browser.new_context(
-            viewport={"width": 1280, "height": 900},
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120"
-        )
-
-        # Block images để tải nhanh hơn
-        await context.route("**/*.{png,jpg,jpeg,webp,svg,gif}", lambda r: r.abort())
-
-        page = await context.new_page()
-        await page.goto(CITY_URL, timeout=60000)
-        await page.wait_for_selector(SEL_CARD)
+        # Block images để tải nhanh hơn (route ở mức context trong pool)
+        pool = await BrowserPool(
+            browser, size=MAX_CONCURRENT_TABS + 1, storage_state_path=BROWSER_STATE_FILE,
+            max_navigations=CONTEXT_MAX_NAVIGATIONS, max_memory_mb=CONTEXT_MAX_MEMORY_MB,
+            context_options={
+                "viewport": {"width": 1280, "height": 900},
+                "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120"
+            },
+            block_resources=BLOCK_PATTERNS,
+        ).start()
+
+        # Giữ riêng 1 context cho trang danh sách trong suốt lượt chạy
+        listing = await pool.acquire()
+        page = TELEMETRY.attach_page(await listing.page())
+        with TELEMETRY.timer("nav_seconds", CITY_URL):
+            await RETRY.run(CITY_URL, lambda: page.goto(CITY_URL, timeout=60000), LIMITER)
+        with TELEMETRY.timer("wait_seconds", CITY_URL):
+            await page.wait_for_selector(SEL_CARD)
 
         hotel_id = 1
-        room_id = 1
         processed = 0
 
-        while True:
-            cards = page.locator(SEL_CARD)
-            total = await cards.count()
-
-            # Thu thập thông tin hotels trong batch
-            hotels_batch = []
-            for i in range(processed, total):
-                card = cards.nth(i)
-                await card.scroll_into_view_if_needed()
-                await asyncio.sleep(0.4)
-
-                name = await card.locator(".pdv__hotel--name").inner_text()
-                link = await card.evaluate("el => el.closest('a')?.href || ''")
-                
-                if link:
-                    hotels_batch.append((name, link))
-                    print(f"\n🏨 [{hotel_id + len(hotels_batch) - 1}] {name}")
-
-            # Xử lý theo batch song song
-            if hotels_batch:
-                for i in range(0, len(hotels_batch), MAX_CONCURRENT_TABS):
-                    batch = hotels_batch[i:i + MAX_CONCURRENT_TABS]
-                    print(f"\n⚡ Xử lý {len(batch)} hotels song song...")
-                    hotel_id, room_id = await process_hotels_parallel(
-                        context, batch, hotel_id, room_id
-                    )
-
-            processed = total
-
-            # Check load more
-            if await page.locator(SEL_LOAD_MORE).count() == 0:
-                break
-
-            await page.locator(SEL_LOAD_MORE).click()
-            await page.wait_for_timeout(1500)
+        room_writer = OrderedRoomWriter(room_sink, start_room_id=1)
+        usage = TabUsage(MAX_CONCURRENT_TABS)
+        queue, workers = await start_hotel_workers(
+            lambda hid, name, link: scrape_rooms_pooled(pool, hid, name, link), room_writer, usage
+        )
 
+        try:
+            while True:
+                cards = page.locator(SEL_CARD)
+                total = await cards.count()
+
+                # Mỗi khách sạn vào hàng đợi ngay khi đọc được, tab nào rảnh thì lấy
+                for i in range(processed, total):
+                    card = cards.nth(i)
+                    await card.scroll_into_view_if_needed()
+                    await asyncio.sleep(0.4)
+
+                    name = await card.locator(".pdv__hotel--name").inner_text()
+                    link = await card.evaluate("el => el.closest('a')?.href || ''")
+                    if not link:
+                        continue
+
+                    hid = f"IVU_{hotel_id:06d}"
+                    print(f"\n🏨 [{hotel_id}] {name}")
+                    await hotel_sink.put([[hid, name, link]])
+                    await queue.put((hotel_id - 1, hid, name, link))
+                    hotel_id += 1
+
+                processed = total
+
+                # Check load more
+                if await page.locator(SEL_LOAD_MORE).count() == 0:
+                    break
+
+                await page.locator(SEL_LOAD_MORE).click()
+                await page.wait_for_timeout(1500)
+        finally:
+            await stop_hotel_workers(queue, workers)
+            # Dừng giữa chừng vẫn flush hết + đổi tên segment đang ghi; đóng đủ cả 2 sink rồi mới báo lỗi ghi
+            sink_errors = []
+            for sink in (hotel_sink, room_sink):
+                try:
+                    await asyncio.to_thread(sink.close)
+                except RuntimeError as e:
+                    sink_errors.append(e)
+                st = sink.stats()
+                print(f" [sink] {sink.path}: {st['rows_written']} dòng, {st['rows_failed']} dòng lỗi, {st['files']} file")
+            if sink_errors:
+                raise sink_errors[0]
+
+        usage.report()
+        TELEMETRY.observe("tab_utilisation", CITY_URL, usage.utilisation())
+        await pool.release(listing)
+        await pool.close()
         await browser.close()
+        LIMITER.print_report()
+        TELEMETRY.write()
         print("\n🎉 HOÀN THÀNH – GIÁ BẮT BUỘC, OTA → TA → TRUNG BÌNH")
 
 if __name__ == "__main__":
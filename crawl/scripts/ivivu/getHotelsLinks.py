@@ -1,9 +1,19 @@
 import asyncio
 import csv
+import os
+import sys
 from playwright.async_api import async_playwright
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.rate_limit import AdaptiveRateLimiter, RetryPolicy
+from common.row_sink import RowSink
+
 OUTPUT_FILE = "ivivu_multi_city.csv"
 
+# True: đọc lại OUTPUT_FILE (link đã biết + ID lớn nhất), chỉ thêm khách sạn mới;
+# False: xóa file, cào lại từ đầu
+RESUME = True
+
 # ===== CITY URLS =====
 CITY_URLS = {
     "Hồ Chí Minh": "https://www.ivivu.com/khach-san-ho-chi-minh",
@@ -21,114 +31,190 @@ SEL_SCORE_TOTAL = ".rtb__point-total-number"
 SEL_ADDRESS = ".pdv__location-name"
 SEL_LOAD_MORE = "button.rgc__view-more-btn"
 
-
-def init_csv():
-    with open(OUTPUT_FILE, "w", encoding="utf-8-sig", newline="") as f:
-        csv.writer(f).writerow([
-            "ID",
-            "City",
-            "Hotel Name",
-            "Star",
-            "Score",
-            "Rating Text",
-            "Number Rating",
-            "Address",
-            "Hotel Link"
-        ])
-
-
-async def crawl_city(page, city_name, url, start_id):
-    seen_links = set()
-    hotel_id = start_id
+# ===== GIỚI HẠN TỐC ĐỘ + RETRY (common/rate_limit.py) =====
+LIMITER = AdaptiveRateLimiter(rate=0.5, min_rate=0.1, max_rate=2.0)
+RETRY = RetryPolicy(max_attempts=3)
+
+
+COLUMNS = [
+    "ID",
+    "City",
+    "Hotel Name",
+    "Star",
+    "Score",
+    "Rating Text",
+    "Number Rating",
+    "Address",
+    "Hotel Link"
+]
+
+
+def link_key(link):
+    """Link bỏ query/fragment: cùng 1 khách sạn dù tham số tìm kiếm khác nhau."""
+    return link.split("#")[0].split("?")[0].rstrip("/")
+
+
+class HotelRegistry:
+    """
+    Tập link đã biết (bền qua nhiều lượt chạy, đọc lại từ OUTPUT_FILE) + cấp ID dùng chung
+    cho mọi thành phố chạy song song. Chỉ chạy trong 1 event loop nên không cần khóa:
+    claim() kiểm tra, đánh dấu và cấp ID liền một mạch, không có await ở giữa.
+    Link chỉ được đánh dấu khi thẻ đã đọc xong, nên thẻ đọc lỗi vẫn được thử lại ở lần gặp sau.
+    """
+    def __init__(self, path=None):
+        self.seen = set()
+        self.next_id = 1
+        self.known = 0
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8-sig", newline="") as f:
+                for row in csv.DictReader(f):
+                    if row.get("Hotel Link"):
+                        self.seen.add(link_key(row["Hotel Link"]))
+                    try:
+                        self.next_id = max(self.next_id, int(row["ID"].split("_")[-1]) + 1)
+                    except (KeyError, ValueError):
+                        pass
+            self.known = len(self.seen)
+
+    def is_known(self, link):
+        """Link đã có từ lượt trước / thành phố khác (kiểm tra rẻ trước khi đọc thẻ)."""
+        return link_key(link) in self.seen
+
+    def claim(self, link):
+        """Đánh dấu link đã thấy và cấp ID mới; None nếu link đã được nơi khác nhận trước."""
+        key = link_key(link)
+        if key in self.seen:
+            return None
+        self.seen.add(key)
+        hotel_id = self.next_id
+        self.next_id += 1
+        return hotel_id
+
+
+async def crawl_city(page, city_name, url, registry, sink):
+    """Cào 1 thành phố trên page riêng; ID lấy từ registry dùng chung. Trả về số khách sạn mới."""
+    page_links = set()   # link đã gặp trên trang này (để biết khi nào "Xem thêm" hết thẻ mới)
+    added = 0
 
     print(f"\n🚀 BẮT ĐẦU CÀO: {city_name}")
 
-    await page.goto(url, timeout=60000)
+    await RETRY.run(url, lambda: page.goto(url, timeout=60000), LIMITER)
     await page.wait_for_timeout(5000)
 
-    with open(OUTPUT_FILE, "a", encoding="utf-8-sig", newline="") as f:
-        writer = csv.writer(f)
-
-        while True:
-            cards = await page.locator(SEL_CARD).all()
-            new_count = 0
-
-            for card in cards:
-                try:
-                    link = await card.evaluate(
-                        "el => el.closest('a') ? el.closest('a').href : ''"
-                    )
-                    if not link or link in seen_links:
-                        continue
-
-                    seen_links.add(link)
-
-                    name = await card.locator(SEL_NAME).inner_text()
-                    star = await card.locator(SEL_STAR).count()
-
-                    score = await card.locator(SEL_SCORE_NUM).inner_text() \
-                        if await card.locator(SEL_SCORE_NUM).count() else ""
-
-                    rating_text = await card.locator(SEL_SCORE_TEXT).inner_text() \
-                        if await card.locator(SEL_SCORE_TEXT).count() else ""
-
-                    num_rating = 0
-                    if await card.locator(SEL_SCORE_TOTAL).count():
-                        raw = await card.locator(SEL_SCORE_TOTAL).inner_text()
-                        num_rating = int(raw.strip().replace("(", "").replace(")", ""))
-
-                    address = await card.locator(SEL_ADDRESS).get_attribute("title") \
-                        if await card.locator(SEL_ADDRESS).count() else ""
-
-                    writer.writerow([
-                        f"IVU_{hotel_id:06d}",
-                        city_name,
-                        name.strip(),
-                        star,
-                        score.strip(),
-                        rating_text.strip(),
-                        num_rating,
-                        address.strip() if address else "",
-                        link
-                    ])
-
-                    hotel_id += 1
-                    new_count += 1
-
-                except Exception as e:
-                    print("⚠️ Lỗi card:", e)
+    while True:
+        cards = await page.locator(SEL_CARD).all()
+        new_count = 0
+
+        for card in cards:
+            link = None
+            try:
+                link = await card.evaluate(
+                    "el => el.closest('a') ? el.closest('a').href : ''"
+                )
+                if not link or link in page_links:
                     continue
 
-            print(f"{city_name}: +{new_count} | Tổng: {len(seen_links)}")
+                page_links.add(link)
+                new_count += 1
+                # Đã biết từ lượt trước hoặc thành phố khác -> không đọc lại thẻ
+                if registry.is_known(link):
+                    continue
 
-            if new_count == 0:
-                print(f">>> Hết khách sạn tại {city_name}")
-                break
+                name = await card.locator(SEL_NAME).inner_text()
+                star = await card.locator(SEL_STAR).count()
 
-            if await page.locator(SEL_LOAD_MORE).count() == 0:
-                print(">>> Không còn nút Xem thêm")
-                break
+                score = await card.locator(SEL_SCORE_NUM).inner_text() \
+                    if await card.locator(SEL_SCORE_NUM).count() else ""
 
-            await page.locator(SEL_LOAD_MORE).click()
-            await page.wait_for_timeout(7000)
+                rating_text = await card.locator(SEL_SCORE_TEXT).inner_text() \
+                    if await card.locator(SEL_SCORE_TEXT).count() else ""
 
-    return hotel_id
+                num_rating = 0
+                if await card.locator(SEL_SCORE_TOTAL).count():
+                    raw = await card.locator(SEL_SCORE_TOTAL).inner_text()
+                    num_rating = int(raw.strip().replace("(", "").replace(")", ""))
+
+                address = await card.locator(SEL_ADDRESS).get_attribute("title") \
+                    if await card.locator(SEL_ADDRESS).count() else ""
+
+                # Chỉ nhận link khi thẻ đã đọc xong; thành phố khác nhận trong lúc đang đọc -> bỏ
+                hotel_id = registry.claim(link)
+                if hotel_id is None:
+                    continue
+                await sink.put([[
+                    f"IVU_{hotel_id:06d}",
+                    city_name,
+                    name.strip(),
+                    star,
+                    score.strip(),
+                    rating_text.strip(),
+                    num_rating,
+                    address.strip() if address else "",
+                    link
+                ]])
+                added += 1
+
+            except Exception as e:
+                print("⚠️ Lỗi card:", e)
+                # Chưa claim -> lượt "Xem thêm" sau (hoặc lần chạy sau) đọc lại thẻ này
+                if link and link in page_links and not registry.is_known(link):
+                    page_links.discard(link)
+                    new_count -= 1
+                continue
+
+        print(f"{city_name}: +{new_count} thẻ | mới {added} | Tổng thẻ: {len(page_links)}")
+
+        if new_count == 0:
+            print(f">>> Hết khách sạn tại {city_name}")
+            break
+
+        if await page.locator(SEL_LOAD_MORE).count() == 0:
+            print(">>> Không còn nút Xem thêm")
+            break
+
+        await LIMITER.acquire(url)
+        await page.locator(SEL_LOAD_MORE).click()
+        await page.wait_for_timeout(7000)
+
+    return added
+
+
+async def crawl_city_in_context(browser, city_name, url, registry, sink):
+    """Mỗi thành phố 1 context riêng (cookie, cache, tab độc lập) để chạy song song."""
+    context = await browser.new_context(viewport={"width": 1280, "height": 900})
+    try:
+        page = await context.new_page()
+        return await crawl_city(page, city_name, url, registry, sink)
+    finally:
+        await context.close()
 
 
 async def main():
-    init_csv()
+    if not RESUME and os.path.exists(OUTPUT_FILE):
+        os.remove(OUTPUT_FILE)
+    registry = HotelRegistry(OUTPUT_FILE)
+    if registry.known:
+        print(f"-> Đã biết {registry.known} khách sạn (ID tiếp theo IVU_{registry.next_id:06d}), chỉ thêm khách sạn mới")
+    sink = RowSink(OUTPUT_FILE, COLUMNS, append=True).start()
 
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=False)
-        page = await browser.new_page(
-            viewport={"width": 1280, "height": 900}
-        )
-
-        hotel_id = 1
-        for city, url in CITY_URLS.items():
-            hotel_id = await crawl_city(page, city, url, hotel_id)
-
-        await browser.close()
+        try:
+            results = await asyncio.gather(
+                *(crawl_city_in_context(browser, city, url, registry, sink) for city, url in CITY_URLS.items()),
+                return_exceptions=True,
+            )
+        finally:
+            await browser.close()
+            # Ném lỗi nếu có dòng không ghi được (không báo "cào xong" khi thiếu dữ liệu)
+            await asyncio.to_thread(sink.close)
+
+        for city, result in zip(CITY_URLS, results):
+            if isinstance(result, Exception):
+                print(f"❌ {city}: {result}")
+            else:
+                print(f"✓ {city}: {result} khách sạn mới")
+        LIMITER.print_report()
         print("\n✅ CÀO XONG TẤT CẢ CITY")
 
 
@@ -1,117 +1,185 @@
+import glob
+import numpy as np
 import pandas as pd
 import os
+import sys
 
-def merge_ivivu_data():
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.row_sink import read_table, iter_table
+
+# Mỗi thành phố 1 cặp ivivu_hotels_<mã>.csv + ivivu_rooms_<mã>.csv
+# (hoặc thư mục cùng tên: đầu ra Parquet / CSV phân vùng của getDetailHotels)
+HOTEL_PATTERN = "ivivu_hotels_*"
+ROOMS_PREFIX = "ivivu_rooms_"
+
+# Cột của merged_rooms.csv, phải khớp ROOM_COLUMNS của getDetailHotels.py. Mọi khúc rooms được
+# đưa về đúng danh sách này trước khi ghi nối (nguồn Parquet có thêm cột phân vùng `city`).
+ROOM_COLUMNS = [
+    "room_id", "hotel_id", "room_name", "price",
+    "area_m2", "bed_type", "max_occupancy",
+    "view", "amenities"
+]
+
+# Tên đầy đủ để in thống kê; mã chưa có ở đây thì in nguyên mã
+CITY_NAMES = {
+    "bd": "Bình Dương",
+    "hcm": "TP.HCM",
+    "vt": "Vũng Tàu",
+}
+
+# Số dòng rooms đọc mỗi lần: bộ nhớ chỉ phụ thuộc số khách sạn + CHUNK_ROWS, không phụ thuộc số phòng
+CHUNK_ROWS = 100_000
+
+def table_path(stem):
+    """<stem>.csv nếu có, không thì thư mục <stem>/; None nếu không có cả hai."""
+    if os.path.isfile(stem + ".csv"):
+        return stem + ".csv"
+    if os.path.isdir(stem):
+        return stem
+    return None
+
+def find_city_sources(src_dir="."):
+    """
+    Tìm mọi thành phố theo glob HOTEL_PATTERN, sắp theo mã.
+    Trả về ([(mã, đường dẫn hotels, đường dẫn rooms), ...], [mã thiếu file rooms]).
     """
-    Gộp các file CSV hotels và rooms từ iVIVU
-    Đánh lại ID mới cho khớp giữa hotels và rooms
+    codes = set()
+    for path in glob.glob(os.path.join(src_dir, HOTEL_PATTERN)):
+        name = os.path.basename(path)
+        if name.endswith(".csv"):
+            name = name[:-4]
+        elif not os.path.isdir(path):
+            continue
+        codes.add(name[len("ivivu_hotels_"):])
+
+    sources, missing = [], []
+    for code in sorted(codes):
+        hotels = table_path(os.path.join(src_dir, f"ivivu_hotels_{code}"))
+        rooms = table_path(os.path.join(src_dir, f"{ROOMS_PREFIX}{code}"))
+        if rooms is None:
+            missing.append(code)
+        else:
+            sources.append((code, hotels, rooms))
+    return sources, missing
+
+def new_ids(prefix, start, n):
+    """prefix + số thứ tự start..start+n-1 đệm 6 chữ số (vector, không vòng for Python)."""
+    return np.char.add(prefix, np.char.zfill(np.arange(start, start + n).astype(str), 6))
+
+def merge_city_files(src_dir=".", out_dir=".", chunk_rows=CHUNK_ROWS):
     """
-    
+    Gộp hotels + rooms iVIVU của mọi thành phố tìm được trong src_dir.
+    Hotels (nhỏ) đọc hết để đánh id mới; rooms đi qua từng khúc chunk_rows dòng:
+    map hotel_id bằng bảng ánh xạ, đánh room_id mới theo thứ tự, ghi nối vào merged_rooms.csv.
+    Trả về (all_hotels, đường dẫn merged_rooms.csv, thống kê rooms).
+    """
+    sources, missing = find_city_sources(src_dir)
+    for code in missing:
+        print(f"⚠ Bỏ qua {code}: thiếu file {ROOMS_PREFIX}{code}")
+    if not sources:
+        raise FileNotFoundError(f"Không tìm thấy cặp file hotels/rooms nào trong {src_dir}")
+
     # Đọc các file hotels
-    print("Đang đọc các file hotels...")
-    hotels_bd = pd.read_csv('ivivu_hotels_bd.csv')
-    hotels_hcm = pd.read_csv('ivivu_hotels_hcm.csv')
-    hotels_vt = pd.read_csv('ivivu_hotels_vt.csv')
-    
-    # Đọc các file rooms
-    print("Đang đọc các file rooms...")
-    rooms_bd = pd.read_csv('ivivu_rooms_bd.csv')
-    rooms_hcm = pd.read_csv('ivivu_rooms_hcm.csv')
-    rooms_vt = pd.read_csv('ivivu_rooms_vt.csv')
-    
-    # Gộp tất cả hotels
-    print("\nGộp hotels...")
-    all_hotels = pd.concat([hotels_bd, hotels_hcm, hotels_vt], ignore_index=True)
-    
-    # Tạo mapping từ hotel_id cũ sang hotel_id mới
-    hotel_id_mapping = {}
-    for idx, old_id in enumerate(all_hotels['hotel_id']):
-        new_id = f"IVU_HOTEL_{str(idx + 1).zfill(6)}"
-        hotel_id_mapping[old_id] = new_id
-    
-    # Đánh lại hotel_id mới
-    all_hotels['hotel_id'] = all_hotels['hotel_id'].map(hotel_id_mapping)
-    
-    # Gộp tất cả rooms
+    print(f"Đang đọc hotels của {len(sources)} thành phố: {', '.join(code for code, _, _ in sources)}")
+    frames = []
+    for code, hotels_path, _ in sources:
+        df = read_table(hotels_path)
+        df["_city_code"] = code
+        frames.append(df)
+    all_hotels = pd.concat(frames, ignore_index=True)
+
+    # Bảng ánh xạ: MultiIndex (mã thành phố, hotel_id cũ) -> hotel_id mới
+    old_keys = pd.MultiIndex.from_arrays([all_hotels["_city_code"], all_hotels["hotel_id"]])
+    all_hotels["hotel_id"] = new_ids("IVU_HOTEL_", 1, len(all_hotels))
+    id_map = pd.Series(all_hotels["hotel_id"].values, index=old_keys)
+    id_map = id_map[~id_map.index.duplicated(keep="first")]
+    hotel_counts = all_hotels["_city_code"].value_counts()
+    all_hotels = all_hotels.drop(columns="_city_code")
+
+    os.makedirs(out_dir, exist_ok=True)
+    hotels_out = os.path.join(out_dir, "merged_hotels.csv")
+    rooms_out = os.path.join(out_dir, "merged_rooms.csv")
+    all_hotels.to_csv(hotels_out, index=False, encoding="utf-8-sig")
+
+    # Gộp rooms theo từng khúc
     print("Gộp rooms...")
-    all_rooms = pd.concat([rooms_bd, rooms_hcm, rooms_vt], ignore_index=True)
-    
-    # Cập nhật hotel_id trong rooms theo mapping
-    all_rooms['hotel_id'] = all_rooms['hotel_id'].map(hotel_id_mapping)
-    
-    # Đánh lại room_id mới
-    all_rooms['room_id'] = [f"IVU_ROOM_{str(i + 1).zfill(6)}" for i in range(len(all_rooms))]
-    
+    room_counts, missing_rooms = {}, 0
+    next_room = 1
+    header = True
+    if os.path.exists(rooms_out):
+        os.remove(rooms_out)
+    for code, _, rooms_path in sources:
+        city_map = id_map.xs(code, level=0) if code in hotel_counts.index else pd.Series(dtype=object)
+        room_counts[code] = 0
+        for chunk in iter_table(rooms_path, chunksize=chunk_rows):
+            chunk["hotel_id"] = chunk["hotel_id"].map(city_map)
+            chunk["room_id"] = new_ids("IVU_ROOM_", next_room, len(chunk))
+            missing_rooms += int(chunk["hotel_id"].isna().sum())
+            chunk = chunk.reindex(columns=ROOM_COLUMNS)
+            chunk.to_csv(rooms_out, mode="w" if header else "a", header=header,
+                         index=False, encoding="utf-8-sig" if header else "utf-8")
+            header = False
+            next_room += len(chunk)
+            room_counts[code] += len(chunk)
+    total_rooms = next_room - 1
+
     # Thống kê
     print("\n" + "="*60)
     print("THỐNG KÊ")
     print("="*60)
     print(f"Tổng số hotels: {len(all_hotels)}")
-    print(f"  - Bình Dương: {len(hotels_bd)}")
-    print(f"  - TP.HCM: {len(hotels_hcm)}")
-    print(f"  - Vũng Tàu: {len(hotels_vt)}")
-    print(f"\nTổng số rooms: {len(all_rooms)}")
-    print(f"  - Bình Dương: {len(rooms_bd)}")
-    print(f"  - TP.HCM: {len(rooms_hcm)}")
-    print(f"  - Vũng Tàu: {len(rooms_vt)}")
+    for code, _, _ in sources:
+        print(f"  - {CITY_NAMES.get(code, code)}: {hotel_counts.get(code, 0)}")
+    print(f"\nTổng số rooms: {total_rooms}")
+    for code, _, _ in sources:
+        print(f"  - {CITY_NAMES.get(code, code)}: {room_counts[code]}")
     print("="*60)
-    
-    # Lưu file kết quả
-    print("\nĐang lưu files...")
-    all_hotels.to_csv('merged_hotels.csv', index=False, encoding='utf-8-sig')
-    all_rooms.to_csv('merged_rooms.csv', index=False, encoding='utf-8-sig')
-    
-    print("✓ Đã lưu: merged_hotels.csv")
-    print("✓ Đã lưu: merged_rooms.csv")
-    
+
+    print(f"✓ Đã lưu: {hotels_out}")
+    print(f"✓ Đã lưu: {rooms_out}")
+
     # Preview kết quả
     print("\n" + "="*60)
     print("PREVIEW HOTELS (5 dòng đầu)")
     print("="*60)
-    print(all_hotels[['hotel_id', 'city', 'hotel_name']].head())
-    
+    print(all_hotels[[c for c in ("hotel_id", "city", "hotel_name") if c in all_hotels.columns]].head())
+
     print("\n" + "="*60)
     print("PREVIEW ROOMS (5 dòng đầu)")
     print("="*60)
-    print(all_rooms[['room_id', 'hotel_id', 'room_name', 'price']].head())
-    
-    # Kiểm tra mapping
+    if os.path.exists(rooms_out):
+        print(pd.read_csv(rooms_out, nrows=5)[["room_id", "hotel_id", "room_name", "price"]])
+
+    # Kiểm tra mapping (đếm trong lúc gộp, không phải đọc lại rooms)
     print("\n" + "="*60)
     print("KIỂM TRA MAPPING")
     print("="*60)
-    missing_hotels = all_rooms[~all_rooms['hotel_id'].isin(all_hotels['hotel_id'])]
-    if len(missing_hotels) == 0:
+    if missing_rooms == 0:
         print("✓ Tất cả rooms đều có hotel_id hợp lệ")
     else:
-        print(f"⚠ Có {len(missing_hotels)} rooms không khớp với hotel_id")
-    
-    return all_hotels, all_rooms
+        print(f"⚠ Có {missing_rooms} rooms không khớp với hotel_id")
+
+    return all_hotels, rooms_out, {"rooms": total_rooms, "rooms_by_city": room_counts, "unmatched_rooms": missing_rooms}
+
+
+def merge_ivivu_data(src_dir=".", out_dir=".", chunk_rows=CHUNK_ROWS):
+    """
+    Như merge_city_files, giữ cách trả về cũ (all_hotels, all_rooms) nhưng all_rooms giờ là
+    đường dẫn merged_rooms.csv: rooms được gộp theo khúc nên không còn nằm trong bộ nhớ,
+    cần thì đọc lại bằng pd.read_csv / iter_table.
+    """
+    all_hotels, rooms_out, _ = merge_city_files(src_dir, out_dir, chunk_rows)
+    return all_hotels, rooms_out
 
 
 if __name__ == "__main__":
     try:
-        # Kiểm tra các file có tồn tại không
-        required_files = [
-            'ivivu_hotels_bd.csv',
-            'ivivu_hotels_hcm.csv',
-            'ivivu_hotels_vt.csv',
-            'ivivu_rooms_bd.csv',
-            'ivivu_rooms_hcm.csv',
-            'ivivu_rooms_vt.csv'
-        ]
-        
-        missing_files = [f for f in required_files if not os.path.exists(f)]
-        
-        if missing_files:
-            print("❌ THIẾU CÁC FILE SAU:")
-            for f in missing_files:
-                print(f"  - {f}")
-            print("\nVui lòng đảm bảo tất cả files ở cùng thư mục với script!")
-        else:
-            hotels, rooms = merge_ivivu_data()
-            print("\n✅ HOÀN THÀNH!")
-            
+        hotels, rooms = merge_ivivu_data()
+        print("\n✅ HOÀN THÀNH!")
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        print("\nCần các cặp file ivivu_hotels_<mã>.csv + ivivu_rooms_<mã>.csv (hoặc thư mục cùng tên) trong thư mục hiện tại!")
     except Exception as e:
         print(f"\n❌ LỖI: {str(e)}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from lxml import html as lxml_html
+
+from getDetailHotels import EXTRACT_ROOMS_BULK_JS, PRICES_JS
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from reextract import parse_ivivu_rooms
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "hotel_rooms.html")
+ENTRY = {"url": "https://www.ivivu.com/khach-san-da-nang/bien-xanh", "meta": {"hotel_id": "HOTEL_000007"}}
+DETAILS = ["area_m2", "bed_type", "max_occupancy", "view", "amenities"]
+
+# Kết quả tính tay theo PRICES_JS + EXTRACT_ROOMS_BULK_JS; room-class-505 không giá nên không có dòng
+EXPECTED = [
+    {"room_block": "room-class-101", "room_name": "Phòng Deluxe Double", "price": 1100000,
+     "area_m2": "25 m²", "bed_type": "1 giường đôi", "max_occupancy": "2", "view": "Hướng thành phố",
+     "amenities": "Wi-Fi; Hướng thành phố", "detail_source": "embedded"},
+    {"room_block": "room-class-202", "room_name": "Suite hướng biển", "price": 2500000,
+     "area_m2": "40m2", "bed_type": "1 giường King", "max_occupancy": "3", "view": "",
+     "amenities": "Bồn tắm; Ban công", "detail_source": "embedded"},
+    {"room_block": "room-class-303", "room_name": "Family", "price": 900000,
+     "area_m2": "35 m²", "bed_type": "2 giường đôi", "max_occupancy": "", "view": "Hướng vườn",
+     "amenities": "35 m²; 2 giường đôi; Hướng vườn", "detail_source": "embedded"},
+    # Lúc cào khối này phải mở modal -> snapshot không có chi tiết
+    {"room_block": "room-class-404", "room_name": "Standard", "price": 700000,
+     "area_m2": "", "bed_type": "", "max_occupancy": "", "view": "", "amenities": "", "detail_source": ""},
+]
+
+
+def load_fixture():
+    with open(FIXTURE, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_offline_parser_follows_live_room_rules():
+    rows = parse_ivivu_rooms(lxml_html.fromstring(load_fixture()), ENTRY)
+    assert [{k: v for k, v in row.items() if k != "hotel_id"} for row in rows] == EXPECTED
+    assert {row["hotel_id"] for row in rows} == {"HOTEL_000007"}
+
+
+def test_sold_out_page_has_no_rows():
+    page = load_fixture().replace("<body>", "<body><p>Rất tiếc, iVIVU không còn phòng trống</p>", 1)
+    assert parse_ivivu_rooms(lxml_html.fromstring(page), ENTRY) == []
+
+
+def run_live_extractor(page_html):
+    playwright = pytest.importorskip("playwright.async_api")
+
+    async def main():
+        async with playwright.async_playwright() as p:
+            try:
+                browser = await p.chromium.launch()
+            except Exception as e:
+                pytest.skip(f"Không mở được Chromium: {str(e).splitlines()[0]}")
+            page = await browser.new_page()
+            await page.set_content(page_html)
+            prices = await page.evaluate(PRICES_JS)
+            rooms = await page.evaluate(EXTRACT_ROOMS_BULK_JS, {"modalTimeout": 50, "prices": prices})
+            await browser.close()
+            return prices, rooms
+
+    return asyncio.run(main())
+
+
+def test_offline_parser_matches_live_extractor():
+    page_html = load_fixture()
+    prices, rooms = run_live_extractor(page_html)
+    offline = parse_ivivu_rooms(lxml_html.fromstring(page_html), ENTRY)
+    assert [row["price"] for row in offline] == [p for p in prices if p is not None]
+
+    # Như extract_rooms_bulk: chỉ khối có giá và có chi tiết mới thành dòng
+    live = [[data["name"], price, data["area"], data["bed"], data["maxOcc"], data["view"], data["amenities"]]
+            for price, data in zip(prices, rooms) if price is not None and data.get("source")]
+    assert [[row["room_name"], row["price"]] + [row[k] for k in DETAILS]
+            for row in offline if row["detail_source"]] == live
@@ -0,0 +1,36 @@
+import csv
+
+from getHotelsLinks import COLUMNS, HotelRegistry, link_key
+
+
+def test_link_key_ignores_query_and_fragment():
+    assert link_key("https://www.ivivu.com/khach-san-a/?ci=1#rooms") == "https://www.ivivu.com/khach-san-a"
+
+
+def test_claim_allocates_sequential_ids_once_per_hotel():
+    registry = HotelRegistry()
+    assert not registry.is_known("https://h/a")
+    assert registry.claim("https://h/a?x=1") == 1
+    assert registry.is_known("https://h/a")
+    assert registry.claim("https://h/a#y") is None
+    assert registry.claim("https://h/b") == 2
+
+
+def test_unclaimed_link_stays_unknown():
+    # Đọc thẻ lỗi trước khi claim -> link vẫn chưa biết, lần sau đọc lại được
+    registry = HotelRegistry()
+    registry.is_known("https://h/a")
+    assert registry.claim("https://h/a") == 1
+
+
+def test_registry_resumes_from_output_file(tmp_path):
+    path = tmp_path / "links.csv"
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerow(["IVU_000007", "Vũng Tàu", "A", 3, "", "", 0, "", "https://h/a?ci=1"])
+        writer.writerow(["IVU_000003", "Vũng Tàu", "B", 3, "", "", 0, "", "https://h/b"])
+    registry = HotelRegistry(str(path))
+    assert registry.known == 2
+    assert registry.claim("https://h/a") is None
+    assert registry.claim("https://h/c") == 8
@@ -0,0 +1,78 @@
+import pandas as pd
+import pytest
+
+from ghepfile import ROOM_COLUMNS, find_city_sources, merge_city_files, merge_ivivu_data, new_ids
+
+
+def write_city(src, code, hotels, rooms):
+    pd.DataFrame(hotels, columns=["hotel_id", "hotel_name", "hotel_link"]).to_csv(
+        src / f"ivivu_hotels_{code}.csv", index=False, encoding="utf-8-sig")
+    pd.DataFrame(rooms, columns=ROOM_COLUMNS).to_csv(
+        src / f"ivivu_rooms_{code}.csv", index=False, encoding="utf-8-sig")
+
+
+def room(room_id, hotel_id, name):
+    return [room_id, hotel_id, name, 100, "20 m²", "1 giường", 2, "", ""]
+
+
+def test_new_ids_are_zero_padded():
+    assert list(new_ids("IVU_ROOM_", 9, 3)) == ["IVU_ROOM_000009", "IVU_ROOM_000010", "IVU_ROOM_000011"]
+
+
+def test_find_city_sources_reports_missing_rooms(tmp_path):
+    write_city(tmp_path, "hcm", [], [])
+    (tmp_path / "ivivu_hotels_vt.csv").write_text("hotel_id\n")
+    sources, missing = find_city_sources(str(tmp_path))
+    assert [code for code, _, _ in sources] == ["hcm"]
+    assert missing == ["vt"]
+
+
+def test_merge_maps_same_old_ids_per_city(tmp_path):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    # Cả 2 thành phố đều dùng HOTEL_000001: phải map theo (mã thành phố, id cũ)
+    write_city(src, "hcm", [["HOTEL_000001", "A", "a"], ["HOTEL_000002", "B", "b"]],
+               [room("R1", "HOTEL_000002", "x"), room("R2", "HOTEL_000001", "y")])
+    write_city(src, "vt", [["HOTEL_000001", "C", "c"]],
+               [room("R1", "HOTEL_000001", "z"), room("R2", "HOTEL_000009", "orphan")])
+
+    hotels, rooms_path, stats = merge_city_files(str(src), str(out), chunk_rows=1)
+
+    assert hotels["hotel_id"].tolist() == ["IVU_HOTEL_000001", "IVU_HOTEL_000002", "IVU_HOTEL_000003"]
+    assert rooms_path == str(out / "merged_rooms.csv")
+    rooms = pd.read_csv(rooms_path)
+    assert rooms.columns.tolist() == ROOM_COLUMNS
+    assert rooms["room_id"].tolist() == [f"IVU_ROOM_{i:06d}" for i in range(1, 5)]
+    assert rooms["hotel_id"].tolist()[:3] == ["IVU_HOTEL_000002", "IVU_HOTEL_000001", "IVU_HOTEL_000003"]
+    assert pd.isna(rooms["hotel_id"].iloc[3])
+    assert stats == {"rooms": 4, "rooms_by_city": {"hcm": 2, "vt": 2}, "unmatched_rooms": 1}
+
+
+def test_merge_mixed_csv_and_parquet_keeps_columns_aligned(tmp_path):
+    pytest.importorskip("pyarrow")
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    write_city(src, "hcm", [["HOTEL_000001", "A", "a"]], [room("R1", "HOTEL_000001", "csv room")])
+    # Thành phố thứ 2 là đầu ra Parquet phân vùng của getDetailHotels (thêm cột city)
+    pd.DataFrame([["HOTEL_000001", "B", "b"]], columns=["hotel_id", "hotel_name", "hotel_link"]).to_csv(
+        src / "ivivu_hotels_vt.csv", index=False)
+    rooms_dir = src / "ivivu_rooms_vt" / "city=vung-tau"
+    rooms_dir.mkdir(parents=True)
+    parquet = pd.DataFrame([room("R1", "HOTEL_000001", "parquet room")], columns=ROOM_COLUMNS).astype(str)
+    parquet.to_parquet(rooms_dir / "part-1-00001.parquet", index=False)
+
+    merge_ivivu_data(str(src), str(out))
+
+    rooms = pd.read_csv(out / "merged_rooms.csv")
+    assert rooms.columns.tolist() == ROOM_COLUMNS
+    assert rooms["room_name"].tolist() == ["csv room", "parquet room"]
+    assert rooms["hotel_id"].tolist() == ["IVU_HOTEL_000001", "IVU_HOTEL_000002"]
+
+
+def test_merge_ivivu_data_keeps_two_value_return(tmp_path):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    write_city(src, "hcm", [["HOTEL_000001", "A", "a"]], [room("R1", "HOTEL_000001", "x")])
+    hotels, rooms = merge_ivivu_data(str(src), str(out))
+    assert hotels["hotel_id"].tolist() == ["IVU_HOTEL_000001"]
+    assert pd.read_csv(rooms)["room_id"].tolist() == ["IVU_ROOM_000001"]
@@ -1,4 +1,6 @@
+import os
 import re
+import sys
 import time
 from urllib.parse import urljoin, urlparse
 
@@ -8,6 +10,11 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, StaleElementReferenceException, ElementClickInterceptedException
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.rate_limit import RetryPolicy
+
+RETRY = RetryPolicy(max_attempts=3)
+
 LIST_URL = "https://mytour.vn/khach-san/search?aliasCode=tp33&travellerType=1&childrenAges=&adults=2&rooms=1&children=0&checkIn=21-12-2025&checkOut=22-12-2025"
 
 def is_hotel_detail_link(url: str) -> bool:
@@ -65,7 +72,7 @@ def main():
 
     driver = webdriver.Chrome(options=options)
     try:
-        driver.get(LIST_URL)
+        RETRY.run_sync(LIST_URL, lambda: driver.get(LIST_URL))
         time.sleep(2)
 
         # Click "Xem thêm..." cho tới khi hết
@@ -0,0 +1,121 @@
+"""
+Benchmark cách tải trang khách sạn Mytour trên 1 site giả lập chạy ở localhost.
+
+Site giả lập:
+    /khach-san/<i>.html  -> trang khách sạn có h1, điểm, số đánh giá, địa chỉ ("Xem bản đồ"),
+                            giảm giá, giá và tiện nghi theo layout mà extract_* đang đọc
+Mỗi request trễ `--latency` giây để giống mạng thật.
+
+So sánh:
+    tuần tự      : 1 worker (thứ tự như chế độ selenium, chưa tính chờ cố định)
+    http / playwright với --workers worker song song (FETCH_MODE mới)
+và in ước tính cách cũ = tuần tự + (WAIT_AFTER_OPEN + 2 lần scroll 1s) mỗi trang.
+Kết quả parse được kiểm tra với dữ liệu sinh ra (tên + giá).
+
+Chạy:
+    python bench_fetch.py --hotels 60 --latency 0.3 --workers 6 --modes http playwright
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import scrape_hotels as mt
+from common.rate_limit import AdaptiveRateLimiter
+
+
+def fixture(i):
+    price = 800_000 + i * 12_345
+    return {"name": f"Khách sạn Fixture {i}", "price": f"{price:,}".replace(",", ".") + " ₫",
+            "discount": f"-{i % 30 + 5}%"}
+
+
+def render_hotel(i):
+    f = fixture(i)
+    amenities = "".join(
+        f'<div class="jss369"><div class="jss372"></div><div class="jss373">{a}</div></div>'
+        for a in ("Wi-Fi miễn phí", "Hồ bơi", "Bãi đỗ xe", "Nhà hàng", "Lễ tân 24 giờ")
+    )
+    return f"""<!DOCTYPE html><html><head><title>{f['name']}</title></head><body>
+<header><nav>{"<a href='#'>Menu</a>" * 40}</nav></header>
+<h1 class="MuiBox-root">{f['name']}</h1>
+<div><span><svg></svg>{8 + i % 2}.{i % 10}</span><span>{100 + i} đánh giá</span></div>
+<div><span>{i} Nguyễn Huệ, Quận 1, Hồ Chí Minh, Việt Nam</span><button>Xem bản đồ</button></div>
+<div><span>{f['discount']}</span><span>{f['price']}</span></div>
+<section>{amenities}</section>
+<footer>{"<p>Chính sách, điều khoản và liên hệ Mytour.</p>" * 60}</footer>
+</body></html>"""
+
+
+def start_fixture_site(latency):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            try:
+                i = int(self.path.rsplit("/", 1)[-1].split(".")[0])
+            except ValueError:
+                self.send_error(404)
+                return
+            data = render_hotel(i).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_mode(mode, urls, workers):
+    # Limiter không giới hạn tốc độ: đo riêng phần tải + parse
+    limiter = AdaptiveRateLimiter(rate=1000, max_rate=1000, burst=workers,
+                                  concurrency=workers, max_concurrency=workers)
+    t0 = time.monotonic()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = await mt.scrape_async(urls, mode=mode, workers=workers, limiter=limiter)
+    elapsed = time.monotonic() - t0
+    ok = sum(1 for i, row in enumerate(rows) if row["ten"] == fixture(i)["name"]
+             and row["gia_niem_yet"] == fixture(i)["price"])
+    return {"mode": f"{mode} x{workers}", "pages": len(rows), "ok": ok,
+            "seconds": round(elapsed, 2), "pages_per_s": round(len(rows) / elapsed, 1)}
+
+
+async def main(args):
+    server = start_fixture_site(args.latency)
+    urls = [f"http://127.0.0.1:{server.server_port}/khach-san/{i}.html" for i in range(args.hotels)]
+    results = []
+    try:
+        for mode in args.modes:
+            for workers in (1, args.workers):
+                try:
+                    results.append(await run_mode(mode, urls, workers))
+                except Exception as e:
+                    print(f"! Bỏ qua {mode} x{workers}: {e}")
+    finally:
+        server.shutdown()
+
+    print("\n=== KẾT QUẢ ===")
+    for r in results:
+        print(f"{r['mode']:>14}: {r['pages']} trang ({r['ok']} đúng) trong {r['seconds']}s -> {r['pages_per_s']} trang/s")
+    serial = next((r for r in results if r["mode"].endswith("x1")), None)
+    if serial:
+        fixed = args.hotels * (mt.WAIT_AFTER_OPEN + 2)
+        print(f"{'cách cũ (ước tính)':>14}: {serial['seconds'] + fixed:.1f}s "
+              f"(tuần tự + {mt.WAIT_AFTER_OPEN}s + 2×1s chờ cố định mỗi trang)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hotels", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--workers", type=int, default=6)
+    parser.add_argument("--modes", nargs="+", default=["http", "playwright"], choices=["http", "playwright"])
+    asyncio.run(main(parser.parse_args()))
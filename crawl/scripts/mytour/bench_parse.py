@@ -0,0 +1,92 @@
+"""
+Benchmark chi phí parse 1 trang khách sạn Mytour (không tính thời gian tải).
+
+Nguồn trang:
+    --archive DIR : các snapshot mytour/hotel trong kho SnapshotArchive (SNAPSHOT_DIR của scrape_hotels.py)
+    không có      : trang giả lập của bench_fetch.py, thêm --pad khối div/span lồng nhau cho
+                    gần kích thước trang Mytour thật (vài trăm KB)
+
+So sánh PARSER_BACKEND:
+    legacy : BeautifulSoup + từng extract_* (cách cũ, mỗi trường đi lại cả cây)
+    bs4    : BeautifulSoup, quét 1 lượt
+    lxml   : lxml.html, quét 1 lượt
+In ms/trang (trung vị qua --repeat lần) và số trang cho kết quả khác legacy.
+
+Chạy:
+    python bench_parse.py --archive ../snapshots --limit 200
+    python bench_parse.py --pages 30 --pad 400
+"""
+import argparse
+import statistics
+import time
+
+import scrape_hotels as mt
+from common.snapshot_archive import iter_index, read_snapshot
+from bench_fetch import render_hotel
+
+BACKENDS = ("legacy", "bs4", "lxml")
+
+
+def padded_page(i, pad):
+    # Khối lặp kiểu MUI: div lồng sâu, span ngắn, vài svg -- phần lớn trang thật là như vậy
+    block = ('<div class="MuiBox-root"><div class="MuiGrid-item"><div><span>Phòng Deluxe</span>'
+             '<span><svg></svg>2 khách</span><div><span>Miễn phí hủy phòng</span>'
+             '<span>Bao gồm bữa sáng</span></div></div></div></div>')
+    html = render_hotel(i)
+    return html.replace("<footer>", f"<main>{block * pad}</main><footer>", 1)
+
+
+def load_pages(args):
+    if args.archive:
+        pages = []
+        for entry in iter_index(args.archive, source="mytour", kind="hotel"):
+            pages.append((entry.get("url", ""), read_snapshot(args.archive, entry)))
+            if args.limit and len(pages) >= args.limit:
+                break
+        if pages:
+            return pages, f"kho {args.archive}"
+        print(f"! {args.archive} không có snapshot mytour/hotel -> dùng trang giả lập")
+    return ([(f"fixture-{i}", padded_page(i, args.pad)) for i in range(args.pages)],
+            f"giả lập (pad={args.pad})")
+
+
+def bench(pages, backend, repeat):
+    per_page = []
+    rows = []
+    for url, html in pages:
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            row = mt.parse_hotel(html, url, backend)
+            times.append(time.perf_counter() - t0)
+        per_page.append(statistics.median(times))
+        rows.append(row)
+    return per_page, rows
+
+
+def main(args):
+    pages, label = load_pages(args)
+    kb = sum(len(html.encode("utf-8")) for _, html in pages) / len(pages) / 1024
+    print(f"{len(pages)} trang từ {label}, trung bình {kb:.0f} KB/trang, lặp {args.repeat} lần mỗi trang")
+
+    results = {b: bench(pages, b, args.repeat) for b in BACKENDS}
+    legacy_rows = results["legacy"][1]
+    base = statistics.mean(results["legacy"][0])
+
+    print("\n=== KẾT QUẢ ===")
+    for backend in BACKENDS:
+        per_page, rows = results[backend]
+        mean = statistics.mean(per_page)
+        diff = sum(1 for a, b in zip(rows, legacy_rows) if a != b)
+        print(f"{backend:>7}: {mean * 1000:7.2f} ms/trang (p95 {sorted(per_page)[int(len(per_page) * 0.95) - 1] * 1000:.2f})"
+              f" | x{base / mean:.1f} so với legacy | {diff} trang khác legacy")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--archive", default=None)
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--pad", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=3)
+    main(parser.parse_args())
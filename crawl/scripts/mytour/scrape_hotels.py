@@ -1,20 +1,72 @@
+import asyncio
+import os
 import re
+import sys
 import time
 import pandas as pd
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeout
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    import lxml.html as lxml_html
+    from lxml import etree
+except ImportError:
+    lxml_html = etree = None
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.browser_pool import BrowserPool, BLOCK_IMAGES
+from common.snapshot_archive import SnapshotArchive
+from common.telemetry import Telemetry
+from common.rate_limit import AdaptiveRateLimiter, RetryPolicy, ThrottledError, THROTTLE_STATUSES
 
 
 # ================== CẤU HÌNH ==================
 INPUT_LINKS_TXT = "mytour_links.txt"   # mỗi dòng 1 link khách sạn
 OUT_CSV = "mytour_hotels.csv"
 
-WAIT_AFTER_OPEN = 5      # vào trang chờ 5s rồi mới lấy dữ liệu
-WAIT_BEFORE_NEXT = 5     # lấy xong chờ 5s rồi mới sang trang khác
+# Cách tải trang:
+#   "selenium"   : 1 cửa sổ Chrome, tuần tự, chờ cố định WAIT_AFTER_OPEN + 2 lần scroll (như cũ)
+#   "playwright" : ASYNC_WORKERS page Playwright song song, chờ theo điều kiện (h1 + giá) thay vì sleep
+#   "http"       : ASYNC_WORKERS request aiohttp song song (trang Mytour render sẵn phía server,
+#                  cần pip install aiohttp)
+FETCH_MODE = "selenium"
+ASYNC_WORKERS = 4
+READY_TIMEOUT_MS = 15000    # chờ h1 / giá tối đa (playwright)
+NETWORK_IDLE_MS = 3000      # sau khi scroll, chờ mạng yên tối đa (khối tiện nghi tải muộn)
+HTTP_TIMEOUT_S = 30
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Accept-Language": "vi-VN,vi;q=0.9,en;q=0.8",
+}
+
+# Parse HTML -> 1 dòng:
+#   "lxml"   : cây lxml.html (không dựng BeautifulSoup), quét 1 lượt -- nhanh nhất, cần lxml
+#   "bs4"    : cây BeautifulSoup, quét 1 lượt
+#   "legacy" : BeautifulSoup + từng extract_* (mỗi trường đi lại cả cây, như cũ)
+# Ba cách cho cùng kết quả; so tốc độ bằng bench_parse.py
+PARSER_BACKEND = "lxml"
+
+WAIT_AFTER_OPEN = 5      # (selenium) vào trang chờ 5s rồi mới lấy dữ liệu
+SNAPSHOT_DIR = None      # vd "snapshots": lưu HTML thô (nén) để re-extract offline bằng common/reextract.py
+TELEMETRY = Telemetry("mytour_hotels", out_dir="telemetry")
+
+# Giới hạn tốc độ thích ứng thay cho WAIT_BEFORE_NEXT cố định: bắt đầu 1 trang / 5s,
+# tự tăng khi mytour phản hồi nhanh, giảm khi timeout
+LIMITER = AdaptiveRateLimiter(rate=0.2, min_rate=0.05, max_rate=1.0, max_concurrency=ASYNC_WORKERS,
+                              telemetry=TELEMETRY)
+RETRY = RetryPolicy(max_attempts=3, telemetry=TELEMETRY)
 # ==============================================
 
 
@@ -139,7 +191,6 @@ def extract_prices(soup: BeautifulSoup):
 
     list_price_text = ""
     discount_text = ""
-    current_price_text = ""
 
     # --- 1. Tìm discount ---
     for sp in soup.find_all(["span", "div"]):
@@ -155,33 +206,473 @@ def extract_prices(soup: BeautifulSoup):
         list_price_text = prices[0]   # lấy giá đầu tiên làm giá niêm yết
 
     # --- 3. Tính giá hiện tại ---
-    if list_price_text:
-        # chuyển "2.894.667 ₫" -> 2894667
-        list_price_num = int(
-            list_price_text.replace("₫", "")
-            .replace(".", "")
-            .replace(",", "")
-            .strip()
-        )
+    current_price_text = current_price(list_price_text, discount_text)
+
+    return list_price_text, discount_text, current_price_text
 
-        if discount_text:
-            discount_value = int(discount_text.replace("-", "").replace("%", ""))
-            current_price_num = int(list_price_num * (100 - discount_value) / 100)
+
+def current_price(list_price_text: str, discount_text: str) -> str:
+    """Giá hiện tại = giá niêm yết - giá niêm yết * discount(%), định dạng lại kiểu VNĐ."""
+    if not list_price_text:
+        return ""
+    # chuyển "2.894.667 ₫" -> 2894667
+    list_price_num = int(
+        list_price_text.replace("₫", "")
+        .replace(".", "")
+        .replace(",", "")
+        .strip()
+    )
+
+    if discount_text:
+        discount_value = int(discount_text.replace("-", "").replace("%", ""))
+        current_price_num = int(list_price_num * (100 - discount_value) / 100)
+    else:
+        current_price_num = list_price_num
+
+    # format lại tiền VNĐ
+    return f"{current_price_num:,}".replace(",", ".") + " ₫"
+
+# ================== TRÍCH XUẤT 1 LƯỢT ==================
+# Các extract_* ở trên mỗi hàm tự đi cả cây (find_all span/div, get_text toàn trang) nên 1 trang
+# bị duyệt 4-5 lần. PageScan đi cây đúng 1 lần: thẻ nào đóng lại cũng đã có sẵn text (ghép từ
+# các con, giống get_text(" ", strip=True)) và được chuyển cho các matcher đăng ký theo tên thẻ.
+class _Node:
+    __slots__ = ("tag", "parent", "start", "end", "parts", "text", "svg", "keep", "el")
+
+    def __init__(self, tag, parent, start, el):
+        self.tag = tag
+        self.parent = parent
+        self.start = start      # thứ tự mở thẻ (= thứ tự find_all)
+        self.end = start        # thứ tự của con cháu cuối cùng -> cây con là [start, end]
+        self.parts = []
+        self.text = ""
+        self.svg = False        # cây con có <svg>
+        self.keep = False       # giữ text sau khi đóng (h1, tên tiện nghi, gốc)
+        self.el = el
+
+
+class PageScan:
+    """Trạng thái của 1 lượt quét; row(url) dựng dòng kết quả giống parse_hotel_legacy."""
+
+    def __init__(self, raw_text):
+        self.raw_text = raw_text    # el -> get_text() không tách chuỗi (chỉ gọi cho nút "Xem bản đồ")
+        self.count = 0
+        self.root = None
+        self.h1 = None
+        self.h1_mui = None
+        self.spans = []             # mọi span (đã có text), theo thứ tự đóng
+        self.ratings = []           # span có dạng điểm 0-10
+        self.discount = None        # (start, "-18%") của span/div mở sớm nhất có %
+        self.map_button = None      # button/span/div mở sớm nhất có text "Xem bản đồ"
+        self.amenities = []         # mỗi div.jss369: node div.jss373 đầu tiên bên trong
+        self._open_blocks = []
+
+    def open(self, tag, classes, parent, el):
+        node = _Node(tag, parent, self.count, el)
+        self.count += 1
+        if parent is None:
+            self.root = node
+            node.keep = True
+        for matcher in OPEN_MATCHERS.get(tag, ()):
+            matcher(self, node, classes)
+        return node
+
+    def close(self, node):
+        node.text = text = " ".join(node.parts)
+        node.parts = None
+        node.end = self.count - 1
+        parent = node.parent
+        if parent is not None:
+            if text:
+                parent.parts.append(text)
+            if node.svg or node.tag == "svg":
+                parent.svg = True
+        for matcher in CLOSE_MATCHERS.get(node.tag, ()):
+            matcher(self, node)
+        if not node.keep and node.tag != "span":
+            node.text = None    # text của div lớn chỉ cần tới lúc ghép vào cha
+
+    def row(self, url):
+        full = clean(self.root.text)
+        prices = all_matches(PRICE_RE, full)
+        list_price = prices[0] if prices else ""
+        discount = self.discount[1] if self.discount else ""
+        h1 = self.h1_mui or self.h1
+        return {
+            "link": url,
+            "ten": clean(h1.text) if h1 else "",
+            "gia_niem_yet": list_price,
+            "discount": discount,
+            "gia_hien_tai": current_price(list_price, discount),
+            "dia_chi": self._address(full),
+            "so_luong_danh_gia": _review_count(full),
+            "diem_danh_gia": self._rating(),
+            "tien_nghi": " | ".join(dict.fromkeys(
+                t for t in (clean(n.text) for n in self.amenities if n is not None) if t
+            )),
+        }
+
+    def _rating(self):
+        ratings = sorted(self.ratings, key=lambda n: n.start)
+        for node in ratings:
+            if node.svg or (node.parent is not None and node.parent.svg):
+                return node.text
+        return ratings[0].text if ratings else ""
+
+    def _address(self, full):
+        container = self.map_button.parent if self.map_button else None
+        while container is not None and container.tag != "div":
+            container = container.parent
+        if container is not None:
+            best = None
+            for node in sorted(self.spans, key=lambda n: n.start):
+                if not container.start < node.start <= container.end:
+                    continue
+                t = clean(node.text)
+                if len(t) < 8:
+                    continue
+                score = _address_score(t)
+                if best is None or score > best[0]:
+                    best = (score, t)
+            if best:
+                return best[1]
+        m = re.search(r"([^\n]{10,200}việt nam[^\n]{0,50})", full, flags=re.IGNORECASE)
+        return clean(m.group(1)) if m else ""
+
+
+def _address_score(t):
+    score = 0
+    if "," in t:
+        score += 2
+    if "việt nam" in t.lower():
+        score += 2
+    if "hồ chí minh" in t.lower() or "ho chi minh" in t.lower():
+        score += 2
+    return score + min(len(t) / 50, 2)
+
+
+def _review_count(full):
+    text = full.lower()
+    m = re.search(r"(\d[\d.,]*)\s*đánh\s*giá", text) or re.search(r"(\d[\d.,]*)\s*reviews?", text)
+    return m.group(1).replace(".", "").replace(",", "") if m else ""
+
+
+# --- matcher khi mở thẻ: (scan, node, classes) ---
+def _open_h1(scan, node, classes):
+    node.keep = True
+    if scan.h1 is None:
+        scan.h1 = node
+    if scan.h1_mui is None and "MuiBox-root" in classes:
+        scan.h1_mui = node
+
+
+def _open_amenity(scan, node, classes):
+    if "jss369" in classes:
+        scan._open_blocks.append((node, len(scan.amenities)))
+        scan.amenities.append(None)
+    if "jss373" in classes:
+        node.keep = True
+        for _, i in scan._open_blocks:
+            if scan.amenities[i] is None:
+                scan.amenities[i] = node
+
+
+# --- matcher khi đóng thẻ: (scan, node), node.text đã đủ ---
+def _close_amenity(scan, node):
+    if scan._open_blocks and scan._open_blocks[-1][0] is node:
+        scan._open_blocks.pop()
+
+
+def _match_span(scan, node):
+    scan.spans.append(node)
+    # text đã strip: có khoảng trắng bên trong thì clean() cũng không khớp RATING_RE
+    if RATING_RE.match(node.text) and 0 <= float(node.text) <= 10:
+        scan.ratings.append(node)
+
+
+def _match_discount(scan, node):
+    if "%" not in node.text or (scan.discount and scan.discount[0] < node.start):
+        return
+    m = PERCENT_RE.search(node.text)
+    if m:
+        scan.discount = (node.start, clean(m.group(0)))
+
+
+def _match_map_button(scan, node):
+    # Lọc rẻ trên text đã có (cùng ký tự khác khoảng trắng với get_text()) rồi mới lấy text thô
+    if len(node.text) > 40 or "".join(node.text.split()).lower() != "xembảnđồ":
+        return
+    if scan.map_button and scan.map_button.start < node.start:
+        return
+    if clean(scan.raw_text(node.el)).lower() == "xem bản đồ":
+        scan.map_button = node
+
+
+OPEN_MATCHERS = {"h1": (_open_h1,), "div": (_open_amenity,)}
+CLOSE_MATCHERS = {
+    "span": (_match_span, _match_discount, _match_map_button),
+    "div": (_close_amenity, _match_discount, _match_map_button),
+    "button": (_match_map_button,),
+}
+
+# Chuỗi get_text() bỏ qua (comment, doctype, script/style...) -- bs4 so đúng kiểu, không dùng isinstance
+_BS4_TEXT = (NavigableString, CData)
+_LXML_SKIP = {"script", "style", "template"}
+
+
+def scan_soup(soup):
+    """Quét 1 lượt cây BeautifulSoup."""
+    scan = PageScan(lambda el: el.get_text())
+    stack = [(scan.open("[document]", (), None, soup), iter(soup.contents))]
+    while stack:
+        node, children = stack[-1]
+        for child in children:
+            if isinstance(child, Tag):
+                sub = scan.open(child.name, child.get("class") or (), node, child)
+                stack.append((sub, iter(child.contents)))
+                break
+            if type(child) in _BS4_TEXT:
+                s = child.strip()
+                if s:
+                    node.parts.append(s)
         else:
-            current_price_num = list_price_num
+            stack.pop()
+            scan.close(node)
+    return scan
 
-        # format lại tiền VNĐ
-        current_price_text = f"{current_price_num:,}".replace(",", ".") + " ₫"
 
-    return list_price_text, discount_text, current_price_text
+def _lxml_document(html):
+    if lxml_html is None:
+        raise RuntimeError("Chưa cài lxml: pip install lxml (hoặc PARSER_BACKEND='bs4')")
+    try:
+        return lxml_html.document_fromstring(html)
+    except ValueError:
+        # str có khai báo encoding (<?xml ... encoding=...?>) -> đưa bytes cho lxml
+        return lxml_html.document_fromstring(html.encode("utf-8"),
+                                             parser=lxml_html.HTMLParser(encoding="utf-8"))
+    except etree.ParserError:
+        return None     # trang rỗng
+
+
+def scan_lxml(html):
+    """Quét 1 lượt cây lxml.html (text = el.text + text/tail của các con)."""
+    scan = PageScan(lambda el: el.text_content())
+    root = scan.open("[document]", (), None, None)
+    doc = _lxml_document(html)
+    stack = [(root, iter(() if doc is None else (doc,)), None)]
+    while stack:
+        node, children, el = stack[-1]
+        for child in children:
+            if isinstance(child.tag, str) and child.tag not in _LXML_SKIP:
+                sub = scan.open(child.tag, (child.get("class") or "").split(), node, child)
+                if child.text:
+                    s = child.text.strip()
+                    if s:
+                        sub.parts.append(s)
+                stack.append((sub, iter(child), child))
+                break
+            # comment / script...: bỏ nội dung nhưng giữ phần text theo sau
+            if child.tail:
+                s = child.tail.strip()
+                if s:
+                    node.parts.append(s)
+        else:
+            stack.pop()
+            scan.close(node)
+            if el is not None and el.tail:
+                s = el.tail.strip()
+                if s:
+                    stack[-1][0].parts.append(s)
+    return scan
+
+
+def parse_hotel_legacy(html: str, url: str) -> dict:
+    """Cách cũ: BeautifulSoup + từng extract_* (giữ để đối chiếu trong bench_parse.py)."""
+    soup = BeautifulSoup(html, "lxml" if lxml_html else "html.parser")
+    list_price, discount, now_price = extract_prices(soup)
+    return {
+        "link": url,
+        "ten": extract_hotel_name(soup),
+        "gia_niem_yet": list_price,
+        "discount": discount,
+        "gia_hien_tai": now_price,
+        "dia_chi": extract_address(soup),
+        "so_luong_danh_gia": extract_review_count(soup),
+        "diem_danh_gia": extract_rating_score(soup),
+        "tien_nghi": extract_amenities(soup),
+    }
+
+
+def parse_hotel(html: str, url: str, backend: str = None) -> dict:
+    """HTML 1 trang khách sạn -> 1 dòng kết quả (dùng chung cho mọi FETCH_MODE và reextract)."""
+    backend = backend or PARSER_BACKEND
+    if backend == "lxml":
+        return scan_lxml(html).row(url)
+    if backend == "bs4":
+        return scan_soup(BeautifulSoup(html, "lxml" if lxml_html else "html.parser")).row(url)
+    if backend == "legacy":
+        return parse_hotel_legacy(html, url)
+    raise ValueError(f"PARSER_BACKEND không hợp lệ: {backend}")
+
 
 def load_links_from_txt(path: str):
     with open(path, "r", encoding="utf-8") as f:
         return [line.strip() for line in f if line.strip()]
 
 
+def print_row(i, total, row):
+    print(
+        f"[{i}/{total}] OK | {row['ten']} | "
+        f"list={row['gia_niem_yet']} | disc={row['discount']} | now={row['gia_hien_tai']} | "
+        f"rating={row['diem_danh_gia']} | reviews={row['so_luong_danh_gia']}"
+    )
+
+
+def save_rows(rows, path=OUT_CSV):
+    if rows:
+        pd.DataFrame(rows).to_csv(
+            path,
+            index=False,
+            sep=";",
+            encoding="utf-8-sig"
+        )
+
+
+# ================== CHẾ ĐỘ SONG SONG (playwright / http) ==================
+# Trang sẵn sàng khi có h1 và đã hiện giá (giá được điền sau khi hydrate)
+PRICE_READY_JS = r"""() => !!document.querySelector('h1')
+    && /\d{1,3}(?:[.,]\d{3})+\s*₫/.test(document.body ? document.body.innerText : '')"""
+
+
+async def fetch_playwright(pool, url, limiter=LIMITER):
+    async with pool.page() as page:
+        TELEMETRY.attach_page(page)
+        with TELEMETRY.timer("nav_seconds", url):
+            await RETRY.run(url, lambda: page.goto(url, wait_until="domcontentloaded", timeout=60000), limiter)
+        with TELEMETRY.timer("wait_seconds", url):
+            await page.wait_for_selector("h1", timeout=READY_TIMEOUT_MS)
+            try:
+                await page.wait_for_function(PRICE_READY_JS, timeout=READY_TIMEOUT_MS)
+            except PlaywrightTimeout:
+                # Khách sạn hết phòng / không hiện giá: vẫn lấy các trường còn lại
+                TELEMETRY.inc("timeouts_total", url)
+            # Khối tiện nghi tải khi cuộn xuống: cuộn 1 lần rồi chờ mạng yên (không sleep cố định)
+            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+            try:
+                await page.wait_for_load_state("networkidle", timeout=NETWORK_IDLE_MS)
+            except PlaywrightTimeout:
+                pass
+        return await page.content()
+
+
+async def fetch_http(session, url, limiter=LIMITER):
+    async def get():
+        async with session.get(url) as resp:
+            if resp.status in THROTTLE_STATUSES:
+                raise ThrottledError(resp.status, url)
+            resp.raise_for_status()
+            return await resp.text()
+
+    with TELEMETRY.timer("nav_seconds", url):
+        html = await RETRY.run(url, get, limiter)
+    TELEMETRY.inc("pages_total", url)
+    TELEMETRY.inc("bytes_total", url, len(html.encode("utf-8")))
+    return html
+
+
+async def fetch_worker(queue, fetch, results, total, archive=None, limiter=LIMITER):
+    """Lấy (i, url) từ hàng đợi tới khi gặp None; kết quả ghi vào results[i] để giữ thứ tự link."""
+    while True:
+        item = await queue.get()
+        try:
+            if item is None:
+                return
+            i, url = item
+            try:
+                async with limiter.slot(url):
+                    html = await fetch(url)
+                if archive:
+                    await archive.aput(html, source="mytour", kind="hotel", url=url)
+                with TELEMETRY.timer("extract_seconds", url):
+                    # Parse ở thread riêng để các worker khác vẫn tải trang
+                    row = await asyncio.to_thread(parse_hotel, html, url)
+                results[i] = row
+                print_row(i, total, row)
+            except Exception as e:
+                TELEMETRY.inc("errors_total", url)
+                print(f"[{i}/{total}] FAIL | {url} | {e}")
+        finally:
+            queue.task_done()
+
+
+def ordered_rows(results):
+    """{thứ tự link: dòng} -> list dòng theo thứ tự link."""
+    return [results[i] for i in sorted(results)]
+
+
+async def scrape_async(urls, mode=FETCH_MODE, workers=ASYNC_WORKERS, archive=None,
+                       limiter=LIMITER, headless=True, results=None):
+    """
+    Tải song song `workers` trang; trả về các dòng theo đúng thứ tự urls (bỏ link lỗi).
+    results: dict do người gọi giữ, được điền dần {thứ tự: dòng} -- dừng giữa chừng
+    (lỗi, Ctrl-C) thì các trang đã xong vẫn còn trong đó để lưu.
+    """
+    if mode == "http" and aiohttp is None:
+        raise RuntimeError("Chưa cài aiohttp: pip install aiohttp (hoặc dùng FETCH_MODE='playwright')")
+
+    results = {} if results is None else results
+    queue = asyncio.Queue()
+    for i, url in enumerate(urls, start=1):
+        queue.put_nowait((i, url))
+    for _ in range(workers):
+        queue.put_nowait(None)
+
+    async def run(fetch):
+        await asyncio.gather(*(fetch_worker(queue, fetch, results, len(urls), archive, limiter)
+                               for _ in range(workers)))
+
+    if mode == "http":
+        timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT_S)
+        connector = aiohttp.TCPConnector(limit=workers)
+        async with aiohttp.ClientSession(headers=HTTP_HEADERS, timeout=timeout, connector=connector) as session:
+            await run(lambda url: fetch_http(session, url, limiter))
+    elif mode == "playwright":
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=headless)
+            pool = await BrowserPool(
+                browser, size=workers, max_navigations=100,
+                context_options={"locale": "vi-VN", "user_agent": HTTP_HEADERS["User-Agent"]},
+                block_resources=[BLOCK_IMAGES],
+            ).start()
+            try:
+                await run(lambda url: fetch_playwright(pool, url, limiter))
+            finally:
+                await pool.close()
+                await browser.close()
+    else:
+        raise ValueError(f"FETCH_MODE không hợp lệ cho chế độ song song: {mode}")
+
+    return ordered_rows(results)
+
+
+def main_async(urls):
+    archive = SnapshotArchive(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+    results = {}
+    try:
+        asyncio.run(scrape_async(urls, archive=archive, results=results))
+    finally:
+        # Lưu cả khi dừng giữa chừng: results có mọi trang đã parse xong
+        save_rows(ordered_rows(results))
+        LIMITER.print_report()
+        TELEMETRY.write()
+    print("🎉 DONE ->", OUT_CSV)
+
+
+# ================== CHẾ ĐỘ SELENIUM (tuần tự) ==================
 def main():
     urls = load_links_from_txt(INPUT_LINKS_TXT)
+    if FETCH_MODE != "selenium":
+        return main_async(urls)
 
     options = webdriver.ChromeOptions()
     options.add_argument("--start-maximized")
@@ -191,66 +682,53 @@ def main():
     wait = WebDriverWait(driver, 25)
 
     rows = []
+    archive = SnapshotArchive(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
 
     try:
         for i, url in enumerate(urls, start=1):
             try:
-                driver.get(url)
-
-                # chờ h1 xuất hiện để chắc chắn trang load DOM chính
-                wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "h1")))
-
-                # ✅ (1) vào trang chờ 5s rồi mới lấy dữ liệu
-                time.sleep(WAIT_AFTER_OPEN)
-
-                # scroll nhẹ để load các block động (nếu có)
-                for _ in range(2):
-                    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                    time.sleep(1)
-
-                soup = BeautifulSoup(driver.page_source, "lxml")
-
-                hotel_name = extract_hotel_name(soup)
-                rating_score = extract_rating_score(soup)
-                review_count = extract_review_count(soup)
-                address = extract_address(soup)
-                list_price, discount, current_price = extract_prices(soup)
-                amenities = extract_amenities(soup)
-
-                rows.append({
-                    "link": url,
-                    "ten": hotel_name,
-                    "gia_niem_yet": list_price,
-                    "discount": discount,
-                    "gia_hien_tai": current_price,
-                    "dia_chi": address,
-                    "so_luong_danh_gia": review_count,
-                    "diem_danh_gia": rating_score,
-                    "tien_nghi": amenities,
-                })
-
-                print(
-                    f"[{i}/{len(urls)}] OK | {hotel_name} | "
-                    f"list={list_price} | disc={discount} | now={current_price} | "
-                    f"rating={rating_score} | reviews={review_count}"
-                )
-
-                # ✅ (2) lấy xong chờ 5s rồi mới sang trang khác
-                time.sleep(WAIT_BEFORE_NEXT)
+                with TELEMETRY.timer("nav_seconds", url):
+                    RETRY.run_sync(url, lambda: driver.get(url), LIMITER)
+                TELEMETRY.inc("pages_total", url)
+
+                with TELEMETRY.timer("wait_seconds", url):
+                    # chờ h1 xuất hiện để chắc chắn trang load DOM chính
+                    try:
+                        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "h1")))
+                    except TimeoutException as e:
+                        # Lỗi của driver.get đã được RETRY.run_sync ghi vào LIMITER; chỉ ghi lỗi chờ h1
+                        TELEMETRY.inc("timeouts_total", url)
+                        LIMITER.record(url, error=e)
+                        raise
+
+                    # ✅ (1) vào trang chờ 5s rồi mới lấy dữ liệu
+                    time.sleep(WAIT_AFTER_OPEN)
+
+                    # scroll nhẹ để load các block động (nếu có)
+                    for _ in range(2):
+                        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                        time.sleep(1)
+
+                html = driver.page_source
+                # Selenium không thấy byte mạng -> đếm kích thước HTML đã render
+                TELEMETRY.inc("bytes_total", url, len(html.encode("utf-8")))
+                if archive:
+                    archive.put(html, source="mytour", kind="hotel", url=url)
+
+                with TELEMETRY.timer("extract_seconds", url):
+                    row = parse_hotel(html, url)
+                rows.append(row)
+                print_row(i, len(urls), row)
 
             except Exception as e:
+                TELEMETRY.inc("errors_total", url)
                 print(f"[{i}/{len(urls)}] FAIL | {url} | {e}")
-                time.sleep(WAIT_BEFORE_NEXT)
 
     finally:
-        if rows:
-            pd.DataFrame(rows).to_csv(
-                OUT_CSV,
-                index=False,
-                sep=";",
-                encoding="utf-8-sig"
-            )
+        save_rows(rows)
         driver.quit()
+        LIMITER.print_report()
+        TELEMETRY.write()
 
     print("🎉 DONE ->", OUT_CSV)
 
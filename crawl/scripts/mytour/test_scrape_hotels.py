@@ -0,0 +1,58 @@
+import pytest
+from selenium.common.exceptions import TimeoutException
+
+import scrape_hotels as mt
+from bench_fetch import render_hotel
+
+
+def test_main_async_saves_rows_scraped_before_a_crash(monkeypatch):
+    saved = []
+
+    async def crashing_scrape(urls, archive=None, results=None, **kwargs):
+        results[2] = {"link": urls[1]}
+        results[1] = {"link": urls[0]}
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(mt, "scrape_async", crashing_scrape)
+    monkeypatch.setattr(mt, "save_rows", saved.append)
+    monkeypatch.setattr(mt, "SNAPSHOT_DIR", None)
+    monkeypatch.setattr(mt.TELEMETRY, "write", lambda *a, **k: None)
+
+    with pytest.raises(KeyboardInterrupt):
+        mt.main_async(["https://a", "https://b", "https://c"])
+    assert saved == [[{"link": "https://a"}, {"link": "https://b"}]]
+
+
+@pytest.mark.parametrize("backend", ["bs4", "lxml"])
+def test_single_pass_backends_match_legacy(backend):
+    for i in range(5):
+        html = render_hotel(i)
+        assert mt.parse_hotel(html, "u", backend) == mt.parse_hotel(html, "u", "legacy")
+
+
+def test_parse_hotel_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        mt.parse_hotel("<html></html>", "u", "regex")
+
+
+class TimeoutDriver:
+    def get(self, url):
+        raise TimeoutException("driver.get quá hạn")
+
+    def quit(self):
+        pass
+
+
+def test_selenium_navigation_failure_is_recorded_once(monkeypatch):
+    records = []
+    monkeypatch.setattr(mt, "load_links_from_txt", lambda path: ["https://mytour.vn/khach-san/1"])
+    monkeypatch.setattr(mt.webdriver, "Chrome", lambda options=None: TimeoutDriver())
+    monkeypatch.setattr(mt, "RETRY", mt.RetryPolicy(max_attempts=1))
+    monkeypatch.setattr(mt.LIMITER, "record", lambda url, latency=None, status=None, error=None: records.append(error))
+    monkeypatch.setattr(mt.LIMITER, "print_report", lambda: None)
+    monkeypatch.setattr(mt, "save_rows", lambda rows: None)
+    monkeypatch.setattr(mt.TELEMETRY, "write", lambda *a, **k: None)
+
+    mt.main()
+    # run_sync đã ghi lỗi; vòng ngoài không được ghi thêm lần nữa (giảm rate 2 lần)
+    assert len(records) == 1 and isinstance(records[0], TimeoutException)
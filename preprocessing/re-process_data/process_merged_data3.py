@@ -1,9 +1,12 @@
 import pandas as pd
-import time
 import os
+import sys
 from sqlalchemy import create_engine
 from playwright.sync_api import sync_playwright
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "crawl", "scripts"))
+from common.rate_limit import AdaptiveRateLimiter, RetryPolicy
+
 # --- CẤU HÌNH ---
 # Danh sách các bảng cần xử lý trong SQL 
 TABLE_NAMES = ["clean_booking", "clean_ivivu", "clean_mytour"]
@@ -17,6 +20,10 @@ DB_CONFIG = {
 }
 DB_CONNECTION_STR = f"postgresql+psycopg2://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['dbname']}"
 
+# Giới hạn tốc độ theo domain (Booking / iVIVU / Mytour tính riêng) thay cho sleep(1) cố định
+LIMITER = AdaptiveRateLimiter(rate=1.0, min_rate=0.2, max_rate=4.0)
+RETRY = RetryPolicy(max_attempts=3)
+
 # --- HÀM NHẬN DIỆN ĐỊA ĐIỂM (Giữ nguyên) ---
 def detect_location(text):
     if not text: return None
@@ -64,7 +71,7 @@ def process_single_table(table_name, page, engine):
             if pd.isna(url) or str(url).strip() == "": continue
 
             try:
-                page.goto(url, timeout=15000, wait_until="domcontentloaded")
+                RETRY.run_sync(url, lambda: page.goto(url, timeout=15000, wait_until="domcontentloaded"), LIMITER)
                 full_text = ""
                 
                 # Selector cho Booking
@@ -83,8 +90,6 @@ def process_single_table(table_name, page, engine):
                 if found_loc:
                     print(f"      -> OK: {found_loc}")
                     df.at[idx, 'location'] = found_loc
-                
-                time.sleep(1) # Nghỉ để tránh bị chặn IP
             except Exception as e:
                 print(f"      -> Lỗi crawl: {e}")
     else: